@@ -0,0 +1,351 @@
+"""
+Analytics Service - plot aggregations shared by /analytics and /api/analytics
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.cache import etag_matches, response_cache
+from app.columnar import arrow_analytics
+from app.database import db_client
+from app.geo import bbox_geometry, parse_bbox, within_filter
+from app.rollups import average, total, mongo_sort_key
+
+# -----------------------------
+# Pipelines (one definition each)
+# -----------------------------
+PLOTS_BY_TYPE = [
+    {"$group": {"_id": "$Project_Type", "count": {"$sum": 1}}},
+    {"$sort": {"count": -1}},
+]
+
+NDVI_BY_PROJECT = [
+    {"$group": {"_id": "$Project_Type", "avgNDVI": {"$avg": "$NDVI"}}},
+    {"$sort": {"avgNDVI": -1}},
+]
+
+NDVI_BY_PROJECT_SOURCE = [
+    {"$group": {"_id": {"type": "$Project_Type", "source": "$Data_Source"}, "avgNDVI": {"$avg": "$NDVI"}}},
+    {"$sort": {"_id.type": 1, "_id.source": 1}},
+]
+
+BIOMASS_TREND = [
+    {"$group": {
+        "_id": "$Monitoring_Year",
+        "avgAbove": {"$avg": "$Biomass_above_kg"},
+        "avgBelow": {"$avg": "$Biomass_below_kg"},
+        "total": {"$sum": {"$add": ["$Biomass_above_kg", "$Biomass_below_kg"]}},
+    }},
+    {"$sort": {"_id": 1}},
+]
+
+CO2_FLUX = [
+    {"$group": {"_id": "$Monitoring_Year", "avgCO2": {"$avg": "$CO2_Flux_mg_m2_day"}}},
+    {"$sort": {"_id": 1}},
+]
+
+CH4_FLUX = [
+    {"$group": {"_id": "$Monitoring_Year", "avgCH4": {"$avg": "$CH4_Flux_mg_m2_day"}}},
+    {"$sort": {"_id": 1}},
+]
+
+NDVI_MONTHLY = [
+    {"$addFields": {"month": {"$month": "$Timestamp"}, "year": {"$year": "$Timestamp"}}},
+    {"$group": {"_id": {"year": "$year", "month": "$month"}, "avgNDVI": {"$avg": "$NDVI"}}},
+    {"$sort": {"_id.year": 1, "_id.month": 1}},
+]
+
+
+def summary_filter(
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    project_type: Optional[str] = None,
+    bbox: Optional[List[float]] = None,
+) -> Dict[str, Any]:
+    """$match for /summary; bbox is [min_lon, min_lat, max_lon, max_lat]"""
+    match: Dict[str, Any] = {}
+    if year_from is not None or year_to is not None:
+        match["Monitoring_Year"] = {}
+        if year_from is not None:
+            match["Monitoring_Year"]["$gte"] = year_from
+        if year_to is not None:
+            match["Monitoring_Year"]["$lte"] = year_to
+    if project_type:
+        match["Project_Type"] = project_type
+    if bbox:
+        match.update(within_filter(bbox_geometry(bbox)))
+    return match
+
+
+class AnalyticsService:
+    """Runs plot analytics on the API's shared Mongo pool and times every endpoint"""
+
+    def __init__(self, db):
+        self.db = db
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    async def _aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await self.db.aggregate_plots(pipeline)
+
+    def record(self, endpoint: str, elapsed_ms: float):
+        """Accumulate call count, total and max latency for an endpoint"""
+        stats = self.timings.setdefault(endpoint, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["calls"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def timing_report(self) -> Dict[str, Dict[str, float]]:
+        """Per-endpoint call count and average/max latency in ms"""
+        return {
+            endpoint: {
+                "calls": stats["calls"],
+                "avg_ms": round(stats["total_ms"] / stats["calls"], 2),
+                "max_ms": round(stats["max_ms"], 2),
+            }
+            for endpoint, stats in self.timings.items()
+        }
+
+    async def _rollups(self, dimension: str) -> Optional[List[Dict[str, Any]]]:
+        """Rollup buckets of a dimension, or None until rollups have been built"""
+        if not await self.db.plot_rollups_built():
+            return None
+        return await self.db.get_plot_rollups(dimension)
+
+    # ----------------- QUERIES -----------------
+    # Each query reads the pre-aggregated rollups when available and falls
+    # back to the live pipeline over plots otherwise.
+    async def plots_overview(self) -> Dict[str, Any]:
+        buckets = await self._rollups("type")
+        if buckets is not None:
+            by_type = [{"_id": b["key"]["type"], "count": b["count"]} for b in buckets]
+            by_type.sort(key=lambda row: row["count"], reverse=True)
+            return {"total_plots": sum(b["count"] for b in buckets), "by_type": by_type}
+
+        total_plots, by_type = await asyncio.gather(
+            self.db.count_plots({}), self._aggregate(PLOTS_BY_TYPE)
+        )
+        return {"total_plots": total_plots, "by_type": by_type}
+
+    async def ndvi_by_project(self) -> Dict[str, Any]:
+        buckets = await self._rollups("type")
+        if buckets is not None:
+            rows = [{"_id": b["key"]["type"], "avgNDVI": average(b, "NDVI")} for b in buckets]
+            rows.sort(key=lambda row: mongo_sort_key(row["avgNDVI"]), reverse=True)
+            return {"ndvi": rows}
+        return {"ndvi": await self._aggregate(NDVI_BY_PROJECT)}
+
+    async def ndvi_by_project_source(self) -> Dict[str, Any]:
+        buckets = await self._rollups("type_source")
+        if buckets is not None:
+            rows = [{"_id": b["key"], "avgNDVI": average(b, "NDVI")} for b in buckets]
+            rows.sort(key=lambda row: (mongo_sort_key(row["_id"]["type"]), mongo_sort_key(row["_id"]["source"])))
+            return {"ndvi": rows}
+        return {"ndvi": await self._aggregate(NDVI_BY_PROJECT_SOURCE)}
+
+    async def biomass_trend(self) -> Dict[str, Any]:
+        buckets = await self._rollups("year")
+        if buckets is not None:
+            rows = [
+                {
+                    "_id": b["key"]["year"],
+                    "avgAbove": average(b, "Biomass_above_kg"),
+                    "avgBelow": average(b, "Biomass_below_kg"),
+                    "total": total(b, "Biomass_total_kg"),
+                }
+                for b in buckets
+            ]
+            rows.sort(key=lambda row: mongo_sort_key(row["_id"]))
+            return {"biomass": rows}
+        return {"biomass": await self._aggregate(BIOMASS_TREND)}
+
+    async def fluxes(self) -> Dict[str, Any]:
+        buckets = await self._rollups("year")
+        if buckets is not None:
+            buckets.sort(key=lambda b: mongo_sort_key(b["key"]["year"]))
+            return {
+                "co2": [{"_id": b["key"]["year"], "avgCO2": average(b, "CO2_Flux_mg_m2_day")} for b in buckets],
+                "ch4": [{"_id": b["key"]["year"], "avgCH4": average(b, "CH4_Flux_mg_m2_day")} for b in buckets],
+            }
+        co2, ch4 = await asyncio.gather(self._aggregate(CO2_FLUX), self._aggregate(CH4_FLUX))
+        return {"co2": co2, "ch4": ch4}
+
+    async def ndvi_monthly(self) -> Dict[str, Any]:
+        buckets = await self._rollups("month")
+        if buckets is not None:
+            rows = [{"_id": b["key"], "avgNDVI": average(b, "NDVI")} for b in buckets]
+            rows.sort(key=lambda row: (mongo_sort_key(row["_id"]["year"]), mongo_sort_key(row["_id"]["month"])))
+            return {"trend": rows}
+        return {"trend": await self._aggregate(NDVI_MONTHLY)}
+
+    async def summary(self, match: Dict[str, Any]) -> Dict[str, Any]:
+        """Every dashboard metric from a single $facet pass over the matching plots"""
+        if not match and await self.db.plot_rollups_built():
+            overview, ndvi, ndvi_source, biomass, fluxes, monthly = await asyncio.gather(
+                self.plots_overview(), self.ndvi_by_project(), self.ndvi_by_project_source(),
+                self.biomass_trend(), self.fluxes(), self.ndvi_monthly(),
+            )
+            return {
+                **overview,
+                "ndvi_by_type": ndvi["ndvi"],
+                "ndvi_by_type_source": ndvi_source["ndvi"],
+                "biomass": biomass["biomass"],
+                "co2": fluxes["co2"],
+                "ch4": fluxes["ch4"],
+                "ndvi_monthly": monthly["trend"],
+            }
+
+        return await self.summary_facet(match)
+
+    async def summary_facet(self, match: Dict[str, Any]) -> Dict[str, Any]:
+        """The $facet pipeline behind summary(), never served from rollups"""
+        pipeline = [
+            {"$facet": {
+                "total": [{"$count": "n"}],
+                "by_type": PLOTS_BY_TYPE,
+                "ndvi_by_type": NDVI_BY_PROJECT,
+                "ndvi_by_type_source": NDVI_BY_PROJECT_SOURCE,
+                "biomass": BIOMASS_TREND,
+                "co2": CO2_FLUX,
+                "ch4": CH4_FLUX,
+                "ndvi_monthly": NDVI_MONTHLY,
+            }},
+        ]
+        if match:
+            pipeline.insert(0, {"$match": match})
+
+        facets = (await self._aggregate(pipeline))[0]
+        total = facets.pop("total")
+        return {"total_plots": total[0]["n"] if total else 0, **facets}
+
+
+# Global analytics service
+analytics_service = AnalyticsService(db_client)
+response_cache.version_source = db_client.get_plot_data_version
+
+# Mounted by app.main under both /analytics and /api/analytics
+router = APIRouter(tags=["Analytics"])
+
+
+ENGINES = ("mongo", "arrow")
+
+
+def _engine(requested: Optional[str]) -> str:
+    """Engine for a request: ?engine= wins over ANALYTICS_ENGINE (default mongo).
+
+    An explicitly requested Arrow engine without a snapshot is a 503; a
+    configured one falls back to Mongo so dashboards keep working.
+    """
+    engine = requested or os.getenv("ANALYTICS_ENGINE", "mongo")
+    if engine not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine must be one of {list(ENGINES)}")
+    if engine == "arrow" and not arrow_analytics.available():
+        if requested:
+            raise HTTPException(status_code=503, detail="Parquet plot snapshot not available")
+        return "mongo"
+    return engine
+
+
+def _service(engine: str):
+    return arrow_analytics if engine == "arrow" else analytics_service
+
+
+async def _serve(
+    endpoint: str, request: Request, engine: str, query: Callable[[], Awaitable[Dict[str, Any]]]
+) -> Response:
+    """Answer from the response cache or run the query, with ETag/304 and Server-Timing.
+
+    Results are cached per endpoint, engine and query string (not per mount
+    prefix) and dropped whenever the plot data version changes; a result
+    computed while the cache was invalidated is served but not cached.
+    """
+    await response_cache.sync_version()
+    key = (endpoint, engine, tuple(sorted(request.query_params.multi_items())))
+    entry = response_cache.get(key)
+
+    if entry is None:
+        generation = response_cache.generation
+        start = time.perf_counter()
+        result = await query()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        analytics_service.record(endpoint if engine == "mongo" else f"{endpoint} ({engine})", elapsed_ms)
+        entry = response_cache.put(key, JSONResponse(jsonable_encoder(result)).body, generation)
+        timing = f"{engine};dur={elapsed_ms:.1f}"
+    else:
+        timing = "cache;desc=hit"
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Server-Timing": timing}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+@router.get("/plots-overview")
+async def plots_overview(request: Request, engine: Optional[str] = None):
+    engine = _engine(engine)
+    return await _serve("plots-overview", request, engine, _service(engine).plots_overview)
+
+
+@router.get("/ndvi-by-project")
+async def ndvi_by_project(request: Request, engine: Optional[str] = None):
+    engine = _engine(engine)
+    return await _serve("ndvi-by-project", request, engine, _service(engine).ndvi_by_project)
+
+
+@router.get("/ndvi-by-project-source")
+async def ndvi_by_project_source(request: Request, engine: Optional[str] = None):
+    engine = _engine(engine)
+    return await _serve("ndvi-by-project-source", request, engine, _service(engine).ndvi_by_project_source)
+
+
+@router.get("/biomass-trend")
+async def biomass_trend(request: Request, engine: Optional[str] = None):
+    engine = _engine(engine)
+    return await _serve("biomass-trend", request, engine, _service(engine).biomass_trend)
+
+
+@router.get("/fluxes")
+async def fluxes(request: Request, engine: Optional[str] = None):
+    engine = _engine(engine)
+    return await _serve("fluxes", request, engine, _service(engine).fluxes)
+
+
+@router.get("/ndvi-monthly")
+async def ndvi_monthly(request: Request, engine: Optional[str] = None):
+    engine = _engine(engine)
+    return await _serve("ndvi-monthly", request, engine, _service(engine).ndvi_monthly)
+
+
+@router.get("/summary")
+async def summary(
+    request: Request,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    project_type: Optional[str] = None,
+    bbox: Optional[str] = None,
+    engine: Optional[str] = None,
+):
+    """All dashboard analytics in one call; bbox is min_lon,min_lat,max_lon,max_lat"""
+    try:
+        coords = parse_bbox(bbox) if bbox else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    engine = _engine(engine)
+    if engine == "arrow":
+        filters = {"year_from": year_from, "year_to": year_to, "project_type": project_type, "bbox": coords}
+        return await _serve("summary", request, engine, lambda: arrow_analytics.summary(**filters))
+
+    match = summary_filter(year_from, year_to, project_type, coords)
+    return await _serve("summary", request, engine, lambda: analytics_service.summary(match))
+
+
+@router.get("/timings")
+async def timings():
+    """Per-endpoint latency of the analytics queries since process start"""
+    return analytics_service.timing_report()
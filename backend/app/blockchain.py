@@ -4,151 +4,500 @@ Blockchain Client for BlueCarbon (Celo Alfajores) with Contract Registry
 
 import os
 import json
-from web3 import Web3
+import asyncio
+import heapq
+import logging
+import aiohttp
+from collections import defaultdict
+from functools import lru_cache
+from hexbytes import HexBytes
+from web3 import AsyncWeb3, Web3
+from web3.exceptions import TransactionNotFound
+from web3.logs import DISCARD
+from eth_utils import event_abi_to_log_topic
 from dotenv import load_dotenv
-from typing import Dict, Any
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Set
+
+from app.metrics import RPC_POOL_SIZE, rpc_timer
 
 # Load env variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Called with (tx_hash, raw_tx) after signing and before broadcast (outbox hook)
+OnSigned = Optional[Callable[[str, str], Awaitable[None]]]
+
+# Events the chain indexer syncs into MongoDB
+INDEXED_EVENTS = (
+    "ProjectRegistered",
+    "CreditsIssued",
+    "CreditsRetired",
+    "TransferSingle",
+    "TransferBatch",
+)
+
+
+ABI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "abi")
+
+
+@lru_cache(maxsize=None)
+def load_abi(name: str) -> List[Dict[str, Any]]:
+    """Parse an ABI file from abi/ once per process"""
+    with open(os.path.join(ABI_DIR, f"{name}.json"), "r") as f:
+        return json.load(f)
+
+
+NONCE_ERRORS = ("nonce too low", "nonce too high", "already known", "replacement transaction underpriced")
+
+
+def _is_nonce_error(error: Exception) -> bool:
+    """True if an RPC error means our local nonce is out of step with the chain"""
+    return any(msg in str(error).lower() for msg in NONCE_ERRORS)
+
+
+def _freeze(value):
+    """Hashable form of call arguments, used as the coalescing key"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class NonceManager:
+    """Per-account nonce allocator backed by a locked local counter.
+
+    Nonces are outstanding from allocate() until sent() (the node accepted
+    the tx) or release() (it was never broadcast). Released nonces are handed
+    out again before the counter moves on, so a failed build or sign leaves
+    no gap, and resync() never drops the counter below an outstanding nonce.
+    """
+
+    def __init__(self, w3: AsyncWeb3):
+        self.w3 = w3
+        self._lock = asyncio.Lock()
+        self._next: Dict[str, int] = {}
+        self._outstanding: Dict[str, Set[int]] = defaultdict(set)
+        self._released: Dict[str, List[int]] = defaultdict(list)
+
+    async def allocate(self, address: str) -> int:
+        """Hand out the lowest free nonce, seeding from the chain on first use"""
+        async with self._lock:
+            if address not in self._next:
+                self._next[address] = await self.w3.eth.get_transaction_count(address, "pending")
+            if self._released[address]:
+                nonce = heapq.heappop(self._released[address])
+            else:
+                nonce = self._next[address]
+                self._next[address] = nonce + 1
+            self._outstanding[address].add(nonce)
+            return nonce
+
+    async def sent(self, address: str, nonce: int):
+        """Mark a nonce as accepted by the node"""
+        async with self._lock:
+            self._outstanding[address].discard(nonce)
+
+    async def release(self, address: str, nonce: int):
+        """Return a nonce whose tx was never broadcast so the next allocation reuses it"""
+        async with self._lock:
+            self._outstanding[address].discard(nonce)
+            heapq.heappush(self._released[address], nonce)
+
+    async def resync(self, address: str, failed: Optional[int] = None):
+        """Re-read the chain's pending count after a failed or stalled send.
+
+        The counter resumes above every outstanding nonce, so in-flight
+        allocations are never handed out twice. Any nonce between the chain's
+        pending count and the counter that is not in flight never reached the
+        node (a gap that stalls every later tx), so it is queued for reuse.
+        """
+        async with self._lock:
+            outstanding = self._outstanding[address]
+            if failed is not None:
+                outstanding.discard(failed)
+            pending = await self.w3.eth.get_transaction_count(address, "pending")
+            self._next[address] = max([pending] + [n + 1 for n in outstanding])
+
+            free = set(range(pending, self._next[address])) - outstanding
+            gaps = sorted(free - set(self._released[address]))
+            if gaps:
+                logger.warning(
+                    "⚠️  Nonce gap for %s: chain pending at %d, reusing %s", address, pending, gaps,
+                    extra={"address": address, "pending_nonce": pending, "gaps": gaps},
+                )
+            self._released[address] = sorted(free)
+
 
 class BlueCarbonClient:
+    """Async client for the BlueCarbon contracts.
+
+    All RPC traffic goes through one pooled aiohttp session; call connect()
+    from the app's startup hook before use.
+    """
+
     def __init__(self):
-        # Connect to Celo Alfajores
-        self.w3 = Web3(Web3.HTTPProvider(os.getenv("RPC_URL")))
-        if not self.w3.is_connected():
-            raise ConnectionError("❌ Failed to connect to Celo Alfajores")
+        self.rpc_url = os.getenv("RPC_URL")
+        self.pool_size = int(os.getenv("RPC_POOL_SIZE", "20"))
+        self.call_timeout = float(os.getenv("RPC_TIMEOUT", "10"))
+        RPC_POOL_SIZE.set(self.pool_size)
 
-        print(f"✅ Connected to Celo Alfajores - Block: {self.w3.eth.block_number}")
+        self.w3 = AsyncWeb3(
+            AsyncWeb3.AsyncHTTPProvider(
+                self.rpc_url,
+                request_kwargs={"timeout": aiohttp.ClientTimeout(total=self.call_timeout)},
+            )
+        )
+        self.nonces = NonceManager(self.w3)
+        self.session: Optional[aiohttp.ClientSession] = None
 
         # --- Load Registry Contract ---
         registry_address = Web3.to_checksum_address(os.getenv("REGISTRY_ADDRESS"))
-        registry_abi_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)), "..", "abi", "ContractRegistry.json"
+        self.registry = self.w3.eth.contract(
+            address=registry_address, abi=load_abi("ContractRegistry")
         )
 
-        with open(registry_abi_path, "r") as f:
-            registry_abi = json.load(f)
+        # --- Load BlueCarbon contract ABI (address comes from the registry in connect()) ---
+        self.bluecarbon_abi = load_abi("BlueCarbon")
+
+        self.contract = None
+        self.contract_address = None
+
+        # projectId → tokenId never changes once registered, so resolve it once
+        self._token_ids: Dict[str, int] = {}
+
+        # Identical reads in flight share one RPC request
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+        # topic0 → event name, used to decode raw logs for the indexer
+        self._event_topics = {
+            HexBytes(event_abi_to_log_topic(item)).hex(): item["name"]
+            for item in self.bluecarbon_abi
+            if item.get("type") == "event" and item["name"] in INDEXED_EVENTS
+        }
+
+    async def connect(self):
+        """Open the pooled HTTP session and resolve the BlueCarbon contract from the registry"""
+        if self.session is None:
+            # A bounded connector caps concurrent TCP/TLS connections to the RPC node
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.call_timeout),
+            )
+            await self.w3.provider.cache_async_session(self.session)
+
+        if not await self.w3.is_connected():
+            raise ConnectionError("❌ Failed to connect to Celo Alfajores")
 
-        self.registry = self.w3.eth.contract(address=registry_address, abi=registry_abi)
-        print(f"📒 Registry loaded at {registry_address}")
+        logger.info("✅ Connected to Celo Alfajores - Block: %s", await self.w3.eth.block_number)
+        logger.info("📒 Registry loaded at %s", self.registry.address)
 
         # --- Fetch BlueCarbon contract address from registry ---
-        bluecarbon_address = self.registry.functions.getContract("BlueCarbon").call()
+        bluecarbon_address = await self.get_registry_contract("BlueCarbon")
         if bluecarbon_address == "0x0000000000000000000000000000000000000000":
             raise ValueError("❌ No BlueCarbon contract registered in ContractRegistry")
 
-        print(f"📌 BlueCarbon address from registry: {bluecarbon_address}")
+        logger.info("📌 BlueCarbon address from registry: %s", bluecarbon_address)
 
-        # --- Load BlueCarbon contract ABI ---
-        bluecarbon_abi_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)), "..", "abi", "BlueCarbon.json"
-        )
+        self.contract = self.w3.eth.contract(address=bluecarbon_address, abi=self.bluecarbon_abi)
+        self.contract_address = bluecarbon_address
 
-        with open(bluecarbon_abi_path, "r") as f:
-            bluecarbon_abi = json.load(f)
+        logger.info("📄 BlueCarbon contract loaded at %s", self.contract_address)
 
-        self.contract = self.w3.eth.contract(address=bluecarbon_address, abi=bluecarbon_abi)
-        self.contract_address = bluecarbon_address
+    async def close(self):
+        """Close the pooled HTTP session"""
+        if self.session:
+            await self.session.close()
+            self.session = None
 
-        print(f"📄 BlueCarbon contract loaded at {self.contract_address}")
+    async def _read(self, fn, *args):
+        """eth_call a view function with a timeout; identical concurrent calls are coalesced"""
+        key = (fn.address, fn.fn_name, _freeze(args))
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._call(fn, args))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: one caller giving up must not cancel the request for the others
+        return await asyncio.shield(future)
+
+    async def _call(self, fn, args):
+        """One timed eth_call (shared by every coalesced caller)"""
+        with rpc_timer("call", fn.fn_name):
+            return await asyncio.wait_for(fn(*args).call(), timeout=self.call_timeout)
 
     # --------- READ METHODS --------- #
-    def get_project_token_id(self, project_id: str) -> int:
-        """Fetch token ID for a project by its projectId"""
-        return self.contract.functions.getProjectTokenId(project_id).call()
+    async def get_registry_contract(self, name: str) -> str:
+        """Fetch the contract address registered under a name"""
+        return await self._read(self.registry.functions.getContract, name)
+
+    async def get_project_token_id(self, project_id: str) -> int:
+        """Fetch token ID for a project by its projectId (cached once registered)"""
+        token_id = self._token_ids.get(project_id)
+        if token_id is None:
+            token_id = await self._read(self.contract.functions.getProjectTokenId, project_id)
+            if token_id:
+                # 0 means "not registered yet" - don't pin that
+                self._token_ids[project_id] = token_id
+        return token_id
+
+    async def get_project_token_ids(self, project_ids: List[str]) -> Dict[str, int]:
+        """Resolve token IDs for several projects, fetching only cache misses concurrently"""
+        missing = [pid for pid in project_ids if pid not in self._token_ids]
+        if missing:
+            await asyncio.gather(*(self.get_project_token_id(pid) for pid in missing))
+        return {pid: self._token_ids.get(pid, 0) for pid in project_ids}
 
-    def get_balance_of(self, account: str, token_id: int) -> int:
+    def cache_token_ids(self, token_ids: Dict[str, int]):
+        """Seed the token ID cache (e.g. from IDs persisted on project documents)"""
+        self._token_ids.update({pid: tid for pid, tid in token_ids.items() if tid})
+
+    async def get_balance_of(self, account: str, token_id: int) -> int:
         """Check ERC1155 balance of a user for a given tokenId"""
-        return self.contract.functions.balanceOf(
-            Web3.to_checksum_address(account), token_id
-        ).call()
+        return await self._read(
+            self.contract.functions.balanceOf, Web3.to_checksum_address(account), token_id
+        )
 
-    def get_token_metadata(self, token_id: int) -> str:
+    async def get_balances_batch(self, accounts: List[str], token_ids: List[int]) -> List[int]:
+        """Check many (account, tokenId) pairs in a single balanceOfBatch call"""
+        if not accounts:
+            return []
+        return await self._read(
+            self.contract.functions.balanceOfBatch,
+            [Web3.to_checksum_address(a) for a in accounts],
+            list(token_ids),
+        )
+
+    async def get_token_metadata(self, token_id: int) -> str:
         """Fetch IPFS CID metadata of a token"""
-        return self.contract.functions.getTokenMetadataCID(token_id).call()
+        return await self._read(self.contract.functions.getTokenMetadataCID, token_id)
 
-    def get_token_proof(self, token_id: int) -> str:
+    async def get_token_proof(self, token_id: int) -> str:
         """Fetch proof CID for issued credits"""
-        return self.contract.functions.getTokenProofCID(token_id).call()
+        return await self._read(self.contract.functions.getTokenProofCID, token_id)
 
-    # --------- WRITE METHODS --------- #
-    def _send_transaction(self, txn, private_key: str) -> Dict[str, Any]:
-        """Helper to sign, send, and wait for confirmation"""
-        acct = self.w3.eth.account.from_key(private_key)
-        signed = self.w3.eth.account.sign_transaction(txn, private_key)
-        tx_hash = self.w3.eth.send_raw_transaction(signed.rawTransaction)
-        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+    async def is_connected(self) -> bool:
+        """Whether the RPC node answers"""
+        return await self.w3.is_connected()
+
+    async def get_block_number(self) -> int:
+        """Latest block number"""
+        with rpc_timer("eth", "eth_blockNumber"):
+            return await self.w3.eth.block_number
+
+    async def get_block_hash(self, block_number: int) -> str:
+        """Hash of a block, used to detect reorgs behind the indexer checkpoint"""
+        with rpc_timer("eth", "eth_getBlockByNumber"):
+            block = await self.w3.eth.get_block(block_number)
+        return block["hash"].hex()
+
+    async def get_event_logs(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        """Fetch and decode every indexed BlueCarbon event in a block range"""
+        with rpc_timer("eth", "eth_getLogs"):
+            logs = await self.w3.eth.get_logs(
+                {
+                    "address": self.contract_address,
+                    "fromBlock": from_block,
+                    "toBlock": to_block,
+                    "topics": [list(self._event_topics)],
+                }
+            )
+
+        events = []
+        for log in logs:
+            name = self._event_topics[HexBytes(log["topics"][0]).hex()]
+            decoded = self.contract.events[name]().process_log(log)
+            args = {
+                k: HexBytes(v).hex() if isinstance(v, bytes) else v
+                for k, v in decoded.args.items()
+            }
+            events.append(
+                {
+                    "event": name,
+                    "args": args,
+                    "block_number": log["blockNumber"],
+                    "block_hash": log["blockHash"].hex(),
+                    "tx_hash": log["transactionHash"].hex(),
+                    "log_index": log["logIndex"],
+                }
+            )
+        return events
+
+    async def get_transaction_receipt(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        """Fetch a receipt without waiting; None while the tx is still pending"""
+        try:
+            with rpc_timer("eth", "eth_getTransactionReceipt"):
+                receipt = await self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            return None
+        return self._summarize_receipt(receipt)
+
+    async def send_raw_transaction(self, raw_tx: str) -> str:
+        """Rebroadcast an already signed transaction (outbox recovery); same nonce, same hash"""
+        with rpc_timer("eth", "eth_sendRawTransaction"):
+            tx_hash = await self.w3.eth.send_raw_transaction(HexBytes(raw_tx))
+        return tx_hash.hex()
 
+    def _summarize_receipt(self, receipt) -> Dict[str, Any]:
+        """Reduce a receipt to the fields we store, plus any ProjectRegistered token IDs"""
         return {
-            "tx_hash": tx_hash.hex(),
+            "tx_hash": receipt.transactionHash.hex(),
             "status": receipt.status,
             "blockNumber": receipt.blockNumber,
+            "gasUsed": receipt.gasUsed,
+            "registered": self._registered_token_ids(receipt),
         }
 
-    def register_project(
-        self, project_id: str, metadata_cid: str, private_key: str
+    def _registered_token_ids(self, receipt) -> Dict[str, int]:
+        """Map keccak(projectId) → tokenId from ProjectRegistered logs.
+
+        projectId is an indexed string, so the log only carries its hash;
+        callers match it with Web3.keccak(text=project_id).hex().
+        """
+        events = self.contract.events.ProjectRegistered().process_receipt(receipt, errors=DISCARD)
+        return {HexBytes(e.args.projectId).hex(): e.args.tokenId for e in events}
+
+    def registered_token_id(self, project_id: str, receipt: Dict[str, Any]) -> Optional[int]:
+        """Token ID assigned to project_id in a summarized receipt, caching it if present"""
+        token_id = receipt.get("registered", {}).get(Web3.keccak(text=project_id).hex())
+        if token_id:
+            self._token_ids[project_id] = token_id
+        return token_id
+
+    # --------- WRITE METHODS --------- #
+    async def _send_transaction(self, address: str, nonce: int, signed, wait: bool = True) -> Dict[str, Any]:
+        """Helper to broadcast a signed tx; waits for confirmation unless wait=False"""
+        try:
+            tx_hash = await self.w3.eth.send_raw_transaction(signed.rawTransaction)
+        except BaseException:
+            # The node may or may not hold the tx: resync, which also fills the gap if it does not
+            await self.nonces.resync(address, failed=nonce)
+            raise
+        await self.nonces.sent(address, nonce)
+        if not wait:
+            # Broadcast only - the receipt is picked up by the background confirmer
+            return {"tx_hash": tx_hash.hex(), "status": "pending", "blockNumber": None}
+
+        try:
+            receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        except BaseException:
+            # A stalled tx usually means an earlier nonce never reached the node
+            await self.nonces.resync(address)
+            raise
+        return self._summarize_receipt(receipt)
+
+    async def _transact(
+        self, fn, private_key: str, wait: bool = True, on_signed: OnSigned = None
     ) -> Dict[str, Any]:
-        """Register a new project on-chain (admin only)"""
+        """Build, sign and send a contract call using a locally allocated nonce.
+
+        A failure before broadcast (including cancellation) releases the nonce;
+        a failed or stalled send resyncs the counter from the chain. Nonce
+        conflicts are retried once with a fresh nonce (on_signed then sees
+        the replacement tx).
+        """
         acct = self.w3.eth.account.from_key(private_key)
-        nonce = self.w3.eth.get_transaction_count(acct.address)
-
-        txn = self.contract.functions.registerProject(
-            project_id, metadata_cid
-        ).build_transaction(
-            {
-                "from": acct.address,
-                "nonce": nonce,
-                "chainId": int(os.getenv("CHAIN_ID")),
-                "gas": 300000,
-                "gasPrice": self.w3.eth.gas_price,
-            }
-        )
 
-        result = self._send_transaction(txn, private_key)
-        print(f"📝 Project registered: {project_id} → Tx: {result['tx_hash']}")
+        for attempt in range(2):
+            nonce = await self.nonces.allocate(acct.address)
+            try:
+                txn = await fn.build_transaction(
+                    {
+                        "from": acct.address,
+                        "nonce": nonce,
+                        "chainId": int(os.getenv("CHAIN_ID")),
+                        "gas": 300000,
+                        "gasPrice": await self.w3.eth.gas_price,
+                    }
+                )
+                signed = self.w3.eth.account.sign_transaction(txn, private_key)
+                if on_signed:
+                    await on_signed(signed.hash.hex(), signed.rawTransaction.hex())
+            except BaseException:
+                await self.nonces.release(acct.address, nonce)
+                raise
+
+            try:
+                with rpc_timer("transact", fn.fn_name):
+                    return await self._send_transaction(acct.address, nonce, signed, wait=wait)
+            except ValueError as e:
+                if attempt or not _is_nonce_error(e):
+                    raise
+                logger.warning("⚠️  Nonce %d rejected for %s, retrying: %s", nonce, acct.address, e)
+
+    async def register_project(
+        self, project_id: str, metadata_cid: str, private_key: str, wait: bool = True
+    ) -> Dict[str, Any]:
+        """Register a new project on-chain (admin only)"""
+        result = await self._transact(
+            self.contract.functions.registerProject(project_id, metadata_cid),
+            private_key,
+            wait=wait,
+        )
+        logger.info(
+            "📝 Project registered: %s → Tx: %s", project_id, result["tx_hash"],
+            extra={"project_id": project_id, "tx_hash": result["tx_hash"]},
+        )
         return result
 
-    def issue_credits(
-        self, to_address: str, project_id: str, amount: int, proof_cid: str, private_key: str
+    async def issue_credits(
+        self,
+        to_address: str,
+        project_id: str,
+        amount: int,
+        proof_cid: str,
+        private_key: str,
+        wait: bool = True,
+        on_signed: OnSigned = None,
     ) -> Dict[str, Any]:
         """Issue carbon credits (minter only)"""
-        acct = self.w3.eth.account.from_key(private_key)
-        nonce = self.w3.eth.get_transaction_count(acct.address)
-
-        txn = self.contract.functions.issueCredits(
-            Web3.to_checksum_address(to_address), project_id, amount, proof_cid
-        ).build_transaction(
-            {
-                "from": acct.address,
-                "nonce": nonce,
-                "chainId": int(os.getenv("CHAIN_ID")),
-                "gas": 300000,
-                "gasPrice": self.w3.eth.gas_price,
-            }
+        result = await self._transact(
+            self.contract.functions.issueCredits(
+                Web3.to_checksum_address(to_address), project_id, amount, proof_cid
+            ),
+            private_key,
+            wait=wait,
+            on_signed=on_signed,
+        )
+        logger.info(
+            "💰 Issued %d credits for project %s → Tx: %s", amount, project_id, result["tx_hash"],
+            extra={"project_id": project_id, "amount": amount, "tx_hash": result["tx_hash"]},
         )
-
-        result = self._send_transaction(txn, private_key)
-        print(f"💰 Issued {amount} credits for project {project_id} → Tx: {result['tx_hash']}")
         return result
 
-    def retire_credits(self, token_id: int, amount: int, private_key: str) -> Dict[str, Any]:
+    async def retire_credits(
+        self, token_id: int, amount: int, private_key: str, on_signed: OnSigned = None
+    ) -> Dict[str, Any]:
         """Retire carbon credits (user)"""
-        acct = self.w3.eth.account.from_key(private_key)
-        nonce = self.w3.eth.get_transaction_count(acct.address)
-
-        txn = self.contract.functions.retireCredits(token_id, amount).build_transaction(
-            {
-                "from": acct.address,
-                "nonce": nonce,
-                "chainId": int(os.getenv("CHAIN_ID")),
-                "gas": 300000,
-                "gasPrice": self.w3.eth.gas_price,
-            }
+        result = await self._transact(
+            self.contract.functions.retireCredits(token_id, amount), private_key, on_signed=on_signed
+        )
+        logger.info(
+            "🔥 Retired %d credits (Token %d) → Tx: %s", amount, token_id, result["tx_hash"],
+            extra={"token_id": token_id, "amount": amount, "tx_hash": result["tx_hash"]},
+        )
+        return result
+
+    async def retire_credits_batch(
+        self, token_ids: List[int], amounts: List[int], private_key: str, on_signed: OnSigned = None
+    ) -> Dict[str, Any]:
+        """Retire credits across several tokens in one transaction (user)"""
+        result = await self._transact(
+            self.contract.functions.retireCreditsBatch(token_ids, amounts), private_key, on_signed=on_signed
+        )
+        logger.info(
+            "🔥 Retired %d credits across %d tokens → Tx: %s", sum(amounts), len(token_ids), result["tx_hash"],
+            extra={"token_ids": token_ids, "amounts": amounts, "tx_hash": result["tx_hash"]},
         )
+        return result
 
-        result = self._send_transaction(txn, private_key)
-        print(f"🔥 Retired {amount} credits (Token {token_id}) → Tx: {result['tx_hash']}")
+    async def update_registry_contract(
+        self, name: str, new_address: str, private_key: str
+    ) -> Dict[str, Any]:
+        """Point a registry name at a new contract address (admin only)"""
+        result = await self._transact(
+            self.registry.functions.updateContract(name, new_address), private_key
+        )
+        logger.info("📒 Registry updated: %s → %s → Tx: %s", name, new_address, result["tx_hash"])
         return result
 
 
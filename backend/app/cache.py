@@ -0,0 +1,148 @@
+"""
+Response Cache - in-process LRU/TTL cache for read-heavy JSON endpoints
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class CacheEntry:
+    """Serialized response body with its ETag and expiry"""
+
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, ttl: float):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+
+
+class ResponseCache:
+    """LRU cache bounded by total body bytes, with per-entry TTL.
+
+    Entries are also tied to a data version: when the version reported by
+    `version_source` changes (plots were written by any process), the whole
+    cache is dropped. The version is re-read at most every `version_check`
+    seconds so a cache hit costs no database round trip.
+
+    Every drop bumps `generation`. Callers read it before computing a
+    response and pass it to put(), which discards a response computed
+    across an invalidation instead of caching stale data under the new
+    version.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        version_check: Optional[float] = None,
+    ):
+        self.max_bytes = max_bytes or int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+        self.ttl = ttl or float(os.getenv("CACHE_TTL", "60"))
+        self.version_check = version_check or float(os.getenv("CACHE_VERSION_CHECK", "1"))
+        self.version_source: Optional[Callable[[], Awaitable[int]]] = None
+
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[int] = None
+        self._version_checked_at = 0.0
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # --------- VERSIONING --------- #
+    async def sync_version(self):
+        """Drop every entry if the data version moved since the last check"""
+        if self.version_source is None:
+            return
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check:
+            return
+        self._version_checked_at = now
+        version = await self.version_source()
+        if version != self._version:
+            if self._version is not None:
+                self.invalidate()
+            self._version = version
+
+    def invalidate(self):
+        """Drop every entry (called after writes in this process)"""
+        self._entries.clear()
+        self._bytes = 0
+        self._version_checked_at = 0.0
+        self.generation += 1
+        self.invalidations += 1
+
+    # --------- ENTRIES --------- #
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, body: bytes, generation: Optional[int] = None) -> CacheEntry:
+        """Store a body, evicting least recently used entries to stay in budget.
+
+        With `generation` (read before the body was computed), the body is
+        only stored if the cache has not been invalidated since.
+        """
+        entry = CacheEntry(body, self.ttl)
+        if len(body) > self.max_bytes:
+            return entry  # never cacheable, but still gets an ETag
+        if generation is not None and generation != self.generation:
+            return entry  # computed from data that has changed since
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return entry
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio and memory use for /metrics/cache"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "data_version": self._version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 7232 weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+# Global analytics response cache
+response_cache = ResponseCache()
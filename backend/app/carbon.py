@@ -0,0 +1,270 @@
+"""
+Carbon Engine - vectorized carbon stock and CO2e computation for plots
+"""
+
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+CO2_PER_C = 44 / 12
+
+# Plot fields the engine reads (projection for Mongo, columns for Arrow)
+INPUT_FIELDS = [
+    "DBH_cm", "Tree_Height_m", "Biomass_above_kg", "Biomass_below_kg",
+    "Soil_Organic_Carbon_g_per_kg", "Soil_Bulk_Density_g_cm3", "Soil_Depth_cm",
+    "Plot_Area_ha", "Stem_Density_per_ha", "CO2e_t",
+]
+
+# Soil defaults per Project_Type when a plot has no measurement:
+# (bulk density g/cm3, sampling depth cm) - IPCC wetlands supplement Tier 1 ranges
+SOIL_DEFAULTS = {
+    "Mangrove": (0.7, 100.0),
+    "Peatland": (0.2, 100.0),
+    "Wetland": (0.9, 30.0),
+    "Blue Carbon": (1.0, 30.0),
+}
+FALLBACK_SOIL = (1.0, 30.0)
+
+# Per-hectare outputs of compute(): averaged, never summed across plots
+DENSITY_POOLS = ("soil_c_t_per_ha",)
+
+
+# -----------------------------
+# Allometric models
+# -----------------------------
+class AllometricModel(ABC):
+    """Above/below-ground biomass (kg) for arrays of plots; NaN where inputs are missing.
+
+    per_tree models evaluate one tree from the plot's mean DBH/height; the
+    engine scales them to the plot by Stem_Density_per_ha × Plot_Area_ha.
+    """
+
+    name = "base"
+    per_tree = True
+
+    @abstractmethod
+    def biomass(self, cols: Dict[str, np.ndarray]):
+        """(above, below) biomass arrays in kg"""
+
+
+class MeasuredBiomass(AllometricModel):
+    """Use the plot's measured Biomass_above_kg / Biomass_below_kg as-is (whole-plot values)"""
+
+    name = "measured"
+    per_tree = False
+
+    def biomass(self, cols):
+        return cols["Biomass_above_kg"], cols["Biomass_below_kg"]
+
+
+class Chave2014(AllometricModel):
+    """Pantropical AGB = 0.0673 (ρ D² H)^0.976 with a root:shoot ratio for BGB"""
+
+    name = "chave2014"
+
+    def __init__(self, wood_density: float = 0.6, root_shoot: float = 0.24):
+        self.wood_density = wood_density
+        self.root_shoot = root_shoot
+
+    def biomass(self, cols):
+        above = 0.0673 * (self.wood_density * cols["DBH_cm"] ** 2 * cols["Tree_Height_m"]) ** 0.976
+        return above, above * self.root_shoot
+
+
+class Komiyama2005(AllometricModel):
+    """Common mangrove equations: AGB = 0.251 ρ D^2.46, BGB = 0.199 ρ^0.899 D^2.22"""
+
+    name = "komiyama2005"
+
+    def __init__(self, wood_density: float = 0.7):
+        self.wood_density = wood_density
+
+    def biomass(self, cols):
+        dbh = cols["DBH_cm"]
+        above = 0.251 * self.wood_density * dbh ** 2.46
+        below = 0.199 * self.wood_density ** 0.899 * dbh ** 2.22
+        return above, below
+
+
+MODELS = {m.name: m for m in (MeasuredBiomass, Chave2014, Komiyama2005)}
+
+
+def models_from_env() -> Dict[str, AllometricModel]:
+    """Per-type models from CARBON_MODELS ("Mangrove=komiyama2005"); types not listed use measured biomass"""
+    mapping: Dict[str, str] = {}
+    for item in filter(None, os.getenv("CARBON_MODELS", "").split(",")):
+        project_type, _, name = item.partition("=")
+        if name.strip() not in MODELS:
+            raise ValueError(f"Unknown allometric model '{name}' (known: {sorted(MODELS)})")
+        mapping[project_type.strip()] = name.strip()
+    return {project_type: MODELS[name]() for project_type, name in mapping.items()}
+
+
+# -----------------------------
+# Column loading
+# -----------------------------
+def _as_float(values: List[Any]) -> np.ndarray:
+    """Numbers (or numeric strings) → float64, anything else → NaN"""
+    out = np.full(len(values), np.nan)
+    for i, v in enumerate(values):
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[i] = v
+        elif isinstance(v, str):
+            try:
+                out[i] = float(v)
+            except ValueError:
+                pass
+    return out
+
+
+def _float_column(values: List[Any]) -> np.ndarray:
+    """One field of a batch → float64 in a single conversion; mixed values take the slow path"""
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return _as_float(values)
+
+
+def columns_from_docs(docs: List[Dict[str, Any]], group_field: str = "Project_Type") -> Dict[str, np.ndarray]:
+    """Plot documents → engine columns"""
+    cols = {field: _float_column([d.get(field) for d in docs]) for field in INPUT_FIELDS}
+    cols["Project_Type"] = np.array([d.get("Project_Type") for d in docs], dtype=object)
+    cols["group"] = np.array([d.get(group_field) for d in docs], dtype=object)
+    return cols
+
+
+async def columns_from_cursor(cursor, group_field: str = "Project_Type", batch_size: int = 5000) -> Dict[str, np.ndarray]:
+    """Plot cursor → engine columns, converting one batch at a time so no full document list is held"""
+    chunks: List[Dict[str, np.ndarray]] = []
+    while True:
+        docs = await cursor.to_list(length=batch_size)
+        if not docs:
+            break
+        chunks.append(columns_from_docs(docs, group_field))
+    if not chunks:
+        return columns_from_docs([], group_field)
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+
+def columns_from_table(table, group_field: str = "Project_Type") -> Dict[str, np.ndarray]:
+    """Arrow table (plot snapshot) → engine columns; nulls become NaN"""
+    cols = {
+        field: table[field].to_numpy(zero_copy_only=False).astype(np.float64)
+        for field in INPUT_FIELDS
+    }
+    cols["Project_Type"] = table["Project_Type"].to_numpy(zero_copy_only=False).astype(object)
+    cols["group"] = table[group_field].to_numpy(zero_copy_only=False).astype(object)
+    return cols
+
+
+# -----------------------------
+# Engine
+# -----------------------------
+class CarbonEngine:
+    """Computes carbon pools per plot and rolls them up, entirely with array operations.
+
+    Biomass defaults to the plot's measured values; CARBON_MODELS opts a
+    Project_Type into an allometric model, whose per-tree biomass is scaled
+    to the plot by stems/ha × area. Plots a model cannot evaluate (missing
+    DBH, height, stem density or area) fall back to measured biomass.
+    Biomass carbon = biomass × carbon fraction.
+
+    Soil carbon density (t/ha) = SOC g/kg × bulk density g/cm3 × depth cm × 0.1
+    is reported for every plot with an SOC reading; soil tonnes need
+    Plot_Area_ha, so plots without one add no soil tonnes and are counted
+    in plots_without_area.
+    """
+
+    def __init__(self, models: Optional[Dict[str, AllometricModel]] = None, carbon_fraction: Optional[float] = None):
+        self.models = models if models is not None else models_from_env()
+        self.default_model = MeasuredBiomass()
+        self.carbon_fraction = carbon_fraction or float(os.getenv("CARBON_FRACTION", "0.47"))
+
+    def compute(self, cols: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Per-plot above/below/soil carbon, total carbon and CO2e, all in tonnes"""
+        types = cols["Project_Type"]
+        n = len(types)
+        above = np.full(n, np.nan)
+        below = np.full(n, np.nan)
+
+        for project_type in set(types.tolist()):
+            mask = types == project_type
+            model = self.models.get(project_type, self.default_model)
+            subset = {k: v[mask] for k, v in cols.items() if v.dtype != object}
+            model_above, model_below = model.biomass(subset)
+            if model.per_tree:
+                stems = subset["Stem_Density_per_ha"] * subset["Plot_Area_ha"]
+                model_above, model_below = model_above * stems, model_below * stems
+            above[mask], below[mask] = model_above, model_below
+
+        above = np.where(np.isnan(above), cols["Biomass_above_kg"], above)
+        below = np.where(np.isnan(below), cols["Biomass_below_kg"], below)
+
+        bulk_density = cols["Soil_Bulk_Density_g_cm3"].copy()
+        depth = cols["Soil_Depth_cm"].copy()
+        for project_type in set(types.tolist()):
+            mask = types == project_type
+            default_bd, default_depth = SOIL_DEFAULTS.get(project_type, FALLBACK_SOIL)
+            bulk_density[mask & np.isnan(bulk_density)] = default_bd
+            depth[mask & np.isnan(depth)] = default_depth
+
+        soil_t_per_ha = cols["Soil_Organic_Carbon_g_per_kg"] * bulk_density * depth * 0.1
+        soil = np.nan_to_num(soil_t_per_ha * cols["Plot_Area_ha"])
+
+        above_c = np.nan_to_num(above) * self.carbon_fraction / 1000
+        below_c = np.nan_to_num(below) * self.carbon_fraction / 1000
+        total_c = above_c + below_c + soil
+        return {
+            "above_c_t": above_c,
+            "below_c_t": below_c,
+            "soil_c_t": soil,
+            "total_c_t": total_c,
+            "co2e_t": total_c * CO2_PER_C,
+            "soil_c_t_per_ha": soil_t_per_ha,
+        }
+
+    @staticmethod
+    def _mean(values: np.ndarray) -> Optional[float]:
+        present = values[~np.isnan(values)]
+        return float(present.mean()) if len(present) else None
+
+    def totals(self, cols: Dict[str, np.ndarray], stocks: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        """Sums over every plot (mean soil density), plus the reported CO2e_t for comparison"""
+        return {
+            "plots": int(len(cols["group"])),
+            **{k: float(v.sum()) for k, v in stocks.items() if k not in DENSITY_POOLS},
+            "mean_soil_c_t_per_ha": self._mean(stocks["soil_c_t_per_ha"]),
+            "reported_co2e_t": float(np.nansum(cols["CO2e_t"])),
+            "plots_without_area": int(np.isnan(cols["Plot_Area_ha"]).sum()),
+        }
+
+    def aggregate(self, cols: Dict[str, np.ndarray], stocks: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        """Per-group sums (group = Project_Type or project_id) via a single bincount per pool"""
+        keys = np.array([str(g) if g is not None else "" for g in cols["group"]], dtype=object)
+        groups, index = np.unique(keys, return_inverse=True)
+        sums = {
+            k: np.bincount(index, weights=v, minlength=len(groups)) for k, v in stocks.items() if k not in DENSITY_POOLS
+        }
+        reported = np.bincount(index, weights=np.nan_to_num(cols["CO2e_t"]), minlength=len(groups))
+        counts = np.bincount(index, minlength=len(groups))
+        density = stocks["soil_c_t_per_ha"]
+        density_sum = np.bincount(index, weights=np.nan_to_num(density), minlength=len(groups))
+        density_count = np.bincount(index, weights=~np.isnan(density), minlength=len(groups))
+        without_area = np.bincount(index, weights=np.isnan(cols["Plot_Area_ha"]), minlength=len(groups))
+        return [
+            {
+                "_id": group or None,
+                "plots": int(counts[i]),
+                **{k: float(v[i]) for k, v in sums.items()},
+                "mean_soil_c_t_per_ha": float(density_sum[i] / density_count[i]) if density_count[i] else None,
+                "reported_co2e_t": float(reported[i]),
+                "plots_without_area": int(without_area[i]),
+            }
+            for i, group in enumerate(groups)
+        ]
+
+
+# Global engine (models from CARBON_MODELS, fraction from CARBON_FRACTION)
+carbon_engine = CarbonEngine()
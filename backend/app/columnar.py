@@ -0,0 +1,343 @@
+"""
+Columnar Plot Snapshot - Parquet export of plots and an Arrow analytics engine
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:  # optional - the Mongo engine works without it
+    pa = pc = ds = None
+
+from app.ingest import NUMERIC_FIELDS, parse_float
+from app.rollups import mongo_sort_key
+
+SNAPSHOT_DIR = os.getenv("PLOTS_SNAPSHOT_DIR", os.path.join("snapshots", "plots"))
+META_FILE = "_snapshot.json"
+
+STRING_COLUMNS = ["ID", "project_id", "Project_Type", "Data_Source", "Notes"]
+FLOAT_COLUMNS = NUMERIC_FIELDS + ["Carbon_t", "CO2e_t"]
+PARTITION_COLUMNS = ["Project_Type", "Monitoring_Year"]
+# location.coordinates - the point Mongo's geo filters match, not the raw GPS_* columns
+LOCATION_COLUMNS = ["location_lng", "location_lat"]
+# Bumped when the schema changes; older snapshots are ignored until rebuilt
+SNAPSHOT_FORMAT = 2
+
+
+def _schema():
+    return pa.schema(
+        [(c, pa.string()) for c in STRING_COLUMNS]
+        + [(c, pa.float64()) for c in FLOAT_COLUMNS + LOCATION_COLUMNS]
+        + [("Monitoring_Year", pa.int32()), ("Timestamp", pa.timestamp("ms"))]
+    )
+
+
+def _partitioning():
+    return ds.partitioning(
+        pa.schema([("Project_Type", pa.string()), ("Monitoring_Year", pa.int32())]), flavor="hive"
+    )
+
+
+def _float(value) -> Optional[float]:
+    """Numbers as float, numeric strings (e.g. Carbon_t from the CSV) parsed, NaN → null"""
+    if isinstance(value, str):
+        return parse_float(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value) if value == value and abs(value) != float("inf") else None
+
+
+def _year(value) -> Optional[int]:
+    return int(value) if isinstance(value, (int, float)) and value == value and not isinstance(value, bool) else None
+
+
+def _coordinates(doc: Dict[str, Any]) -> List[Optional[float]]:
+    """[lng, lat] of the plot's GeoJSON location, or nulls if it has none"""
+    coordinates = (doc.get("location") or {}).get("coordinates") or [None, None]
+    return [_float(c) for c in coordinates[:2]]
+
+
+def _record_batch(docs: List[Dict[str, Any]]):
+    """Mongo plot documents → Arrow RecordBatch with the snapshot schema"""
+    columns = {}
+    for c in STRING_COLUMNS:
+        columns[c] = pa.array([None if d.get(c) is None else str(d[c]) for d in docs], pa.string())
+    for c in FLOAT_COLUMNS:
+        columns[c] = pa.array([_float(d.get(c)) for d in docs], pa.float64())
+    coordinates = [_coordinates(d) for d in docs]
+    for i, c in enumerate(LOCATION_COLUMNS):
+        columns[c] = pa.array([point[i] for point in coordinates], pa.float64())
+    columns["Monitoring_Year"] = pa.array([_year(d.get("Monitoring_Year")) for d in docs], pa.int32())
+    columns["Timestamp"] = pa.array(
+        [d["Timestamp"] if isinstance(d.get("Timestamp"), datetime) else None for d in docs],
+        pa.timestamp("ms"),
+    )
+    return pa.RecordBatch.from_pydict(columns, schema=_schema())
+
+
+# -----------------------------
+# Snapshot job
+# -----------------------------
+async def write_snapshot(db, path: str = SNAPSHOT_DIR, batch_size: int = 5000) -> Dict[str, Any]:
+    """Export every plot into a Parquet dataset partitioned by Project_Type/Monitoring_Year.
+
+    The Mongo cursor is drained batch by batch into the Parquet writer
+    (running in a thread), and the finished dataset replaces the previous
+    snapshot with a directory rename so readers never see a partial one.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed")
+
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    version = await db.get_plot_data_version()
+    projection = {c: 1 for c in STRING_COLUMNS + FLOAT_COLUMNS + ["Monitoring_Year", "Timestamp", "location"]}
+    cursor = db.iter_plots({}, projection).batch_size(batch_size)
+    rows = 0
+
+    def batches():
+        nonlocal rows
+        while True:
+            docs = asyncio.run_coroutine_threadsafe(cursor.to_list(length=batch_size), loop).result()
+            if not docs:
+                return
+            rows += len(docs)
+            yield _record_batch(docs)
+
+    staging = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    await asyncio.to_thread(
+        ds.write_dataset,
+        batches(),
+        staging,
+        schema=_schema(),
+        format="parquet",
+        partitioning=_partitioning(),
+        existing_data_behavior="overwrite_or_ignore",
+        max_rows_per_group=128 * 1024,
+    )
+
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "rows": rows,
+        "data_version": version,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    with open(os.path.join(staging, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+    previous = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.replace(path, previous)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    os.replace(staging, path)
+    shutil.rmtree(previous, ignore_errors=True)
+    return meta
+
+
+# -----------------------------
+# Arrow analytics engine
+# -----------------------------
+class ArrowAnalytics:
+    """Answers the analytics queries from the Parquet snapshot with vectorized group-bys.
+
+    Each query reads only the columns it needs, and year/type filters prune
+    whole partitions. Results have the same shape as AnalyticsService's.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_DIR):
+        self.path = path
+        self._dataset = None
+        self._built_at = None
+        self._meta: Dict[str, Any] = {}
+        self._meta_key = None
+
+    def available(self) -> bool:
+        if pa is None:
+            return False
+        return self.metadata().get("format") == SNAPSHOT_FORMAT
+
+    def metadata(self) -> Dict[str, Any]:
+        """Snapshot metadata ({} if there is none), re-read only when the file changes.
+
+        Publishing swaps the whole directory, so a new snapshot always shows
+        up as a different inode or mtime; a request costs one stat().
+        """
+        try:
+            stat = os.stat(os.path.join(self.path, META_FILE))
+        except FileNotFoundError:
+            return {}
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._meta_key:
+            with open(os.path.join(self.path, META_FILE)) as f:
+                self._meta, self._meta_key = json.load(f), key
+        return self._meta
+
+    def _data(self):
+        """Dataset handle, reopened whenever a newer snapshot has been published"""
+        built_at = self.metadata()["built_at"]
+        if self._dataset is None or built_at != self._built_at:
+            self._dataset = ds.dataset(self.path, format="parquet", partitioning=_partitioning())
+            self._built_at = built_at
+        return self._dataset
+
+    def _table(self, columns: List[str], filter_expr=None):
+        return self._data().to_table(columns=columns, filter=filter_expr)
+
+    def read_columns(self, columns: List[str]):
+        """Selected columns of every snapshot row as one Arrow table"""
+        return self._table(columns)
+
+    @staticmethod
+    def _group(table, keys: List[str], aggregations: List[tuple]) -> List[Dict[str, Any]]:
+        return table.group_by(keys).aggregate(aggregations).to_pylist()
+
+    # ----------------- QUERIES -----------------
+    def _overview(self, expr=None) -> Dict[str, Any]:
+        table = self._table(["ID", "Project_Type"], expr)
+        rows = self._group(table, ["Project_Type"], [("ID", "count", pc.CountOptions(mode="all"))])
+        by_type = [{"_id": r["Project_Type"], "count": r["ID_count"]} for r in rows]
+        by_type.sort(key=lambda r: r["count"], reverse=True)
+        return {"total_plots": table.num_rows, "by_type": by_type}
+
+    def _ndvi_by_type(self, expr=None) -> List[Dict[str, Any]]:
+        rows = self._group(self._table(["Project_Type", "NDVI"], expr), ["Project_Type"], [("NDVI", "mean")])
+        rows = [{"_id": r["Project_Type"], "avgNDVI": r["NDVI_mean"]} for r in rows]
+        rows.sort(key=lambda r: mongo_sort_key(r["avgNDVI"]), reverse=True)
+        return rows
+
+    def _ndvi_by_type_source(self, expr=None) -> List[Dict[str, Any]]:
+        table = self._table(["Project_Type", "Data_Source", "NDVI"], expr)
+        rows = self._group(table, ["Project_Type", "Data_Source"], [("NDVI", "mean")])
+        rows = [
+            {"_id": {"type": r["Project_Type"], "source": r["Data_Source"]}, "avgNDVI": r["NDVI_mean"]}
+            for r in rows
+        ]
+        rows.sort(key=lambda r: (mongo_sort_key(r["_id"]["type"]), mongo_sort_key(r["_id"]["source"])))
+        return rows
+
+    def _by_year(self, expr=None) -> List[Dict[str, Any]]:
+        """Biomass and flux aggregates per Monitoring_Year in one group-by"""
+        table = self._table(
+            ["Monitoring_Year", "Biomass_above_kg", "Biomass_below_kg", "CO2_Flux_mg_m2_day", "CH4_Flux_mg_m2_day"],
+            expr,
+        )
+        table = table.append_column(
+            "Biomass_total", pc.add(table["Biomass_above_kg"], table["Biomass_below_kg"])
+        )
+        rows = self._group(table, ["Monitoring_Year"], [
+            ("Biomass_above_kg", "mean"),
+            ("Biomass_below_kg", "mean"),
+            ("Biomass_total", "sum", pc.ScalarAggregateOptions(min_count=0)),
+            ("CO2_Flux_mg_m2_day", "mean"),
+            ("CH4_Flux_mg_m2_day", "mean"),
+        ])
+        rows.sort(key=lambda r: mongo_sort_key(r["Monitoring_Year"]))
+        return rows
+
+    def _biomass(self, rows) -> List[Dict[str, Any]]:
+        return [
+            {
+                "_id": r["Monitoring_Year"],
+                "avgAbove": r["Biomass_above_kg_mean"],
+                "avgBelow": r["Biomass_below_kg_mean"],
+                "total": r["Biomass_total_sum"],
+            }
+            for r in rows
+        ]
+
+    def _fluxes(self, rows) -> Dict[str, Any]:
+        return {
+            "co2": [{"_id": r["Monitoring_Year"], "avgCO2": r["CO2_Flux_mg_m2_day_mean"]} for r in rows],
+            "ch4": [{"_id": r["Monitoring_Year"], "avgCH4": r["CH4_Flux_mg_m2_day_mean"]} for r in rows],
+        }
+
+    def _monthly(self, expr=None) -> List[Dict[str, Any]]:
+        table = self._table(["Timestamp", "NDVI"], expr)
+        table = pa.table({
+            "year": pc.year(table["Timestamp"]),
+            "month": pc.month(table["Timestamp"]),
+            "NDVI": table["NDVI"],
+        })
+        rows = self._group(table, ["year", "month"], [("NDVI", "mean")])
+        rows = [{"_id": {"year": r["year"], "month": r["month"]}, "avgNDVI": r["NDVI_mean"]} for r in rows]
+        rows.sort(key=lambda r: (mongo_sort_key(r["_id"]["year"]), mongo_sort_key(r["_id"]["month"])))
+        return rows
+
+    def _summary(self, year_from=None, year_to=None, project_type=None, bbox=None) -> Dict[str, Any]:
+        expr = None
+        clauses = []
+        if year_from is not None:
+            clauses.append(ds.field("Monitoring_Year") >= year_from)
+        if year_to is not None:
+            clauses.append(ds.field("Monitoring_Year") <= year_to)
+        if project_type:
+            clauses.append(ds.field("Project_Type") == project_type)
+        if bbox:
+            # Same point as Mongo's $geoWithin; edges are compared as a plain lon/lat
+            # rectangle, which matches the geodesic polygon for the small boxes used here
+            min_lon, min_lat, max_lon, max_lat = bbox
+            clauses += [
+                ds.field("location_lng") >= min_lon, ds.field("location_lng") <= max_lon,
+                ds.field("location_lat") >= min_lat, ds.field("location_lat") <= max_lat,
+            ]
+        for clause in clauses:
+            expr = clause if expr is None else expr & clause
+
+        yearly = self._by_year(expr)
+        return {
+            **self._overview(expr),
+            "ndvi_by_type": self._ndvi_by_type(expr),
+            "ndvi_by_type_source": self._ndvi_by_type_source(expr),
+            "biomass": self._biomass(yearly),
+            **self._fluxes(yearly),
+            "ndvi_monthly": self._monthly(expr),
+        }
+
+    # Async wrappers so the CPU-bound work stays off the event loop
+    async def plots_overview(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._overview)
+
+    async def ndvi_by_project(self) -> Dict[str, Any]:
+        return {"ndvi": await asyncio.to_thread(self._ndvi_by_type)}
+
+    async def ndvi_by_project_source(self) -> Dict[str, Any]:
+        return {"ndvi": await asyncio.to_thread(self._ndvi_by_type_source)}
+
+    async def biomass_trend(self) -> Dict[str, Any]:
+        return {"biomass": self._biomass(await asyncio.to_thread(self._by_year))}
+
+    async def fluxes(self) -> Dict[str, Any]:
+        return self._fluxes(await asyncio.to_thread(self._by_year))
+
+    async def ndvi_monthly(self) -> Dict[str, Any]:
+        return {"trend": await asyncio.to_thread(self._monthly)}
+
+    async def summary(self, **filters) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._summary, **filters)
+
+
+# Global Arrow engine over the configured snapshot
+arrow_analytics = ArrowAnalytics()
+
+
+if __name__ == "__main__":
+    # Snapshot job: python -m app.columnar [path]
+    from app.database import db_client
+
+    async def main():
+        await db_client.connect()
+        meta = await write_snapshot(db_client, sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_DIR)
+        print(f"📦 Plot snapshot written: {meta['rows']} rows in {meta['seconds']}s")
+
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Background Transaction Confirmer - settles submit-and-track writes
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+from app.blockchain import bluecarbon_client
+from app.database import db_client
+from app.metrics import TX_CONFIRMATION
+
+logger = logging.getLogger(__name__)
+
+
+def retirement_amounts(request: Dict[str, Any]) -> Dict[str, int]:
+    """Credits a single or batch retirement takes from each project, repeats merged"""
+    items = request.get("items") or [request]
+    amounts: Dict[str, int] = {}
+    for item in items:
+        amounts[item["project_id"]] = amounts.get(item["project_id"], 0) + item["amount"]
+    return amounts
+
+
+class TransactionConfirmer:
+    """Polls receipts for pending transactions and applies their DB side effects"""
+
+    def __init__(self, db, chain, poll_interval: Optional[float] = None):
+        self.db = db
+        self.chain = chain
+        self.poll_interval = poll_interval or float(os.getenv("TX_POLL_INTERVAL", "2"))
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the polling loop on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the polling loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.warning("⚠️  Confirmer poll failed: %s", e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def poll_once(self) -> int:
+        """Check every pending transaction once; returns how many were settled"""
+        settled = 0
+        for tx in await self.db.get_pending_transactions():
+            receipt = await self.chain.get_transaction_receipt(tx["tx_hash"])
+            if receipt is None:
+                continue
+            if await self.settle(tx["tx_hash"], receipt):
+                settled += 1
+        return settled
+
+    async def settle(self, tx_hash: str, receipt: Dict[str, Any]) -> bool:
+        """Record the final status of a transaction and apply its balance changes"""
+        status = "confirmed" if receipt["status"] == 1 else "failed"
+        tx = await self.db.claim_pending_transaction(tx_hash, status, receipt)
+        if tx is None:
+            # Already settled by another worker
+            return False
+
+        details = tx.get("details", {})
+        project_id = tx.get("project_id")
+
+        if tx["type"] == "project_registration":
+            await self.db.set_project_status(project_id, "active" if status == "confirmed" else "failed")
+            token_id = self.chain.registered_token_id(project_id, receipt)
+            if token_id:
+                await self.db.set_project_token_id(project_id, token_id)
+        elif tx["type"] == "credit_issuance" and status == "confirmed":
+            await self.db.update_project_balance(project_id, details["amount"], operation="issue")
+        elif tx["type"] in ("credit_retirement", "credit_retirement_batch"):
+            # Credits were reserved before broadcast: retire them, or hand them back on a revert
+            await self.db.settle_reservations(
+                retirement_amounts(details), details["operation_id"], retired=status == "confirmed"
+            )
+
+        submitted = tx.get("timestamp")
+        if submitted:
+            if submitted.tzinfo is None:
+                submitted = submitted.replace(tzinfo=timezone.utc)
+            TX_CONFIRMATION.labels(tx["type"], status).observe(
+                (datetime.now(timezone.utc) - submitted).total_seconds()
+            )
+
+        logger.info(
+            "⛓️  Tx %s %s in block %s", tx_hash, status, receipt.get("blockNumber"),
+            extra={"tx_hash": tx_hash, "tx_type": tx["type"], "status": status},
+        )
+        return True
+
+
+# Global confirmer
+tx_confirmer = TransactionConfirmer(db_client, bluecarbon_client)
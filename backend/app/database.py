@@ -2,54 +2,138 @@
 BlueCarbon Database Layer - MongoDB Connection
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 from dotenv import load_dotenv
+import asyncio
+import logging
 import os
 from datetime import datetime, timezone
 from typing import Dict, Any, List, Optional
 
+from app.metrics import mongo_listeners
+from app.rollups import (
+    META_ID,
+    PLOT_FIELDS,
+    bucket_document,
+    bucket_filter,
+    delta_update,
+    merge_deltas,
+    rollup_deltas,
+)
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+def keyset_after(field: str, after: List[Any]) -> Dict[str, Any]:
+    """Rows strictly after (value, _id) in a (field desc, _id desc) ordering"""
+    value, last_id = after
+    return {"$or": [{field: {"$lt": value}}, {field: value, "_id": {"$lt": last_id}}]}
+
 
 class BlueCarbonDatabase:
-    """MongoDB connection for BlueCarbon API"""
+    """Async (Motor) MongoDB connection for BlueCarbon API"""
 
     def __init__(self):
-        # Connect to MongoDB
-        self.client = MongoClient(os.getenv("MONGO_URI"))
-        self.db = self.client["bluecarbon"]  # Your database name
+        # Motor connects lazily - nothing here touches the network or blocks
+        self.client = AsyncIOMotorClient(
+            os.getenv("MONGO_URI"),
+            maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+            minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+            maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000")),
+            waitQueueTimeoutMS=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+            serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+            connectTimeoutMS=int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+            socketTimeoutMS=int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+            event_listeners=mongo_listeners,
+        )
+        self.db = self.client[os.getenv("MONGO_DB", "bluecarbon")]
 
         # Collections
         self.projects = self.db["projects"]
         self.transactions = self.db["transactions"]
         self.users = self.db["users"]
+        self.plots = self.db["plots"]
+        self.plot_rollups = self.db["plot_rollups"]
+
+        # Chain index (maintained by app.indexer)
+        self.chain_events = self.db["chain_events"]
+        self.holder_balances = self.db["holder_balances"]
+        self.sync_state = self.db["sync_state"]
+
+        # Write intents for idempotent credit operations (maintained by app.outbox)
+        self.operations = self.db["operations"]
+
+        # Set once the unique plots.ID index upsert_plots relies on has been seen
+        self._plot_id_unique = False
+        # Plot count last warned about as missing from the rollups
+        self._stale_rollups: Optional[int] = None
 
-        # Test connection
+    async def connect(self):
+        """Test connection (called from the app's lifespan hook)"""
         try:
-            self.client.admin.command("ping")
-            print(f"✅ Connected to MongoDB '{self.db.name}' database")
-            print(f"   📊 Projects: {self.projects.count_documents({})}")
-            print(f"   💸 Transactions: {self.transactions.count_documents({})}")
-            print(f"   👥 Users: {self.users.count_documents({})}")
+            await self.client.admin.command("ping")
+            logger.info("✅ Connected to MongoDB '%s' database", self.db.name)
         except Exception as e:
-            print(f"❌ MongoDB connection failed: {e}")
+            logger.error("❌ MongoDB connection failed: %s", e)
             raise
 
+    @property
+    def name(self) -> str:
+        return self.db.name
+
+    def close(self):
+        self.client.close()
+
     # ----------------- PROJECTS -----------------
-    def get_project(self, project_id: str) -> Optional[Dict[str, Any]]:
+    async def get_project(
+        self, project_id: str, projection: Optional[Dict[str, int]] = None
+    ) -> Optional[Dict[str, Any]]:
         """Get project by ID"""
-        return self.projects.find_one({"project_id": project_id})
+        return await self.projects.find_one({"project_id": project_id}, projection)
 
-    def get_projects(self, limit: int = 100, skip: int = 0) -> List[Dict[str, Any]]:
-        """Get list of projects with pagination"""
-        pipeline = [
-            {"$sort": {"created_at": -1}},
-            {"$skip": skip},
-            {"$limit": limit},
-        ]
-        return list(self.projects.aggregate(pipeline))
+    async def get_projects_by_ids(self, project_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get several projects in one query, keyed by project_id"""
+        cursor = self.projects.find({"project_id": {"$in": project_ids}})
+        return {p["project_id"]: p async for p in cursor}
+
+    async def get_project_ids(self) -> List[str]:
+        """Get the IDs of every stored project"""
+        cursor = self.projects.find({}, {"project_id": 1, "_id": 0})
+        return [p["project_id"] async for p in cursor]
+
+    async def get_project_token_id_map(self) -> Dict[str, int]:
+        """Get every persisted projectId → tokenId mapping"""
+        cursor = self.projects.find(
+            {"token_id": {"$gt": 0}}, {"project_id": 1, "token_id": 1, "_id": 0}
+        )
+        return {p["project_id"]: p["token_id"] async for p in cursor}
+
+    async def set_project_token_id(self, project_id: str, token_id: int):
+        """Persist the on-chain token ID of a project"""
+        await self.projects.update_one(
+            {"project_id": project_id},
+            {"$set": {"token_id": token_id, "updated_at": datetime.now(timezone.utc)}},
+        )
 
-    def store_project(self, project_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def get_projects(
+        self,
+        limit: int = 100,
+        skip: int = 0,
+        after: Optional[List[Any]] = None,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Get projects newest first; `after` is the (created_at, _id) of the previous page's last row"""
+        query = keyset_after("created_at", after) if after else {}
+        cursor = self.projects.find(query, projection).sort([("created_at", -1), ("_id", -1)])
+        if skip and not after:
+            cursor = cursor.skip(skip)
+        return await cursor.limit(limit).to_list(length=None)
+
+    async def store_project(self, project_data: Dict[str, Any]) -> Dict[str, Any]:
         """Store new project"""
         try:
             # Ensure required fields
@@ -65,17 +149,22 @@ class BlueCarbonDatabase:
                     "last_updated": project_data["created_at"],
                 }
 
-            result = self.projects.insert_one(project_data)
+            result = await self.projects.insert_one(project_data)
             project_data["_id"] = str(result.inserted_id)
-            print(f"✅ Project stored: {project_data['project_id']}")
+            logger.debug("✅ Project stored: %s", project_data["project_id"])
             return project_data
         except Exception as e:
-            print(
-                f"❌ Failed to store project {project_data.get('project_id', 'unknown')}: {e}"
-            )
+            logger.error("❌ Failed to store project %s: %s", project_data.get("project_id", "unknown"), e)
             raise
 
-    def update_project_balance(
+    async def set_project_status(self, project_id: str, status: str):
+        """Update the lifecycle status of a project"""
+        await self.projects.update_one(
+            {"project_id": project_id},
+            {"$set": {"status": status, "updated_at": datetime.now(timezone.utc)}},
+        )
+
+    async def update_project_balance(
         self, project_id: str, amount: int, operation: str = "issue"
     ):
         """Update project balances"""
@@ -94,7 +183,7 @@ class BlueCarbonDatabase:
             else:
                 raise ValueError(f"Unknown operation: {operation}")
 
-            result = self.projects.update_one(
+            result = await self.projects.update_one(
                 {"project_id": project_id},
                 {
                     "$inc": inc_updates,
@@ -106,22 +195,105 @@ class BlueCarbonDatabase:
             )
 
             if result.modified_count > 0:
-                print(
-                    f"💰 Updated balance for {project_id}: "
-                    f"{'+' if operation == 'issue' else '-'}{amount}"
+                logger.debug(
+                    "💰 Updated balance for %s: %s%d", project_id, "+" if operation == "issue" else "-", amount
                 )
             else:
-                print(f"⚠️  No project found: {project_id}")
+                logger.warning("⚠️  No project found: %s", project_id)
 
         except Exception as e:
-            print(f"❌ Failed to update balance for {project_id}: {e}")
+            logger.error("❌ Failed to update balance for %s: %s", project_id, e)
             raise
 
+    async def reserve_credits(
+        self, project_id: str, amount: int, reservation_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Move `amount` from circulating to reserved in one conditional update.
+
+        The balance check is part of the filter, so concurrent retirements
+        cannot overdraw a project; None if it is missing or short of credits.
+        """
+        now = datetime.now(timezone.utc)
+        return await self.projects.find_one_and_update(
+            {"project_id": project_id, "balances.circulating": {"$gte": amount}},
+            {
+                "$inc": {"balances.circulating": -amount, "balances.reserved": amount},
+                "$set": {
+                    f"balances.reservations.{reservation_id}": amount,
+                    "updated_at": now,
+                    "balances.last_updated": now,
+                },
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def reserve_credits_batch(self, amounts: Dict[str, int], reservation_id: str) -> bool:
+        """Reserve every project's share in one bulk write, all or nothing.
+
+        Each update carries its own balance check, like reserve_credits; if
+        fewer than all of them match, the shares that were taken are
+        released in one more bulk write and False is returned.
+        """
+        now = datetime.now(timezone.utc)
+        result = await self.projects.bulk_write(
+            [
+                UpdateOne(
+                    {"project_id": project_id, "balances.circulating": {"$gte": amount}},
+                    {
+                        "$inc": {"balances.circulating": -amount, "balances.reserved": amount},
+                        "$set": {
+                            f"balances.reservations.{reservation_id}": amount,
+                            "updated_at": now,
+                            "balances.last_updated": now,
+                        },
+                    },
+                )
+                for project_id, amount in amounts.items()
+            ],
+            ordered=False,
+        )
+        if result.matched_count == len(amounts):
+            return True
+        await self.settle_reservations(amounts, reservation_id, retired=False)
+        return False
+
+    async def settle_reservations(self, amounts: Dict[str, int], reservation_id: str, retired: bool) -> int:
+        """Retire (retired=True) or release a reservation's shares in one bulk write.
+
+        Shares that are already settled (or were never taken) do not match;
+        returns how many were settled now.
+        """
+        if not amounts:
+            return 0
+        now = datetime.now(timezone.utc)
+        result = await self.projects.bulk_write(
+            [
+                UpdateOne(
+                    {"project_id": project_id, f"balances.reservations.{reservation_id}": amount},
+                    {
+                        "$inc": {
+                            "balances.reserved": -amount,
+                            "balances.total_retired" if retired else "balances.circulating": amount,
+                        },
+                        "$unset": {f"balances.reservations.{reservation_id}": ""},
+                        "$set": {"updated_at": now, "balances.last_updated": now},
+                    },
+                )
+                for project_id, amount in amounts.items()
+            ],
+            ordered=False,
+        )
+        return result.modified_count
+
     # ----------------- TRANSACTIONS -----------------
-    def log_transaction(
-        self, tx_type: str, tx_hash: str, details: Dict[str, Any]
+    async def log_transaction(
+        self,
+        tx_type: str,
+        tx_hash: str,
+        details: Dict[str, Any],
+        status: str = "confirmed",
     ) -> Dict[str, Any]:
-        """Log blockchain transaction"""
+        """Log blockchain transaction (status is "pending" for submit-and-track writes)"""
         try:
             project_id = details.get("project_id")
             doc = {
@@ -129,41 +301,130 @@ class BlueCarbonDatabase:
                 "tx_hash": tx_hash,
                 "project_id": project_id,  # 🔑 top-level
                 "details": details,
-                "status": "confirmed",
+                "status": status,
                 "timestamp": datetime.now(timezone.utc),
                 "created_at": datetime.now(timezone.utc),
             }
 
-            result = self.transactions.insert_one(doc)
+            result = await self.transactions.insert_one(doc)
             doc["_id"] = str(result.inserted_id)
-            print(f"📝 Transaction logged: {tx_hash[:16]}... for project {project_id}")
+            logger.debug("📝 Transaction logged: %s for project %s", tx_hash, project_id)
             return doc
         except Exception as e:
-            print(f"❌ Failed to log transaction: {e}")
+            logger.error("❌ Failed to log transaction %s: %s", tx_hash, e)
             raise
 
-    def get_transaction_history(
-        self, project_id: Optional[str] = None, limit: int = 50
+    async def get_transaction(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        """Get a logged transaction by hash"""
+        return await self.transactions.find_one({"tx_hash": tx_hash})
+
+    async def get_pending_transactions(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get transactions still waiting for a receipt, oldest first"""
+        cursor = self.transactions.find({"status": "pending"}).sort("timestamp", 1)
+        return await cursor.to_list(length=limit)
+
+    async def claim_pending_transaction(
+        self, tx_hash: str, status: str, receipt: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Move a pending transaction to its final status.
+
+        The update only matches while the transaction is still pending, so when
+        several workers run a confirmer exactly one of them gets the document
+        back and applies its side effects.
+        """
+        now = datetime.now(timezone.utc)
+        return await self.transactions.find_one_and_update(
+            {"tx_hash": tx_hash, "status": "pending"},
+            {
+                "$set": {
+                    "status": status,
+                    "block_number": receipt.get("blockNumber"),
+                    "gas_used": receipt.get("gasUsed"),
+                    "confirmed_at": now,
+                }
+            },
+        )
+
+    async def get_transaction_history(
+        self,
+        project_id: Optional[str] = None,
+        limit: int = 50,
+        after: Optional[List[Any]] = None,
+        projection: Optional[Dict[str, int]] = None,
     ) -> List[Dict[str, Any]]:
-        """Get transaction history for a project or all"""
+        """Get transaction history for a project or all, newest first.
+
+        `after` is the (timestamp, _id) of the previous page's last row, so
+        every page is an index range scan rather than a growing skip.
+        """
         query = {} if not project_id else {"project_id": project_id}
+        if after:
+            query.update(keyset_after("timestamp", after))
 
-        pipeline = [
-            {"$match": query},
-            {"$sort": {"timestamp": -1}},
-            {"$limit": limit},
-        ]
+        cursor = self.transactions.find(query, projection).sort([("timestamp", -1), ("_id", -1)])
+        return await cursor.limit(limit).to_list(length=None)
+
+    def iter_transactions(self, query: Dict[str, Any], projection: Optional[Dict[str, int]] = None):
+        """Cursor over matching transactions oldest first, fetched in batches (for exports)"""
+        return self.transactions.find(query, projection).sort([("timestamp", 1), ("_id", 1)]).batch_size(1000)
+
+    # ----------------- OPERATIONS (outbox) -----------------
+    async def insert_operation(self, operation: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a write's intent; DuplicateKeyError if its idempotency_key was used before"""
+        now = datetime.now(timezone.utc)
+        operation.update({"created_at": now, "updated_at": now})
+        result = await self.operations.insert_one(operation)
+        operation["_id"] = result.inserted_id
+        return operation
+
+    async def get_operation(self, idempotency_key: str) -> Optional[Dict[str, Any]]:
+        """Get an operation by its Idempotency-Key"""
+        return await self.operations.find_one({"idempotency_key": idempotency_key})
+
+    async def update_operation(
+        self, operation_id: Any, fields: Dict[str, Any], expect: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Set fields on an operation still matching `expect`; the updated doc, or None if it moved on"""
+        return await self.operations.find_one_and_update(
+            {"_id": operation_id, **(expect or {})},
+            {"$set": {**fields, "updated_at": datetime.now(timezone.utc)}},
+            return_document=ReturnDocument.AFTER,
+        )
 
-        return list(self.transactions.aggregate(pipeline))
+    async def record_signed_transaction(self, operation_id: Any, tx_hash: str, raw_tx: str) -> Optional[Dict[str, Any]]:
+        """Mark an operation signed, keeping every tx it signed (a nonce retry signs a replacement)"""
+        return await self.operations.find_one_and_update(
+            {"_id": operation_id},
+            {
+                "$set": {"state": "signed", "tx_hash": tx_hash, "raw_tx": raw_tx, "updated_at": datetime.now(timezone.utc)},
+                "$push": {"signed": {"tx_hash": tx_hash, "raw_tx": raw_tx}},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def get_stale_operations(self, before: datetime, limit: int = 100) -> List[Dict[str, Any]]:
+        """Open (pending / signed) operations untouched since `before`, oldest first"""
+        cursor = self.operations.find(
+            {"state": {"$in": ["pending", "signed"]}, "updated_at": {"$lt": before}}
+        ).sort("updated_at", 1)
+        return await cursor.to_list(length=limit)
 
     # ----------------- USERS -----------------
-    def get_user_by_wallet(self, wallet_address: str) -> Optional[Dict[str, Any]]:
+    async def get_user_by_wallet(self, wallet_address: str) -> Optional[Dict[str, Any]]:
         """Get user by wallet address"""
-        return self.users.find_one({"wallet_address": wallet_address})
+        return await self.users.find_one({"wallet_address": wallet_address})
+
+    async def get_user_balance(self, wallet_address: str, project_id: str) -> int:
+        """Get user's balance for specific project (chain index first, then users.balances)"""
+        project = await self.projects.find_one({"project_id": project_id}, {"token_id": 1})
+        if project and project.get("token_id"):
+            holding = await self.holder_balances.find_one(
+                {"wallet_address": wallet_address, "token_id": project["token_id"]}
+            )
+            if holding:
+                return holding["balance"]
 
-    def get_user_balance(self, wallet_address: str, project_id: str) -> int:
-        """Get user's balance for specific project"""
-        user = self.get_user_by_wallet(wallet_address)
+        user = await self.get_user_by_wallet(wallet_address)
         if not user or "balances" not in user:
             return 0
 
@@ -172,6 +433,404 @@ class BlueCarbonDatabase:
                 return balance.get("balance", 0)
         return 0
 
+    # ----------------- CHAIN INDEX -----------------
+    async def get_sync_state(self, name: str) -> Optional[Dict[str, Any]]:
+        """Get an indexer checkpoint"""
+        return await self.sync_state.find_one({"_id": name})
+
+    async def set_sync_state(
+        self, name: str, block_number: int, block_hash: str, checkpoints: Optional[List[Dict[str, Any]]] = None
+    ):
+        """Record the last fully processed block of an indexer (and its recent checkpoint history)"""
+        fields = {"block_number": block_number, "block_hash": block_hash, "updated_at": datetime.now(timezone.utc)}
+        if checkpoints is not None:
+            fields["checkpoints"] = checkpoints
+        await self.sync_state.update_one({"_id": name}, {"$set": fields}, upsert=True)
+
+    async def store_chain_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert decoded events keyed by tx_hash:log_index; returns only the new ones.
+
+        Storing is not what makes a re-processed range safe: balance deltas
+        are applied per event against watermarks (see apply_balance_deltas).
+        """
+        if not events:
+            return []
+
+        for event in events:
+            event["_id"] = f"{event['tx_hash']}:{event['log_index']}"
+        try:
+            await self.chain_events.insert_many(events, ordered=False)
+            return events
+        except BulkWriteError as e:
+            duplicates = {
+                events[err["index"]]["_id"] for err in e.details["writeErrors"] if err["code"] == 11000
+            }
+            if len(duplicates) != len(e.details["writeErrors"]):
+                raise
+            return [event for event in events if event["_id"] not in duplicates]
+
+    async def get_chain_events_after(self, block_number: int) -> List[Dict[str, Any]]:
+        """Get indexed events above a block (used to unwind a reorg)"""
+        cursor = self.chain_events.find({"block_number": {"$gt": block_number}})
+        return await cursor.to_list(length=None)
+
+    async def delete_chain_events_after(self, block_number: int):
+        """Drop indexed events above a block"""
+        await self.chain_events.delete_many({"block_number": {"$gt": block_number}})
+
+    async def get_chain_events(self, token_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get indexed on-chain events for a token, newest first"""
+        cursor = (
+            self.chain_events.find({"token_ids": token_id})
+            .sort([("block_number", -1), ("log_index", -1)])
+        )
+        return await cursor.to_list(length=limit)
+
+    async def apply_balance_deltas(
+        self,
+        holder_deltas: List[tuple],
+        project_deltas: List[tuple],
+        unwind: bool = False,
+    ):
+        """Apply (or unwind) per-event balance changes exactly once.
+
+        holder_deltas are (seq, wallet_address, token_id, delta) and
+        project_deltas (seq, token_id, {field: delta}) for the project's
+        "onchain" sub-document, where seq orders events chain-wide. Every
+        target stores the seq of the last event applied to it and an update
+        only matches while that watermark is below (unwind: at or above) the
+        event's seq, so replaying a range after a crash skips what landed.
+        Events must be ascending by seq (descending to unwind).
+        """
+        now = datetime.now(timezone.utc)
+
+        def guard(field: str, seq: int) -> Dict[str, Any]:
+            # $not also matches documents written before watermarks existed
+            return {field: {"$gte": seq}} if unwind else {field: {"$not": {"$gte": seq}}}
+
+        holder_ops = []
+        if not unwind:
+            holder_ops = [
+                UpdateOne(
+                    {"_id": f"{address}:{token_id}"},
+                    {"$setOnInsert": {"wallet_address": address, "token_id": token_id, "balance": 0, "applied_seq": -1}},
+                    upsert=True,
+                )
+                for address, token_id in {(address, token_id) for _, address, token_id, _ in holder_deltas}
+            ]
+        holder_ops += [
+            UpdateOne(
+                {"_id": f"{address}:{token_id}", **guard("applied_seq", seq)},
+                {"$inc": {"balance": delta}, "$set": {"updated_at": now, "applied_seq": seq - 1 if unwind else seq}},
+            )
+            for seq, address, token_id, delta in holder_deltas
+        ]
+        if holder_ops:
+            await self.holder_balances.bulk_write(holder_ops, ordered=True)
+
+        project_ops = [
+            UpdateOne(
+                {"token_id": token_id, **guard("onchain.applied_seq", seq)},
+                {
+                    "$inc": {f"onchain.{field}": delta for field, delta in fields.items()},
+                    "$set": {"onchain.last_updated": now, "onchain.applied_seq": seq - 1 if unwind else seq},
+                },
+            )
+            for seq, token_id, fields in project_deltas
+        ]
+        if project_ops:
+            await self.projects.bulk_write(project_ops, ordered=True)
+
+    async def rewind_balance_watermarks(self, seq: int):
+        """Lower every watermark above seq to seq, so re-indexed events after it apply again"""
+        await self.holder_balances.update_many({"applied_seq": {"$gt": seq}}, {"$set": {"applied_seq": seq}})
+        await self.projects.update_many(
+            {"onchain.applied_seq": {"$gt": seq}}, {"$set": {"onchain.applied_seq": seq}}
+        )
+
+    async def get_holder_balances(self, wallet_address: str) -> List[Dict[str, Any]]:
+        """Get every indexed non-zero token balance of a wallet"""
+        cursor = self.holder_balances.find(
+            {"wallet_address": wallet_address, "balance": {"$ne": 0}},
+            {"_id": 0, "token_id": 1, "balance": 1, "updated_at": 1},
+        )
+        return await cursor.to_list(length=None)
+
+
+    # ----------------- PLOTS -----------------
+    async def upsert_plots(self, plots: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Upsert plot observations by ID and fold the changes into the rollups.
+
+        The previous version of every plot is read first so each rollup bucket
+        gets an exact old → new delta instead of a re-aggregation. Each write
+        is conditional on the plot's version as read: if another writer got in
+        between, the upsert collides with the unique ID index instead, and
+        that plot is re-read and retried, so concurrent batches touching the
+        same IDs never fold a stale delta into the rollups.
+        """
+        latest = {plot["ID"]: plot for plot in plots}  # last row wins within a batch
+        totals = {"upserted": 0, "modified": 0, "matched": 0}
+        if not latest:
+            return totals
+        await self._require_plot_id_index()
+
+        now = datetime.now(timezone.utc)
+        projection = {field: 1 for field in PLOT_FIELDS + ["ID", "version"]}
+        deltas: Dict[str, Dict[str, Any]] = {}
+        while latest:
+            cursor = self.plots.find({"ID": {"$in": list(latest)}}, projection)
+            previous = {plot["ID"]: plot async for plot in cursor}
+
+            ops, op_deltas = [], []
+            for plot_id, plot in latest.items():
+                fields = {k: v for k, v in plot.items() if k not in ("_id", "created_at", "version")}
+                old = previous.get(plot_id)
+                # $set keeps fields the new row omits, so diff against the merged doc
+                new = {**old, **fields} if old else fields
+                op_deltas.append(rollup_deltas(old, new))
+                version = old.get("version") if old else None  # None also matches pre-versioning plots
+                ops.append(
+                    UpdateOne(
+                        {"ID": plot_id, "version": version},
+                        {
+                            "$set": {**fields, "version": (version or 0) + 1, "updated_at": now},
+                            "$setOnInsert": {"created_at": now},
+                        },
+                        upsert=True,
+                    )
+                )
+
+            try:
+                result = (await self.plots.bulk_write(ops, ordered=False)).bulk_api_result
+                conflicts = set()
+            except BulkWriteError as e:
+                if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                    raise
+                result = e.details
+                conflicts = {err["index"] for err in e.details["writeErrors"]}
+
+            totals["upserted"] += result["nUpserted"]
+            totals["modified"] += result["nModified"]
+            totals["matched"] += result["nMatched"]
+            ids = list(latest)
+            for index, delta in enumerate(op_deltas):
+                if index not in conflicts:
+                    merge_deltas(deltas, delta)
+            latest = {ids[index]: latest[ids[index]] for index in sorted(conflicts)}
+            if latest:
+                logger.debug("🔁 %d plots changed concurrently, retrying", len(latest))
+
+        await self.apply_plot_rollup_deltas(deltas)
+        if totals["upserted"]:
+            # Keeps the build marker's plot count in step, see plot_rollups_built
+            await self.plot_rollups.update_one({"_id": META_ID}, {"$inc": {"plots": totals["upserted"]}})
+        if totals["upserted"] or totals["modified"]:
+            await self.bump_plot_data_version()
+        return totals
+
+    async def _require_plot_id_index(self):
+        """Refuse plot upserts until plots.ID is uniquely indexed.
+
+        Without the index a version conflict does not collide: the
+        conditional upsert inserts a second copy of the plot and its delta
+        is folded into the rollups.
+        """
+        if self._plot_id_unique:
+            return
+        indexes = await self.plots.index_information()
+        if not any(spec.get("unique") and list(spec["key"]) == [("ID", 1)] for spec in indexes.values()):
+            raise RuntimeError("plots has no unique ID index; run python -m app.indexes ensure")
+        self._plot_id_unique = True
+
+    async def get_plots_near(
+        self,
+        near: Dict[str, Any],
+        radius_m: float,
+        projection: Optional[Dict[str, int]],
+        limit: int,
+        after: Optional[List[Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Plots within radius_m of a point ordered by (distance, _id), limit+1 for paging.
+
+        A cursor resumes with minDistance, so later pages skip everything
+        closer instead of re-reading it.
+        """
+        geo_near = {
+            "near": near,
+            "distanceField": "distance",
+            "maxDistance": radius_m,
+            "spherical": True,
+        }
+        pipeline: List[Dict[str, Any]] = [{"$geoNear": geo_near}]
+        if after:
+            distance, last_id = after
+            geo_near["minDistance"] = distance
+            pipeline.append({"$match": {"$or": [{"distance": {"$gt": distance}}, {"_id": {"$gt": last_id}}]}})
+        pipeline += [{"$sort": {"distance": 1, "_id": 1}}, {"$limit": limit + 1}]
+        if projection:
+            pipeline.append({"$project": {**projection, "distance": 1}})
+        return await self.plots.aggregate(pipeline).to_list(length=None)
+
+    async def get_plots_within(
+        self,
+        geo_filter: Dict[str, Any],
+        projection: Optional[Dict[str, int]],
+        limit: int,
+        after: Optional[Any] = None,
+    ) -> List[Dict[str, Any]]:
+        """Plots matching a $geoWithin filter in _id order, limit+1 for paging"""
+        query = dict(geo_filter)
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        cursor = self.plots.find(query, projection).sort("_id", 1).limit(limit + 1)
+        return await cursor.to_list(length=None)
+
+    async def get_plot_stats(self, geo_filter: Dict[str, Any]) -> Dict[str, Any]:
+        """NDVI and biomass aggregates of the plots inside an area, overall and per type"""
+        group = {
+            "count": {"$sum": 1},
+            "avgNDVI": {"$avg": "$NDVI"},
+            "minNDVI": {"$min": "$NDVI"},
+            "maxNDVI": {"$max": "$NDVI"},
+            "avgAbove": {"$avg": "$Biomass_above_kg"},
+            "avgBelow": {"$avg": "$Biomass_below_kg"},
+            "totalBiomass": {"$sum": {"$add": ["$Biomass_above_kg", "$Biomass_below_kg"]}},
+        }
+        pipeline = [
+            {"$match": geo_filter},
+            {"$facet": {
+                "overall": [{"$group": {"_id": None, **group}}],
+                "by_type": [{"$group": {"_id": "$Project_Type", **group}}, {"$sort": {"count": -1}}],
+            }},
+        ]
+        facets = (await self.plots.aggregate(pipeline).to_list(length=1))[0]
+        overall = facets["overall"][0] if facets["overall"] else {"count": 0}
+        overall.pop("_id", None)
+        return {**overall, "by_type": facets["by_type"]}
+
+    async def aggregate_plots(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run an analytics pipeline over plots"""
+        return await self.plots.aggregate(pipeline).to_list(length=None)
+
+    async def count_plots(self, query: Dict[str, Any]) -> int:
+        return await self.plots.count_documents(query)
+
+    def iter_plots(self, query: Dict[str, Any], projection: Optional[Dict[str, int]] = None):
+        """Cursor over matching plots in _id order, fetched in batches (for exports)"""
+        return self.plots.find(query, projection).sort("_id", 1).batch_size(1000)
+
+    async def get_plot_data_version(self) -> int:
+        """Counter bumped on every plot write (response caches key off it)"""
+        state = await self.sync_state.find_one({"_id": "plot_data"}, {"version": 1})
+        return state["version"] if state else 0
+
+    async def bump_plot_data_version(self):
+        await self.sync_state.update_one(
+            {"_id": "plot_data"},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    async def apply_plot_rollup_deltas(self, deltas: Dict[str, Dict[str, Any]]):
+        """$inc rollup sums/counts, widen min/max and recompute extremes that were removed"""
+        if not deltas:
+            return
+        now = datetime.now(timezone.utc)
+        ops = [
+            UpdateOne({"_id": bid}, delta_update(delta, now), upsert=True)
+            for bid, delta in deltas.items()
+        ]
+        await self.plot_rollups.bulk_write(ops, ordered=False)
+        await self.plot_rollups.delete_many({"_id": {"$in": list(deltas)}, "count": {"$lte": 0}})
+
+        stale = [(bid, delta) for bid, delta in deltas.items() if delta["stale"]]
+        await asyncio.gather(*(self._refresh_rollup_extremes(bid, delta) for bid, delta in stale))
+
+    async def _refresh_rollup_extremes(self, bid: str, delta: Dict[str, Any]):
+        """Recompute min/max of one bucket's stale metrics from its plots"""
+        group = {"_id": None}
+        for metric in delta["stale"]:
+            field = (
+                {"$add": ["$Biomass_above_kg", "$Biomass_below_kg"]}
+                if metric == "Biomass_total_kg"
+                else f"${metric}"
+            )
+            group[f"{metric}_min"] = {"$min": field}
+            group[f"{metric}_max"] = {"$max": field}
+
+        pipeline = [{"$match": bucket_filter(delta["dimension"], delta["key"])}, {"$group": group}]
+        rows = await self.plots.aggregate(pipeline).to_list(length=1)
+        row = rows[0] if rows else {}
+
+        update = {"$set": {}, "$unset": {}}
+        for metric in delta["stale"]:
+            for bound in ("min", "max"):
+                value = row.get(f"{metric}_{bound}")
+                if value is None:
+                    update["$unset"][f"metrics.{metric}.{bound}"] = ""
+                else:
+                    update["$set"][f"metrics.{metric}.{bound}"] = value
+        update = {op: fields for op, fields in update.items() if fields}
+        if update:
+            await self.plot_rollups.update_one({"_id": bid}, update)
+
+    async def plot_rollups_built(self) -> bool:
+        """True once a full rollup rebuild has completed and no plot was added or removed behind it.
+
+        Only upsert_plots maintains the rollups; if anything else inserts or
+        deletes plots, the build marker's plot count stops matching and
+        analytics fall back to live aggregation until the next rebuild.
+        """
+        meta = await self.plot_rollups.find_one({"_id": META_ID}, {"plots": 1})
+        if meta is None:
+            return False
+        plots = await self.plots.estimated_document_count()
+        if plots != meta.get("plots"):
+            if self._stale_rollups != plots:
+                logger.warning(
+                    "⚠️  Plot rollups cover %s plots but %d exist; using live aggregation "
+                    "until python -m app.rollups rebuild", meta.get("plots"), plots,
+                )
+                self._stale_rollups = plots
+            return False
+        return True
+
+    async def get_plot_rollups(self, dimension: str) -> List[Dict[str, Any]]:
+        """Get every rollup bucket of a dimension (type, year, month, type_source)"""
+        return await self.plot_rollups.find({"dimension": dimension}).to_list(length=None)
+
+    async def rebuild_plot_rollups(self) -> int:
+        """Recompute all rollups in one pass over plots; returns the bucket count.
+
+        The build marker is dropped first, so analytics fall back to live
+        aggregation until the new buckets are in place.
+        """
+        await self.plot_rollups.delete_one({"_id": META_ID})
+
+        buckets, plots = {}, 0
+        projection = {field: 1 for field in PLOT_FIELDS}
+        async for plot in self.plots.find({}, projection).batch_size(5000):
+            merge_deltas(buckets, rollup_deltas(None, plot))
+            plots += 1
+
+        now = datetime.now(timezone.utc)
+        docs = [bucket_document(bid, bucket, now) for bid, bucket in buckets.items()]
+        await self.plot_rollups.delete_many({})
+        if docs:
+            await self.plot_rollups.insert_many(docs)
+        await self.plot_rollups.insert_one(
+            {"_id": META_ID, "built_at": now, "plots": plots, "buckets": len(docs)}
+        )
+        return len(docs)
+
+
+# Storage backend: "mongo" (default) or "memory" (app.memory_db, nothing persisted)
+DB_BACKEND = os.getenv("DB_BACKEND", "mongo").lower()
 
 # Global database instance
-db_client = BlueCarbonDatabase()
+if DB_BACKEND == "memory":
+    from app.memory_db import MemoryDatabase
+
+    db_client = MemoryDatabase()
+else:
+    db_client = BlueCarbonDatabase()
@@ -0,0 +1,118 @@
+"""
+Bulk Export - stream Mongo cursors as NDJSON or CSV with constant memory
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from bson import ObjectId
+from fastapi.responses import StreamingResponse
+
+from app.geo import json_safe
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Bytes buffered before a chunk is sent to the client
+CHUNK_SIZE = 64 * 1024
+
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _cell(value: Any) -> Any:
+    """CSV cell: scalars as-is, nested values as compact JSON"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_default, separators=(",", ":"))
+    if isinstance(value, (datetime, ObjectId)):
+        return _default(value)
+    return "" if value is None else value
+
+
+async def ndjson_lines(cursor) -> AsyncIterator[str]:
+    async for doc in cursor:
+        yield json.dumps(json_safe(doc), default=_default, separators=(",", ":")) + "\n"
+
+
+async def csv_lines(cursor, fields: Optional[List[str]] = None) -> AsyncIterator[str]:
+    """CSV rows; without explicit fields the first document fixes the columns"""
+    buffer = io.StringIO()
+    writer = None
+    async for doc in cursor:
+        doc = json_safe(doc)
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=fields or list(doc), extrasaction="ignore")
+            writer.writeheader()
+        writer.writerow({k: _cell(v) for k, v in doc.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+async def _chunks(lines: AsyncIterator[str], compress: bool) -> AsyncIterator[bytes]:
+    """Batch lines into CHUNK_SIZE pieces, gzip-compressing on the fly if asked"""
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    pending: List[bytes] = []
+    size = 0
+
+    async for line in lines:
+        data = line.encode()
+        pending.append(data)
+        size += len(data)
+        if size >= CHUNK_SIZE:
+            chunk = b"".join(pending)
+            pending, size = [], 0
+            chunk = gzip.compress(chunk) if gzip else chunk
+            if chunk:
+                yield chunk
+
+    tail = b"".join(pending)
+    if gzip:
+        tail = gzip.compress(tail) + gzip.flush()
+    if tail:
+        yield tail
+
+
+def stream_export(
+    cursor,
+    fmt: str,
+    filename: str,
+    fields: Optional[List[str]] = None,
+    compress: bool = False,
+    negotiated: bool = False,
+) -> StreamingResponse:
+    """StreamingResponse over a Mongo cursor; documents are never collected in memory"""
+    lines = csv_lines(cursor, fields) if fmt == "csv" else ndjson_lines(cursor)
+    headers: Dict[str, str] = {"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    if negotiated:
+        # The body depends on Accept-Encoding, so caches must key on it (gzipped or not)
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(_chunks(lines, compress), media_type=FORMATS[fmt], headers=headers)
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Whether an Accept-Encoding header allows gzip (q=0 is a refusal, * covers it)"""
+    qualities: Dict[str, float] = {}
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            qualities[coding.strip()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
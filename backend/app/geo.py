@@ -0,0 +1,65 @@
+"""
+Geo Helpers - GeoJSON filters and JSON-safe output for plot queries
+"""
+
+import json
+import math
+from typing import Dict, Any, List
+
+EARTH_RADIUS_M = 6378100
+
+
+def parse_bbox(bbox: str) -> List[float]:
+    """"min_lon,min_lat,max_lon,max_lat" → floats; ValueError if malformed"""
+    try:
+        coords = [float(v) for v in bbox.split(",")]
+    except ValueError:
+        coords = []
+    if len(coords) != 4 or not all(math.isfinite(c) for c in coords):
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    return coords
+
+
+def bbox_geometry(bbox: List[float]) -> Dict[str, Any]:
+    """GeoJSON Polygon covering a bounding box"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    ring = [[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def parse_polygon(polygon: str) -> Dict[str, Any]:
+    """JSON list of [lon, lat] points → closed GeoJSON Polygon; ValueError if malformed"""
+    try:
+        ring = [[float(lon), float(lat)] for lon, lat in json.loads(polygon)]
+    except (TypeError, ValueError):
+        raise ValueError("polygon must be a JSON list of [lon, lat] points")
+    if ring and ring[0] != ring[-1]:
+        ring.append(ring[0])
+    if len(ring) < 4:
+        raise ValueError("polygon needs at least 3 distinct points")
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def within_filter(geometry: Dict[str, Any]) -> Dict[str, Any]:
+    return {"location": {"$geoWithin": {"$geometry": geometry}}}
+
+
+def near_filter(lng: float, lat: float, radius_m: float) -> Dict[str, Any]:
+    """Plots within radius_m metres of a point (usable in $match, unlike $near)"""
+    return {"location": {"$geoWithin": {"$centerSphere": [[lng, lat], radius_m / EARTH_RADIUS_M]}}}
+
+
+def point(lng: float, lat: float) -> Dict[str, Any]:
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def json_safe(value: Any) -> Any:
+    """Replace NaN/inf (stored by the CSV loader for blank cells) with None"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: json_safe(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [json_safe(v) for v in value]
+    return value
+
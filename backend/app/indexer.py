@@ -0,0 +1,253 @@
+"""
+Chain Event Indexer - syncs BlueCarbon token events into MongoDB
+"""
+
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+
+from web3 import Web3
+
+from app.blockchain import bluecarbon_client
+from app.database import db_client
+from app.logs import setup_logging
+
+logger = logging.getLogger(__name__)
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+def event_deltas(event: Dict[str, Any]) -> Tuple[List[tuple], List[tuple]]:
+    """Balance changes caused by one event.
+
+    Returns (holder, project) deltas: holder entries are
+    (wallet_address, token_id, delta) and project entries are
+    (token_id, field, delta). Holder balances come from ERC1155 transfers
+    (mints and burns included); project totals from CreditsIssued/Retired.
+    """
+    args = event["args"]
+    name = event["event"]
+    holders, projects = [], []
+
+    if name in ("TransferSingle", "TransferBatch"):
+        if name == "TransferSingle":
+            moves = [(args["id"], args["value"])]
+        else:
+            moves = list(zip(args["ids"], args["values"]))
+        for token_id, value in moves:
+            if args["from"] != ZERO_ADDRESS:
+                holders.append((args["from"], token_id, -value))
+            if args["to"] != ZERO_ADDRESS:
+                holders.append((args["to"], token_id, value))
+    elif name == "CreditsIssued":
+        projects.append((args["tokenId"], "total_issued", args["amount"]))
+        projects.append((args["tokenId"], "circulating", args["amount"]))
+    elif name == "CreditsRetired":
+        projects.append((args["tokenId"], "total_retired", args["amount"]))
+        projects.append((args["tokenId"], "circulating", -args["amount"]))
+
+    return holders, projects
+
+
+def event_seq(event: Dict[str, Any]) -> int:
+    """Chain-wide position of an event, used as the balance watermark"""
+    return event["block_number"] * 1_000_000 + event["log_index"]
+
+
+def event_token_ids(event: Dict[str, Any]) -> List[int]:
+    """Token IDs an event touches, stored on the event for history lookups"""
+    args = event["args"]
+    if event["event"] == "TransferBatch":
+        return list(args["ids"])
+    if event["event"] == "TransferSingle":
+        return [args["id"]]
+    return [args["tokenId"]]
+
+
+class ChainIndexer:
+    """Resumable block-range indexer with checkpointing and reorg unwinding.
+
+    Every processed window is checkpointed with its end block's hash and the
+    last INDEXER_CHECKPOINT_HISTORY checkpoints are kept. A block hash commits
+    to all of its ancestors, so the newest checkpoint that still matches the
+    chain marks the deepest point a reorg can have reached; only windows'
+    end blocks are recorded, so the unwind may go back further than the
+    fork itself, never less far.
+    """
+
+    STATE_KEY = "bluecarbon_events"
+
+    def __init__(self, db, chain):
+        self.db = db
+        self.chain = chain
+        self.start_block = int(os.getenv("INDEXER_START_BLOCK", "0"))
+        self.window = int(os.getenv("INDEXER_BLOCK_WINDOW", "5000"))
+        self.checkpoint_history = int(os.getenv("INDEXER_CHECKPOINT_HISTORY", "64"))
+        self.poll_interval = float(os.getenv("INDEXER_POLL_INTERVAL", "5"))
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the sync loop on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the sync loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync_once()
+            except Exception as e:
+                logger.warning("⚠️  Indexer sync failed: %s", e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def status(self) -> Dict[str, Any]:
+        """Checkpoint and lag of the indexer"""
+        state = await self.db.get_sync_state(self.STATE_KEY) or {}
+        head = await self.chain.get_block_number()
+        last = state.get("block_number", self.start_block - 1)
+        return {"last_block": last, "head": head, "lag": head - last, "updated_at": state.get("updated_at")}
+
+    # --------- SYNC --------- #
+    async def sync_once(self) -> int:
+        """Index everything from the checkpoint to the chain head; returns events applied"""
+        last_block, checkpoints = await self._check_reorg()
+        head = await self.chain.get_block_number()
+
+        applied = 0
+        from_block = last_block + 1
+        while from_block <= head:
+            to_block = min(from_block + self.window - 1, head)
+            try:
+                events = await self.chain.get_event_logs(from_block, to_block)
+            except ValueError as e:
+                # Most providers cap eth_getLogs ranges/results - shrink and retry
+                if self.window == 1:
+                    raise
+                self.window = max(1, self.window // 2)
+                logger.warning("⚠️  getLogs %d-%d rejected (%s); window → %d", from_block, to_block, e, self.window)
+                continue
+
+            applied += await self._apply(events)
+            block_hash = await self.chain.get_block_hash(to_block)
+            checkpoints = (checkpoints + [{"block_number": to_block, "block_hash": block_hash}])[-self.checkpoint_history:]
+            await self.db.set_sync_state(self.STATE_KEY, to_block, block_hash, checkpoints)
+            from_block = to_block + 1
+
+        if applied:
+            logger.info("🔎 Indexed %d events up to block %d", applied, head)
+        return applied
+
+    async def _apply(self, events: List[Dict[str, Any]], sign: int = 1) -> int:
+        """Store events and apply their balance deltas (sign=-1 unwinds them).
+
+        Deltas are applied for every event in the range, not just newly stored
+        ones: the per-target watermarks skip whatever a crashed run already
+        applied, so storing and applying need not be atomic.
+        """
+        if sign == 1:
+            for event in events:
+                event["token_ids"] = event_token_ids(event)
+            new = await self.db.store_chain_events(events)
+        events = sorted(events, key=event_seq, reverse=sign == -1)
+
+        holder_deltas: List[tuple] = []
+        project_deltas: List[tuple] = []
+        project_hashes: Optional[Dict[str, str]] = None
+        for event in events:
+            if event["event"] == "ProjectRegistered" and sign == 1:
+                if project_hashes is None:
+                    project_hashes = await self._project_hashes()
+                await self._link_project(event, project_hashes)
+            seq = event_seq(event)
+            holders, projects = event_deltas(event)
+
+            # One update per target per event, so the watermark check covers the whole event
+            by_holder: Dict[tuple, int] = defaultdict(int)
+            for address, token_id, delta in holders:
+                by_holder[(Web3.to_checksum_address(address), token_id)] += sign * delta
+            by_project: Dict[int, Dict[str, int]] = defaultdict(dict)
+            for token_id, field, delta in projects:
+                by_project[token_id][field] = by_project[token_id].get(field, 0) + sign * delta
+
+            holder_deltas += [(seq, address, token_id, delta) for (address, token_id), delta in by_holder.items()]
+            project_deltas += [(seq, token_id, fields) for token_id, fields in by_project.items()]
+
+        await self.db.apply_balance_deltas(holder_deltas, project_deltas, unwind=sign == -1)
+        return len(new) if sign == 1 else len(events)
+
+    async def _project_hashes(self) -> Dict[str, str]:
+        """keccak(projectId) → projectId for every stored project, built once per window"""
+        return {Web3.keccak(text=project_id).hex(): project_id for project_id in await self.db.get_project_ids()}
+
+    async def _link_project(self, event: Dict[str, Any], project_hashes: Dict[str, str]):
+        """Persist tokenId for a project registered outside this API instance"""
+        project_id = project_hashes.get(event["args"]["projectId"])
+        if project_id:
+            token_id = event["args"]["tokenId"]
+            await self.db.set_project_token_id(project_id, token_id)
+            self.chain.cache_token_ids({project_id: token_id})
+
+    # --------- REORGS --------- #
+    async def _check_reorg(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """Return the block to resume after and the checkpoint history, unwinding first on a reorg"""
+        state = await self.db.get_sync_state(self.STATE_KEY)
+        if not state or state["block_number"] < self.start_block:
+            return self.start_block - 1, []
+
+        last_block = state["block_number"]
+        checkpoints = state.get("checkpoints") or [{"block_number": last_block, "block_hash": state["block_hash"]}]
+        if await self.chain.get_block_hash(last_block) == state["block_hash"]:
+            return last_block, checkpoints
+
+        # Walk back to the newest checkpoint still on the canonical chain;
+        # if none is, the fork is older than the history - re-index everything
+        fork_block = self.start_block - 1
+        while checkpoints:
+            checkpoint = checkpoints[-1]
+            if checkpoint["block_number"] < last_block and (
+                await self.chain.get_block_hash(checkpoint["block_number"]) == checkpoint["block_hash"]
+            ):
+                fork_block = checkpoint["block_number"]
+                break
+            checkpoints = checkpoints[:-1]
+
+        orphaned = await self.db.get_chain_events_after(fork_block)
+        await self._apply(orphaned, sign=-1)
+        # Orphans may sit above the new canonical events' positions in the same blocks
+        await self.db.rewind_balance_watermarks(event_seq({"block_number": fork_block + 1, "log_index": 0}) - 1)
+        await self.db.delete_chain_events_after(fork_block)
+        fork_hash = checkpoints[-1]["block_hash"] if checkpoints else ""
+        await self.db.set_sync_state(self.STATE_KEY, fork_block, fork_hash, checkpoints)
+
+        logger.warning(
+            "⚠️  Reorg detected at block %d; unwound %d events to %d", last_block, len(orphaned), fork_block
+        )
+        return fork_block, checkpoints
+
+
+# Global indexer
+chain_indexer = ChainIndexer(db_client, bluecarbon_client)
+
+
+if __name__ == "__main__":
+    # Run standalone: python -m app.indexer
+    setup_logging()
+
+    async def main():
+        await db_client.connect()
+        await bluecarbon_client.connect()
+        chain_indexer.start()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
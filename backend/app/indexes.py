@@ -0,0 +1,176 @@
+"""
+Index Management - declares every index the API's queries rely on
+"""
+
+import asyncio
+import logging
+import sys
+from datetime import datetime
+from typing import Dict, Any, List
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.logs import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Declared indexes, per collection
+# -----------------------------
+INDEXES: Dict[str, List[IndexModel]] = {
+    "projects": [
+        IndexModel([("project_id", ASCENDING)], unique=True, name="project_id_unique"),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id_desc"),
+        IndexModel([("token_id", ASCENDING)], name="token_id"),
+    ],
+    "transactions": [
+        IndexModel([("tx_hash", ASCENDING)], unique=True, name="tx_hash_unique"),
+        IndexModel(
+            [("project_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+            name="project_id_timestamp_id",
+        ),
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id_desc"),
+        IndexModel([("status", ASCENDING), ("timestamp", ASCENDING)], name="status_timestamp"),
+    ],
+    "users": [
+        IndexModel([("wallet_address", ASCENDING)], name="wallet_address"),
+    ],
+    "plots": [
+        IndexModel([("ID", ASCENDING)], unique=True, name="plot_id_unique"),
+        IndexModel([("Project_Type", ASCENDING), ("Monitoring_Year", ASCENDING)], name="type_year"),
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+        IndexModel([("Timestamp", ASCENDING)], name="timestamp"),
+        IndexModel([("project_id", ASCENDING)], name="project_id", sparse=True),
+    ],
+    "plot_rollups": [
+        IndexModel([("dimension", ASCENDING)], name="dimension"),
+    ],
+    "chain_events": [
+        IndexModel([("block_number", ASCENDING)], name="block_number"),
+        IndexModel(
+            [("token_ids", ASCENDING), ("block_number", DESCENDING), ("log_index", DESCENDING)],
+            name="token_ids_block",
+        ),
+    ],
+    "holder_balances": [
+        IndexModel([("wallet_address", ASCENDING), ("token_id", ASCENDING)], name="wallet_token"),
+    ],
+    "operations": [
+        IndexModel(
+            [("idempotency_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$exists": True}},
+            name="idempotency_key_unique",
+        ),
+        IndexModel([("state", ASCENDING), ("updated_at", ASCENDING)], name="state_updated_at"),
+    ],
+}
+
+
+# Indexes that enforce correctness, not just speed: idempotency-key dedupe, and the
+# plot ID uniqueness upsert_plots' version check relies on to detect a conflict
+REQUIRED_INDEXES: Dict[str, List[str]] = {
+    "operations": ["idempotency_key_unique"],
+    "plots": ["plot_id_unique"],
+}
+
+
+def hot_queries(db) -> Dict[str, Any]:
+    """The API's frequent queries, as cursors that can be explained"""
+    return {
+        "get_project": db.projects.find({"project_id": "probe"}).limit(1),
+        "get_projects": db.projects.find({}).sort([("created_at", DESCENDING), ("_id", DESCENDING)]).limit(100),
+        "token_id_map": db.projects.find({"token_id": {"$gt": 0}}),
+        "get_transaction": db.transactions.find({"tx_hash": "probe"}).limit(1),
+        "transaction_history": db.transactions.find({"project_id": "probe"}).sort(
+            [("timestamp", DESCENDING), ("_id", DESCENDING)]
+        ).limit(50),
+        "all_history": db.transactions.find({}).sort([("timestamp", DESCENDING), ("_id", DESCENDING)]).limit(50),
+        "pending_transactions": db.transactions.find({"status": "pending"}).sort("timestamp", ASCENDING),
+        "get_user_by_wallet": db.users.find({"wallet_address": "probe"}).limit(1),
+        "plot_upsert": db.plots.find({"ID": "probe"}),
+        "plots_for_project": db.plots.find({"project_id": "probe"}),
+        "plots_by_type_year": db.plots.find({"Project_Type": "probe", "Monitoring_Year": {"$gte": 2000}}),
+        "plots_near": db.plots.find(
+            {"location": {"$geoWithin": {"$centerSphere": [[0, 0], 0.001]}}}
+        ),
+        "rollups_by_dimension": db.plot_rollups.find({"dimension": "type"}),
+        "chain_events_for_token": db.chain_events.find({"token_ids": 1}).sort(
+            [("block_number", DESCENDING), ("log_index", DESCENDING)]
+        ).limit(50),
+        "chain_events_after": db.chain_events.find({"block_number": {"$gt": 0}}),
+        "holder_balance": db.holder_balances.find({"wallet_address": "probe", "token_id": 1}),
+        "operation_by_key": db.operations.find({"idempotency_key": "probe"}).limit(1),
+        "stale_operations": db.operations.find(
+            {"state": {"$in": ["pending", "signed"]}, "updated_at": {"$lt": datetime(2000, 1, 1)}}
+        ).sort("updated_at", ASCENDING),
+    }
+
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Every stage name in an explain() winning plan tree"""
+    stages = [plan["stage"]] if "stage" in plan else []
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            stages.extend(plan_stages(child))
+    return stages
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create any missing declared index (idempotent); returns index names per collection.
+
+    A collection whose existing data violates a unique index is reported and
+    skipped so startup is not blocked on a data cleanup.
+    """
+    async def ensure(name: str, models: List[IndexModel]):
+        try:
+            return name, await db.db[name].create_indexes(models)
+        except OperationFailure as e:
+            logger.warning("⚠️  Could not create indexes on %s: %s", name, e)
+            return name, []
+
+    created = dict(await asyncio.gather(*(ensure(name, models) for name, models in INDEXES.items())))
+    logger.info("🗂️  Indexes ensured on %d collections", len(created))
+    return created
+
+
+async def ensure_required_indexes(db):
+    """Create the correctness-critical indexes; unlike ensure_indexes, failures raise"""
+    for name, index_names in REQUIRED_INDEXES.items():
+        await db.db[name].create_indexes([m for m in INDEXES[name] if m.document["name"] in index_names])
+
+
+async def check_indexes(db) -> List[Dict[str, Any]]:
+    """explain() every hot query and flag the ones that fall back to COLLSCAN"""
+    report = []
+    for name, cursor in hot_queries(db).items():
+        plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+        stages = plan_stages(plan.get("queryPlan", plan))
+        report.append({"query": name, "stages": stages, "collscan": "COLLSCAN" in stages})
+    return report
+
+
+if __name__ == "__main__":
+    # python -m app.indexes [ensure|check]
+    from app.database import db_client
+
+    setup_logging()
+    mode = sys.argv[1] if len(sys.argv) > 1 else "ensure"
+    if mode not in ("ensure", "check"):
+        print("usage: python -m app.indexes [ensure|check]")
+        sys.exit(2)
+
+    async def main() -> int:
+        await db_client.connect()
+        if mode == "ensure":
+            await ensure_indexes(db_client)
+            return 0
+
+        report = await check_indexes(db_client)
+        for row in report:
+            flag = "❌ COLLSCAN" if row["collscan"] else "✅"
+            print(f"{flag} {row['query']}: {' → '.join(row['stages'])}")
+        return 1 if any(row["collscan"] for row in report) else 0
+
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,262 @@
+"""
+Plot Ingest - streaming CSV → MongoDB upserts (behind /plots/ingest and upsert-plots.js)
+"""
+
+import argparse
+import asyncio
+import codecs
+import csv
+import logging
+import os
+import random
+import re
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, TextIO, Tuple
+
+from app.database import db_client
+from app.logs import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Columns parsed as numbers, as the original JS loader's toDoc did
+NUMERIC_FIELDS = [
+    "GPS_Lat", "GPS_Long", "Tree_Height_m", "DBH_cm",
+    "Biomass_above_kg", "Biomass_below_kg",
+    "Soil_Organic_Carbon_g_per_kg", "Soil_Salinity_psu", "Soil_Moisture_percent", "Soil_pH",
+    "Water_Salinity_psu", "Water_Temperature_C",
+    "CO2_Flux_mg_m2_day", "CH4_Flux_mg_m2_day",
+    "NDVI", "Canopy_Cover_percent", "Plot_Area_ha",
+    "Soil_Bulk_Density_g_cm3", "Soil_Depth_cm", "Stem_Density_per_ha",
+]
+
+DATA_SOURCES = ["Sensor", "Drone", "Manual"]
+
+_FLOAT_PREFIX = re.compile(r"\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")
+
+
+class RowError(ValueError):
+    """A CSV row that cannot be stored"""
+
+
+def parse_float(value: Optional[str]) -> Optional[float]:
+    """JS parseFloat: leading numeric prefix, None where JS would give NaN"""
+    match = _FLOAT_PREFIX.match(value or "")
+    return float(match.group(0)) if match else None
+
+
+def parse_timestamp(value: str) -> datetime:
+    """"YYYY-MM-DD HH:MM:SS" (UTC, like toDoc's + "Z") → naive UTC datetime"""
+    text = value.strip().replace(" ", "T", 1)
+    if text.endswith(("Z", "z")):
+        text = text[:-1] + "+00:00"  # fromisoformat only accepts "Z" from Python 3.11
+    try:
+        ts = datetime.fromisoformat(text)
+    except ValueError:
+        raise RowError(f"invalid Timestamp {value!r}")
+    if ts.tzinfo:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def to_doc(row: Dict[str, str]) -> Dict[str, Any]:
+    """Clean plot document from a CSV row - same normalization as the original JS loader's toDoc.
+
+    Unparseable numbers are stored as null instead of NaN. Rows without an
+    ID, with an unparseable Timestamp or with coordinates off the globe
+    raise RowError.
+    """
+    plot_id = (row.get("ID") or "").strip()
+    if not plot_id:
+        raise RowError("missing ID")
+
+    doc: Dict[str, Any] = {k: v for k, v in row.items() if k is not None}
+    doc["ID"] = plot_id
+    for field in NUMERIC_FIELDS:
+        doc[field] = parse_float(row.get(field))
+
+    raw_ts = (row.get("Timestamp") or "").strip()
+    doc["Timestamp"] = parse_timestamp(raw_ts) if raw_ts else None
+
+    # Monitoring_Year: strip non-digits, fall back to the Timestamp's year
+    digits = re.sub(r"[^0-9]", "", str(row.get("Monitoring_Year") or ""))
+    year = int(digits) if digits else None
+    if not year and doc["Timestamp"]:
+        year = doc["Timestamp"].year
+    doc["Monitoring_Year"] = year or None
+
+    source = (row.get("Data_Source") or "").strip()
+    doc["Data_Source"] = row["Data_Source"] if source else random.choice(DATA_SOURCES)
+
+    lat, lng = doc["GPS_Lat"] or 0, doc["GPS_Long"] or 0
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise RowError(f"coordinates out of range ({lat}, {lng})")
+    doc["location"] = {"type": "Point", "coordinates": [lng, lat]}
+    return doc
+
+
+class IngestReport:
+    """Counters and rejects of one ingest run"""
+
+    def __init__(self, max_rejects: int):
+        self.max_rejects = max_rejects
+        self.rows = 0
+        self.batches = 0
+        self.upserted = 0
+        self.modified = 0
+        self.matched = 0
+        self.rejected = 0
+        self.rejects: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def reject(self, line: int, reason: str):
+        self.rejected += 1
+        if len(self.rejects) < self.max_rejects:
+            self.rejects.append({"line": line, "error": reason})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "stored": self.rows - self.rejected,
+            "batches": self.batches,
+            "upserted": self.upserted,
+            "modified": self.modified,
+            "matched": self.matched,
+            "rejected": self.rejected,
+            "rejects": self.rejects,
+            "elapsed_s": round(self.elapsed, 3),
+            "rows_per_sec": round(self.rows / self.elapsed, 1) if self.elapsed else None,
+        }
+
+
+def _read_batch(
+    reader: csv.DictReader, size: int, report: IngestReport
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Parse up to `size` valid rows (runs in a worker thread); True once the file is exhausted"""
+    batch: List[Dict[str, Any]] = []
+    while len(batch) < size:
+        # The record starts on the line after the previous one ended (line_num is
+        # the last physical line read, so a quoted multi-line field would overshoot)
+        line = reader.line_num + 1
+        row = next(reader, None)
+        if row is None:
+            return batch, True
+        report.rows += 1
+        try:
+            batch.append(to_doc(row))
+        except RowError as e:
+            report.reject(line, str(e))
+    return batch, False
+
+
+def shard_of(plot_id: str, shards: int) -> int:
+    """Stable writer index for a plot ID (crc32, unlike hash(), is the same in every process)"""
+    return zlib.crc32(plot_id.encode()) % shards
+
+
+class PlotIngest:
+    """Streams a CSV through fixed-size batches into db.upsert_plots.
+
+    Parsing runs off the event loop; each row goes to the writer its ID
+    hashes to, so no two writers ever touch the same plot and a repeated ID
+    is written in file order. Every writer has a one-batch queue and one
+    batch being filled, so at most ~3×workers batches are held in memory
+    whatever the file size.
+    """
+
+    def __init__(self, db, batch_size: Optional[int] = None, workers: Optional[int] = None):
+        self.db = db
+        self.batch_size = batch_size or int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+        self.workers = workers or int(os.getenv("INGEST_WORKERS", "4"))
+        self.max_rejects = int(os.getenv("INGEST_MAX_REJECTS", "100"))
+
+    async def run(self, stream: TextIO) -> Dict[str, Any]:
+        report = IngestReport(self.max_rejects)
+        reader = csv.DictReader(stream)
+        queues = [asyncio.Queue(maxsize=1) for _ in range(self.workers)]
+        pending: List[List[Dict[str, Any]]] = [[] for _ in range(self.workers)]
+
+        failures: List[Exception] = []
+
+        async def write(queue: asyncio.Queue):
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                if failures:
+                    continue  # keep draining so the reader never blocks
+                try:
+                    result = await self.db.upsert_plots(batch)
+                except Exception as e:
+                    failures.append(e)
+                    continue
+                report.batches += 1
+                report.upserted += result["upserted"]
+                report.modified += result["modified"]
+                report.matched += result["matched"]
+
+        writers = [asyncio.create_task(write(queue)) for queue in queues]
+        try:
+            done = False
+            while not done and not failures:
+                docs, done = await asyncio.to_thread(_read_batch, reader, self.batch_size, report)
+                for doc in docs:
+                    shard = shard_of(doc["ID"], self.workers)
+                    pending[shard].append(doc)
+                    if len(pending[shard]) >= self.batch_size:
+                        await queues[shard].put(pending[shard])
+                        pending[shard] = []
+            for shard, queue in enumerate(queues):
+                if pending[shard] and not failures:
+                    await queue.put(pending[shard])
+                await queue.put(None)
+            await asyncio.gather(*writers)
+        except BaseException:
+            for task in writers:
+                task.cancel()
+            raise
+        if failures:
+            raise failures[0]
+
+        report.elapsed = time.perf_counter() - report.started
+        logger.info(
+            "🌱 Ingested %d/%d plots in %d batches (%s rows/s, %d rejected)",
+            report.rows - report.rejected, report.rows, report.batches,
+            report.as_dict()["rows_per_sec"], report.rejected,
+        )
+        return report.as_dict()
+
+    async def run_file(self, path: str) -> Dict[str, Any]:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            return await self.run(f)
+
+    async def run_binary(self, raw) -> Dict[str, Any]:
+        """Ingest from a binary file object (e.g. an UploadFile's spooled file)"""
+        # A StreamReader, unlike TextIOWrapper, needs nothing but read() from the
+        # file - SpooledTemporaryFile has no readable() before Python 3.11
+        return await self.run(codecs.getreader("utf-8-sig")(raw))
+
+
+# Global plot ingest (settings from INGEST_* env vars)
+plot_ingest = PlotIngest(db_client)
+
+
+# CLI: python -m app.ingest plots.csv [--batch-size N] [--workers N]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upsert plot observations from a CSV file")
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+    setup_logging()
+
+    async def main():
+        await db_client.connect()
+        ingest = PlotIngest(db_client, batch_size=args.batch_size, workers=args.workers)
+        report = await ingest.run_file(args.path)
+        for reject in report["rejects"]:
+            print(f"  ❌ line {reject['line']}: {reject['error']}")
+
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+"""
+Application Lifecycle - parallel dependency startup, background workers and readiness
+"""
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Any
+
+from app.blockchain import bluecarbon_client
+from app.database import DB_BACKEND, db_client
+from app.confirmer import tx_confirmer
+from app.indexer import chain_indexer
+from app.indexes import ensure_indexes, ensure_required_indexes
+from app.outbox import operation_outbox
+
+logger = logging.getLogger(__name__)
+
+# Readiness of each dependency; liveness never looks at this
+readiness: Dict[str, bool] = {"database": False, "blockchain": False, "indexes": False, "token_cache": False}
+
+RETRY_MAX_DELAY = 30
+
+
+async def warm_token_id_cache():
+    """Load persisted token IDs and backfill any project that has none yet"""
+    known = await db_client.get_project_token_id_map()
+    bluecarbon_client.cache_token_ids(known)
+
+    missing = [pid for pid in await db_client.get_project_ids() if pid not in known]
+    if missing:
+        resolved = await bluecarbon_client.get_project_token_ids(missing)
+        for project_id, token_id in resolved.items():
+            if token_id:
+                await db_client.set_project_token_id(project_id, token_id)
+    logger.info("🗂️  Token ID cache warmed: %d persisted, %d resolved from chain", len(known), len(missing))
+
+
+async def build_indexes():
+    """Create the Mongo indexes (the memory backend needs none).
+
+    ENSURE_INDEXES=false skips the performance indexes, but never the
+    required ones (operations idempotency key, unique plot ID): without
+    them a retried write could run twice or a plot upsert could duplicate
+    a plot, so readiness stays false until they exist.
+    """
+    if DB_BACKEND != "mongo":
+        return
+    if os.getenv("ENSURE_INDEXES", "true").lower() == "true":
+        await ensure_indexes(db_client)
+    await ensure_required_indexes(db_client)
+
+
+async def retry_step(name: str, step: Callable[[], Awaitable[None]]):
+    """Run a startup step until it succeeds, with the connection loop's backoff"""
+    delay = 1.0
+    while True:
+        try:
+            await step()
+            readiness[name] = True
+            return
+        except Exception as e:
+            logger.warning("⚠️  %s not ready, retrying in %.0fs: %s", name, delay, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+
+
+async def connect_dependencies():
+    """Connect Mongo and the RPC node concurrently, retrying whichever is unavailable.
+
+    Background workers start as soon as both are connected; index builds
+    and the token cache warm-up then retry on their own, keeping readiness
+    false until they succeed.
+    """
+    clients = {"database": db_client, "blockchain": bluecarbon_client}
+    delay = 1.0
+
+    while True:
+        pending = [name for name in clients if not readiness[name]]
+        if not pending:
+            break
+
+        results = await asyncio.gather(
+            *(clients[name].connect() for name in pending), return_exceptions=True
+        )
+        for name, result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.warning("⚠️  %s not ready, retrying in %.0fs: %s", name, delay, result)
+            else:
+                readiness[name] = True
+
+        if not all(readiness[name] for name in clients):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    tx_confirmer.start()
+    operation_outbox.start()
+    if os.getenv("INDEXER_ENABLED", "false").lower() == "true":
+        chain_indexer.start()
+
+    await asyncio.gather(
+        retry_step("indexes", build_indexes),
+        retry_step("token_cache", warm_token_id_cache),
+    )
+
+
+def log_startup_failure(task: asyncio.Task):
+    """Done-callback so an unexpected startup error is logged instead of lost with the task"""
+    if not task.cancelled() and task.exception():
+        logger.error("❌ Startup failed: %s", task.exception(), exc_info=task.exception())
+
+
+def readiness_report() -> Dict[str, Any]:
+    """Per-dependency readiness for the /ready probe"""
+    return {"ready": all(readiness.values()), "checks": dict(readiness)}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Start dependencies without blocking boot on a slow one.
+
+    Startup waits up to STARTUP_TIMEOUT seconds so a normal boot is ready by
+    the first request; past that the app starts serving (liveness passes,
+    readiness fails) while connections keep retrying in the background.
+    """
+    startup = asyncio.create_task(connect_dependencies())
+    startup.add_done_callback(log_startup_failure)
+    try:
+        await asyncio.wait_for(
+            asyncio.shield(startup), timeout=float(os.getenv("STARTUP_TIMEOUT", "10"))
+        )
+    except asyncio.TimeoutError:
+        logger.warning("⏳ Dependencies still connecting - serving with readiness=false")
+
+    yield
+
+    startup.cancel()
+    await tx_confirmer.stop()
+    await operation_outbox.stop()
+    await chain_indexer.stop()
+    await bluecarbon_client.close()
+    db_client.close()
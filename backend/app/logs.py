@@ -0,0 +1,59 @@
+"""
+Logging - structured, level-filtered app logging written from a background thread
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# LogRecord attributes that are not `extra=` fields
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS})
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def setup_logging():
+    """Send the `app` loggers through a queue; a listener thread does the formatting and I/O.
+
+    Records below LOG_LEVEL (default INFO) are dropped at the call site, so
+    per-write debug messages cost a level check. LOG_FORMAT=json emits one
+    JSON object per record, anything else a plain text line.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    logger = logging.getLogger("app")
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.addHandler(QueueHandler(records))
+    logger.propagate = False
+
+    _listener = QueueListener(records, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -2,12 +2,16 @@
 BlueCarbon API Server - Integrated with Blockchain + MongoDB
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, File, Header, Request, Response, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, validator
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timezone
 from web3 import Web3
+import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -17,14 +21,35 @@ load_dotenv()
 # Import blockchain + db
 from app.blockchain import bluecarbon_client
 from app.database import db_client
+from app.confirmer import retirement_amounts, tx_confirmer
+from app.indexer import chain_indexer
+from app.lifecycle import lifespan, readiness_report
+from app.analytics import router as analytics_router, summary_filter
+from app.cache import response_cache
+from app.export import FORMATS, accepts_gzip, stream_export
+from app.ingest import plot_ingest
+from app.carbon import INPUT_FIELDS as CARBON_FIELDS, carbon_engine, columns_from_cursor, columns_from_table
+from app.columnar import arrow_analytics
+from app.geo import bbox_geometry, json_safe, near_filter, parse_bbox, parse_polygon, point, within_filter
+from app.logs import setup_logging
+from app.metrics import MetricsMiddleware, render as render_metrics
+from app.outbox import OPEN_STATES, operation_outbox
+from app.pagination import decode_cursor, paginate, parse_fields
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # Create FastAPI app
 app = FastAPI(
     title="BlueCarbon API - South India Carbon Registry",
     description="API for managing carbon credits from South Indian projects",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Per-route latency histograms for /metrics
+app.add_middleware(MetricsMiddleware)
+
 # =======================
 #   AUTH (very simple)
 # =======================
@@ -75,6 +100,17 @@ class IssueCreditsRequest(BaseModel):
             raise ValueError("amount must be greater than 0")
         return v
 
+class VerifyCreditsRequest(BaseModel):
+    project_id: str
+    amount: int
+    plot_ids: Optional[List[str]] = None
+
+    @validator("amount")
+    def amount_must_be_positive(cls, v):
+        if v <= 0:
+            raise ValueError("amount must be greater than 0")
+        return v
+
 class RetireCreditsRequest(BaseModel):
     project_id: str
     amount: int
@@ -85,12 +121,103 @@ class RetireCreditsRequest(BaseModel):
             raise ValueError("amount must be greater than 0")
         return v
 
+class RetireBatchItem(BaseModel):
+    project_id: str
+    amount: int
+
+    @validator("amount")
+    def amount_must_be_positive(cls, v):
+        if v <= 0:
+            raise ValueError("amount must be greater than 0")
+        return v
+
+class RetireCreditsBatchRequest(BaseModel):
+    items: List[RetireBatchItem]
+
+    @validator("items")
+    def items_must_not_be_empty(cls, v):
+        if not v:
+            raise ValueError("items cannot be empty")
+        if len(v) > 100:
+            raise ValueError("at most 100 projects per batch")
+        return v
+
+class BalancesRequest(BaseModel):
+    addresses: List[str]
+    project_ids: Optional[List[str]] = None
+
+    @validator("addresses")
+    def validate_addresses(cls, v):
+        if not v:
+            raise ValueError("addresses cannot be empty")
+        for address in v:
+            if not Web3.is_address(address):
+                raise ValueError(f"Invalid Ethereum address: {address}")
+        return [Web3.to_checksum_address(a) for a in v]
+
+# =======================
+#   HELPERS
+# =======================
+MAX_PAGE = 1000
+
+def public_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Mongo document as JSON-ready dict (ObjectId _id → str)"""
+    if "_id" in doc:
+        doc["_id"] = str(doc["_id"])
+    return doc
+
+def parse_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+    """Decode a ?cursor= token (400 if malformed)"""
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor, size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def fetch_balances(addresses: List[str], project_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Balances for every address × project pair from one balanceOfBatch call.
+
+    Projects that are not registered on-chain are reported with a null token_id.
+    """
+    token_ids = await bluecarbon_client.get_project_token_ids(project_ids)
+    pairs = [(a, pid) for a in addresses for pid in project_ids if token_ids[pid]]
+    amounts = await bluecarbon_client.get_balances_batch(
+        [a for a, _ in pairs], [token_ids[pid] for _, pid in pairs]
+    )
+
+    balances = {
+        a: {pid: {"token_id": token_ids[pid] or None, "balance": 0} for pid in project_ids}
+        for a in addresses
+    }
+    for (a, pid), amount in zip(pairs, amounts):
+        balances[a][pid]["balance"] = amount
+    return balances
+
+async def begin_operation(
+    kind: str, request: BaseModel, idempotency_key: Optional[str]
+) -> Tuple[Dict[str, Any], Optional[JSONResponse]]:
+    """Record a credit write in the outbox; the second value is the stored response of a retry"""
+    try:
+        operation, replay = await operation_outbox.begin(kind, request.dict(), idempotency_key)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not replay:
+        return operation, None
+    if operation["state"] in OPEN_STATES:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+    return operation, JSONResponse(
+        jsonable_encoder(operation["response"]),
+        status_code=operation.get("status_code", 200),
+        headers={"Idempotent-Replayed": "true"},
+    )
+
 # =======================
 #   ROUTES
 # =======================
 @app.get("/")
 async def root():
-    projects = db_client.get_projects()
+    projects = await db_client.get_projects()
     total_projects = len(projects)
     total_credits = sum(p.get("balances", {}).get("total_issued", 0) for p in projects)
 
@@ -106,41 +233,70 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {
-        "status": "healthy",
-        "timestamp": datetime.now(timezone.utc),
-        "database": db_client.db.name,
-        "blockchain": {
-            "connected": bluecarbon_client.w3.is_connected(),
+    """Liveness - the process is up; never touches Mongo or the RPC node"""
+    return {"status": "healthy", "timestamp": datetime.now(timezone.utc)}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness - dependencies connected and caches warmed (503 until then)"""
+    report = readiness_report()
+    report.update(
+        {
+            "timestamp": datetime.now(timezone.utc),
+            "database": db_client.name,
             "contract": bluecarbon_client.contract_address,
-        },
-        "projects_count": db_client.projects.count_documents({}),
-    }
+        }
+    )
+    return JSONResponse(jsonable_encoder(report), status_code=200 if report["ready"] else 503)
 
 @app.get("/projects")
-async def list_projects(limit: int = 10, skip: int = 0):
-    """List all projects from DB"""
-    return db_client.get_projects(limit=limit, skip=skip)
+async def list_projects(
+    response: Response,
+    limit: int = 10, skip: int = 0,
+    cursor: Optional[str] = None, fields: Optional[str] = None,
+):
+    """List projects newest first; pass the X-Next-Cursor header back as ?cursor= for the next page"""
+    after = parse_cursor(cursor, 2)
+    limit = max(1, min(limit, MAX_PAGE))
+    docs = await db_client.get_projects(
+        limit=limit + 1, skip=skip, after=after, projection=parse_fields(fields, always=("created_at",))
+    )
+    page, next_cursor = paginate(docs, limit, key=lambda p: (p.get("created_at"), p["_id"]))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [public_doc(p) for p in page]
 
 @app.get("/projects/{project_id}")
-async def get_project(project_id: str):
+async def get_project(project_id: str, fields: Optional[str] = None):
     """Get project details"""
-    project = db_client.get_project(project_id)
+    project = await db_client.get_project(project_id, projection=parse_fields(fields))
     if not project:
         raise HTTPException(status_code=404, detail=f"Project '{project_id}' not found")
-    return project
+    return public_doc(project)
 
 @app.post("/projects/register")
 async def register_project(
-    request: RegisterProjectRequest, admin_token: str = Depends(verify_admin_token)
+    request: RegisterProjectRequest,
+    wait: bool = False,
+    admin_token: str = Depends(verify_admin_token),
 ):
-    """Register a new carbon project (Admin only)"""
-    if db_client.get_project(request.project_id):
+    """Register a new carbon project (Admin only).
+
+    Returns as soon as the tx is broadcast; poll /tx/{tx_hash} for the outcome.
+    Pass wait=true to block until the receipt arrives.
+    """
+    if await db_client.get_project(request.project_id):
         raise HTTPException(status_code=400, detail=f"Project '{request.project_id}' already exists")
 
-    tx = bluecarbon_client.register_project(
-        request.project_id, request.metadata_cid, os.getenv("ADMIN_PRIVATE_KEY")
+    tx = await bluecarbon_client.register_project(
+        request.project_id, request.metadata_cid, os.getenv("ADMIN_PRIVATE_KEY"), wait=wait
     )
+    if not wait:
+        tx_status, project_status = "pending", "pending"
+    elif tx["status"] == 1:
+        tx_status, project_status = "confirmed", "active"
+    else:
+        tx_status, project_status = "failed", "failed"
 
     project_data = {
         "project_id": request.project_id,
@@ -148,58 +304,258 @@ async def register_project(
         "description": request.description,
         "project_type": request.project_type,
         "location": request.location,
-        "status": "active",
+        "status": project_status,
         "balances": {"total_issued": 0, "total_retired": 0, "circulating": 0},
     }
-    db_client.store_project(project_data)
-    db_client.log_transaction("project_registration", tx["tx_hash"], project_data)
-
+    token_id = bluecarbon_client.registered_token_id(request.project_id, tx) if wait else None
+    if token_id:
+        project_data["token_id"] = token_id
+    await db_client.store_project(project_data)
+    await db_client.log_transaction("project_registration", tx["tx_hash"], project_data, status=tx_status)
+
+    if not wait:
+        return {
+            "success": True,
+            "tx": tx,
+            "status_url": f"/tx/{tx['tx_hash']}",
+            "message": f"Project '{request.name}' registration submitted",
+        }
+    if tx_status == "failed":
+        return {"success": False, "tx": tx, "message": f"Project '{request.name}' registration reverted on-chain"}
     return {"success": True, "tx": tx, "message": f"Project '{request.name}' registered successfully!"}
 
 @app.post("/credits/issue")
 async def issue_credits(
-    request: IssueCreditsRequest, minter_token: str = Depends(verify_minter_token)
+    request: IssueCreditsRequest,
+    wait: bool = False,
+    idempotency_key: Optional[str] = Header(None),
+    minter_token: str = Depends(verify_minter_token),
 ):
-    """Issue carbon credits (Minter only)"""
-    project = db_client.get_project(request.project_id)
+    """Issue carbon credits (Minter only).
+
+    Balances are updated by the background confirmer once the tx is mined,
+    unless wait=true is passed. A retry with the same Idempotency-Key gets
+    the first response back instead of a second mint.
+    """
+    project = await db_client.get_project(request.project_id)
     if not project:
         raise HTTPException(status_code=404, detail=f"Project '{request.project_id}' not found")
 
-    tx = bluecarbon_client.issue_credits(
-        request.to_address,
-        request.project_id,
-        request.amount,
-        request.proof_cid,
-        os.getenv("MINTER_PRIVATE_KEY"),
-    )
+    operation, replay = await begin_operation("credit_issuance", request, idempotency_key)
+    if replay:
+        return replay
+
+    try:
+        tx = await bluecarbon_client.issue_credits(
+            request.to_address,
+            request.project_id,
+            request.amount,
+            request.proof_cid,
+            os.getenv("MINTER_PRIVATE_KEY"),
+            wait=wait,
+            on_signed=operation_outbox.on_signed(operation),
+        )
+    except Exception as e:
+        await operation_outbox.abandon(operation, e)
+        raise
+
+    await operation_outbox.record_transaction(operation)
+    if not wait:
+        response = {
+            "success": True,
+            "tx": tx,
+            "status_url": f"/tx/{tx['tx_hash']}",
+            "message": f"Issuance of {request.amount} credits submitted",
+        }
+    else:
+        await tx_confirmer.settle(tx["tx_hash"], tx)
+        response = {"success": True, "tx": tx, "message": f"{request.amount} credits issued successfully!"}
+
+    await operation_outbox.complete(operation, response)
+    return response
+
+@app.post("/credits/verify")
+async def verify_credits(request: VerifyCreditsRequest):
+    """Check a proposed issuance against the carbon stock computed from the project's plots.
+
+    Plots are those tagged with the project's project_id, or the explicit
+    plot_ids. 1 credit = 1 t CO2e; credits already issued and the
+    CREDIT_BUFFER_FRACTION reserve are subtracted from the computed stock.
+    """
+    project = await db_client.get_project(request.project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail=f"Project '{request.project_id}' not found")
 
-    db_client.update_project_balance(request.project_id, request.amount, operation="issue")
-    db_client.log_transaction("credit_issuance", tx["tx_hash"], request.dict())
+    query = {"ID": {"$in": request.plot_ids}} if request.plot_ids else {"project_id": request.project_id}
+    projection = {f: 1 for f in CARBON_FIELDS + ["Project_Type"]}
+    cols = await columns_from_cursor(db_client.iter_plots(query, projection))
+    if not len(cols["group"]):
+        raise HTTPException(status_code=422, detail=f"No plots linked to project '{request.project_id}'")
 
-    return {"success": True, "tx": tx, "message": f"{request.amount} credits issued successfully!"}
+    stock = carbon_engine.totals(cols, carbon_engine.compute(cols))
+    buffer = float(os.getenv("CREDIT_BUFFER_FRACTION", "0"))
+    issued = project.get("balances", {}).get("total_issued", 0)
+    issuable = int(stock["co2e_t"] * (1 - buffer)) - issued
+
+    return {
+        "project_id": request.project_id,
+        "amount": request.amount,
+        "verified": request.amount <= issuable,
+        "issuable": max(issuable, 0),
+        "already_issued": issued,
+        "buffer_fraction": buffer,
+        "stock": stock,
+    }
 
 @app.post("/credits/retire")
-async def retire_credits(request: RetireCreditsRequest):
-    """Retire carbon credits"""
-    project = db_client.get_project(request.project_id)
+async def retire_credits(request: RetireCreditsRequest, idempotency_key: Optional[str] = Header(None)):
+    """Retire carbon credits (a retry with the same Idempotency-Key replays the first response).
+
+    The credits are reserved by one conditional update before the chain
+    call, so concurrent retirements cannot overdraw a project; the
+    confirmer retires the reservation, or releases it if the tx reverts.
+    """
+    project = await db_client.get_project(request.project_id)
     if not project:
         raise HTTPException(status_code=404, detail=f"Project '{request.project_id}' not found")
 
-    if project.get("balances", {}).get("circulating", 0) < request.amount:
+    operation, replay = await begin_operation("credit_retirement", request, idempotency_key)
+    if replay:
+        return replay
+
+    reservation_id = str(operation["_id"])
+    if not await db_client.reserve_credits(request.project_id, request.amount, reservation_id):
+        await operation_outbox.abandon(operation, ValueError("insufficient credits"))
+        project = await db_client.get_project(request.project_id, {"balances.circulating": 1})
         raise HTTPException(status_code=400, detail=f"Insufficient credits. Available: {project.get('balances', {}).get('circulating', 0)}")
 
-    token_id = bluecarbon_client.get_project_token_id(request.project_id)
-    tx = bluecarbon_client.retire_credits(token_id, request.amount, os.getenv("USER_PRIVATE_KEY"))
+    try:
+        token_id = project.get("token_id") or await bluecarbon_client.get_project_token_id(request.project_id)
+        tx = await bluecarbon_client.retire_credits(
+            token_id, request.amount, os.getenv("USER_PRIVATE_KEY"), on_signed=operation_outbox.on_signed(operation)
+        )
+    except Exception as e:
+        await operation_outbox.abandon(operation, e)
+        raise
+
+    # The confirmer's claim settles the reservation exactly once, even if recovery races us
+    await operation_outbox.record_transaction(operation)
+    await tx_confirmer.settle(tx["tx_hash"], tx)
+    if tx["status"] == 1:
+        response = {"success": True, "tx": tx, "message": f"{request.amount} credits retired successfully!"}
+    else:
+        response = {"success": False, "tx": tx, "message": "Retirement transaction reverted on-chain"}
+
+    await operation_outbox.complete(operation, response)
+    return response
+
+@app.post("/credits/retire/batch")
+async def retire_credits_batch(request: RetireCreditsBatchRequest, idempotency_key: Optional[str] = Header(None)):
+    """Retire credits across many projects in a single on-chain transaction.
+
+    Every project's share is reserved by one bulk write of conditional
+    updates before the chain call, so concurrent retirements cannot overdraw
+    any of them. The tx is logged as pending and the confirmer retires the
+    reservations in one more bulk write once the receipt shows it succeeded;
+    a reverted batch releases them and returns 502.
+    """
+    amounts = retirement_amounts(request.dict())
+
+    projects = await db_client.get_projects_by_ids(list(amounts))
+    missing = [pid for pid in amounts if pid not in projects]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Projects not found: {missing}")
+
+    token_ids = await bluecarbon_client.get_project_token_ids(list(amounts))
+    unregistered = [pid for pid, token_id in token_ids.items() if not token_id]
+    if unregistered:
+        raise HTTPException(status_code=400, detail=f"Projects not registered on-chain: {unregistered}")
+
+    operation, replay = await begin_operation("credit_retirement_batch", request, idempotency_key)
+    if replay:
+        return replay
+
+    # One bulk write reserves every share; a shortfall releases whatever it took
+    if not await db_client.reserve_credits_batch(amounts, str(operation["_id"])):
+        await operation_outbox.abandon(operation, ValueError("insufficient credits"))
+        projects = await db_client.get_projects_by_ids(list(amounts))
+        available = {pid: p.get("balances", {}).get("circulating", 0) for pid, p in projects.items()}
+        short = [pid for pid, amount in amounts.items() if available.get(pid, 0) < amount] or list(amounts)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient credits for {short[0]}. Available: {available.get(short[0], 0)}",
+        )
 
-    db_client.update_project_balance(request.project_id, request.amount, operation="retire")
-    db_client.log_transaction("credit_retirement", tx["tx_hash"], request.dict())
+    try:
+        tx = await bluecarbon_client.retire_credits_batch(
+            [token_ids[pid] for pid in amounts], list(amounts.values()), os.getenv("USER_PRIVATE_KEY"),
+            on_signed=operation_outbox.on_signed(operation),
+        )
+    except Exception as e:
+        await operation_outbox.abandon(operation, e)
+        raise
+
+    await operation_outbox.record_transaction(operation)
+    await tx_confirmer.settle(tx["tx_hash"], tx)
 
-    return {"success": True, "tx": tx, "message": f"{request.amount} credits retired successfully!"}
+    items = [
+        {"project_id": pid, "token_id": token_ids[pid], "amount": amount}
+        for pid, amount in amounts.items()
+    ]
+    if tx["status"] == 1:
+        status_code = 200
+        response = {
+            "success": True,
+            "tx": tx,
+            "items": items,
+            "message": f"{sum(amounts.values())} credits retired across {len(items)} projects!",
+        }
+    else:
+        status_code = 502
+        response = {"success": False, "tx": tx, "items": items, "message": "Batch retirement reverted on-chain"}
+
+    await operation_outbox.complete(operation, response, status_code)
+    return JSONResponse(jsonable_encoder(response), status_code=status_code)
+
+@app.get("/tx/{tx_hash}")
+async def get_transaction_status(tx_hash: str):
+    """Get the status of a submitted transaction (pending / confirmed / failed)"""
+    tx = await db_client.get_transaction(tx_hash)
+    if not tx:
+        raise HTTPException(status_code=404, detail=f"Transaction '{tx_hash}' not found")
+
+    return public_doc(tx)
 
 @app.get("/projects/{project_id}/history")
-async def get_project_history(project_id: str, limit: int = 50):
-    """Get project history"""
-    return db_client.get_transaction_history(project_id, limit)
+async def get_project_history(
+    project_id: str, response: Response,
+    limit: int = 50, cursor: Optional[str] = None, fields: Optional[str] = None,
+):
+    """Get project history newest first; pass X-Next-Cursor back as ?cursor= for older entries"""
+    after = parse_cursor(cursor, 2)
+    limit = max(1, min(limit, MAX_PAGE))
+    docs = await db_client.get_transaction_history(
+        project_id, limit + 1, after=after, projection=parse_fields(fields, always=("timestamp",))
+    )
+    page, next_cursor = paginate(docs, limit, key=lambda tx: (tx.get("timestamp"), tx["_id"]))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [public_doc(tx) for tx in page]
+
+@app.get("/projects/{project_id}/events")
+async def get_project_events(project_id: str, limit: int = 50):
+    """Get indexed on-chain events (issuance, retirement, transfers) for a project"""
+    project = await db_client.get_project(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail=f"Project '{project_id}' not found")
+    if not project.get("token_id"):
+        return []
+    return await db_client.get_chain_events(project["token_id"], limit)
+
+@app.get("/indexer/status")
+async def get_indexer_status():
+    """Checkpoint and lag of the chain event indexer"""
+    return await chain_indexer.status()
 
 @app.get("/balance/{address}/{project_id}")
 async def get_balance(address: str, project_id: str):
@@ -207,11 +563,41 @@ async def get_balance(address: str, project_id: str):
     if not Web3.is_address(address):
         raise HTTPException(status_code=400, detail="Invalid address")
 
-    token_id = bluecarbon_client.get_project_token_id(project_id)
-    balance = bluecarbon_client.get_balance_of(address, token_id)
+    token_id = await bluecarbon_client.get_project_token_id(project_id)
+    balance = await bluecarbon_client.get_balance_of(address, token_id)
 
     return {"address": Web3.to_checksum_address(address), "project_id": project_id, "token_id": token_id, "balance": balance}
 
+@app.get("/balances/{address}")
+async def get_balances(address: str, project_ids: Optional[str] = None, source: str = "chain"):
+    """Get an address's balance for several projects (comma-separated, default: all).
+
+    source=index answers from the chain indexer's MongoDB copy without any RPC call.
+    """
+    if not Web3.is_address(address):
+        raise HTTPException(status_code=400, detail="Invalid address")
+    if source not in ("chain", "index"):
+        raise HTTPException(status_code=400, detail="source must be 'chain' or 'index'")
+
+    address = Web3.to_checksum_address(address)
+    pids = project_ids.split(",") if project_ids else await db_client.get_project_ids()
+    if source == "chain":
+        return {"address": address, "balances": (await fetch_balances([address], pids))[address]}
+
+    token_ids = await db_client.get_project_token_id_map()
+    held = {h["token_id"]: h["balance"] for h in await db_client.get_holder_balances(address)}
+    balances = {
+        pid: {"token_id": token_ids.get(pid), "balance": held.get(token_ids.get(pid), 0)}
+        for pid in pids
+    }
+    return {"address": address, "balances": balances, "source": "index"}
+
+@app.post("/balances")
+async def get_balances_for_addresses(request: BalancesRequest):
+    """Get balances for many addresses × many projects (default: all projects)"""
+    pids = request.project_ids or await db_client.get_project_ids()
+    return {"balances": await fetch_balances(request.addresses, pids)}
+
 # =======================
 #   REGISTRY ROUTES
 # =======================
@@ -219,7 +605,7 @@ async def get_balance(address: str, project_id: str):
 async def get_registry_entry(name: str):
     """Fetch the contract address for a given name from the registry"""
     try:
-        addr = bluecarbon_client.registry.functions.getContract(name).call()
+        addr = await bluecarbon_client.get_registry_contract(name)
         if addr == "0x0000000000000000000000000000000000000000":
             raise HTTPException(status_code=404, detail=f"No contract found for '{name}'")
         return {"name": name, "address": addr}
@@ -232,81 +618,199 @@ async def update_registry_entry(
 ):
     """Update the registry with a new contract address (Admin only)"""
     try:
-        acct = bluecarbon_client.w3.eth.account.from_key(os.getenv("ADMIN_PRIVATE_KEY"))
-        nonce = bluecarbon_client.w3.eth.get_transaction_count(acct.address)
-
-        txn = bluecarbon_client.registry.functions.updateContract(name, new_address).build_transaction(
-            {
-                "from": acct.address,
-                "nonce": nonce,
-                "chainId": int(os.getenv("CHAIN_ID")),
-                "gas": 300000,
-                "gasPrice": bluecarbon_client.w3.eth.gas_price,
-            }
+        result = await bluecarbon_client.update_registry_contract(
+            name, new_address, os.getenv("ADMIN_PRIVATE_KEY")
         )
-
-        result = bluecarbon_client._send_transaction(txn, os.getenv("ADMIN_PRIVATE_KEY"))
         return {"success": True, "tx": result, "message": f"Registry updated: {name} → {new_address}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# =======================
+#   PLOT ROUTES
+# =======================
+@app.get("/carbon/stocks")
+async def get_carbon_stocks(group_by: str = "Project_Type", source: Optional[str] = None):
+    """Carbon pools and CO2e per Project_Type or project_id over every plot.
+
+    Reads the Parquet snapshot when one exists (source=snapshot), otherwise
+    streams the columns from Mongo (source=mongo).
+    """
+    if group_by not in ("Project_Type", "project_id"):
+        raise HTTPException(status_code=400, detail="group_by must be Project_Type or project_id")
+    source = source or ("snapshot" if arrow_analytics.available() else "mongo")
+
+    if source == "snapshot":
+        if not arrow_analytics.available():
+            raise HTTPException(status_code=503, detail="Parquet plot snapshot not available")
+        columns = sorted(set(CARBON_FIELDS + ["Project_Type", group_by]))
+        table = await asyncio.to_thread(arrow_analytics.read_columns, columns)
+        cols = columns_from_table(table, group_by)
+    elif source == "mongo":
+        projection = {f: 1 for f in CARBON_FIELDS + ["Project_Type", group_by]}
+        cols = await columns_from_cursor(db_client.iter_plots({}, projection), group_by)
+    else:
+        raise HTTPException(status_code=400, detail="source must be snapshot or mongo")
+
+    stocks = await asyncio.to_thread(carbon_engine.compute, cols)
+    return {
+        "source": source,
+        "group_by": group_by,
+        "totals": carbon_engine.totals(cols, stocks),
+        "groups": carbon_engine.aggregate(cols, stocks),
+    }
+
+@app.post("/plots/ingest")
+async def ingest_plots(file: UploadFile = File(...), admin_token: str = Depends(verify_admin_token)):
+    """Upsert plot observations from an uploaded CSV (Admin only).
+
+    Rows are parsed and written in batches; the response lists rejected rows
+    with their line numbers.
+    """
+    try:
+        report = await plot_ingest.run_binary(file.file)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ingest failed: {e}")
+    finally:
+        response_cache.invalidate()
+    return report
+
+def plot_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Plot document as JSON: string _id, NaN fields as null"""
+    return json_safe(public_doc(doc))
+
+@app.get("/plots/near")
+async def get_plots_near(
+    lng: float, lat: float, radius_m: float,
+    fields: Optional[str] = None, limit: int = 100, cursor: Optional[str] = None,
+):
+    """Plots within radius_m metres of a point, nearest first (cursor-paged)"""
+    after = parse_cursor(cursor, 2)
+    limit = max(1, min(limit, MAX_PAGE))
+    docs = await db_client.get_plots_near(
+        point(lng, lat), radius_m, parse_fields(fields, always=("location",)), limit, after
+    )
+    page, next_cursor = paginate(docs, limit, key=lambda d: (d["distance"], d["_id"]))
+    return {"plots": [plot_doc(d) for d in page], "next_cursor": next_cursor}
+
+@app.get("/plots/near/stats")
+async def get_plot_stats_near(lng: float, lat: float, radius_m: float):
+    """NDVI/biomass aggregates of the plots within radius_m metres of a point"""
+    return json_safe(await db_client.get_plot_stats(near_filter(lng, lat, radius_m)))
+
+def within_geometry(bbox: Optional[str], polygon: Optional[str]) -> Dict[str, Any]:
+    """Exactly one of bbox / polygon as a GeoJSON Polygon (400 otherwise)"""
+    if bool(bbox) == bool(polygon):
+        raise HTTPException(status_code=400, detail="Pass exactly one of bbox or polygon")
+    try:
+        return bbox_geometry(parse_bbox(bbox)) if bbox else parse_polygon(polygon)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/plots/within")
+async def get_plots_within(
+    bbox: Optional[str] = None, polygon: Optional[str] = None,
+    fields: Optional[str] = None, limit: int = 100, cursor: Optional[str] = None,
+):
+    """Plots inside a bbox (min_lon,min_lat,max_lon,max_lat) or polygon ([[lon,lat],...])"""
+    geometry = within_geometry(bbox, polygon)
+    after = (parse_cursor(cursor, 1) or [None])[0]
+    limit = max(1, min(limit, MAX_PAGE))
+    docs = await db_client.get_plots_within(
+        within_filter(geometry), parse_fields(fields, always=("location",)), limit, after
+    )
+    page, next_cursor = paginate(docs, limit, key=lambda d: (d["_id"],))
+    return {"plots": [plot_doc(d) for d in page], "next_cursor": next_cursor}
+
+@app.get("/plots/within/stats")
+async def get_plot_stats_within(bbox: Optional[str] = None, polygon: Optional[str] = None):
+    """NDVI/biomass aggregates of the plots inside a bbox or polygon"""
+    return json_safe(await db_client.get_plot_stats(within_filter(within_geometry(bbox, polygon))))
+
+# =======================
+#   EXPORT ROUTES
+# =======================
+def export_options(fmt: str, fields: Optional[str], gzip: Optional[bool], request: Request):
+    """Validate format, parse fields and decide on gzip (explicit flag or Accept-Encoding).
+
+    Returns (fields, compress, negotiated); negotiated is True when Accept-Encoding decided.
+    """
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(FORMATS)}")
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    negotiated = gzip is None
+    compress = accepts_gzip(request.headers.get("accept-encoding")) if negotiated else gzip
+    return names, compress, negotiated
+
+@app.get("/export/plots")
+async def export_plots(
+    request: Request,
+    format: str = "ndjson", fields: Optional[str] = None, gzip: Optional[bool] = None,
+    project_type: Optional[str] = None, data_source: Optional[str] = None,
+    year_from: Optional[int] = None, year_to: Optional[int] = None, bbox: Optional[str] = None,
+):
+    """Stream every matching plot as NDJSON or CSV straight from a Mongo cursor"""
+    names, compress, negotiated = export_options(format, fields, gzip, request)
+    try:
+        coords = parse_bbox(bbox) if bbox else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    query = summary_filter(year_from, year_to, project_type, coords)
+    if data_source:
+        query["Data_Source"] = data_source
+    projection = {n: 1 for n in names} if names else None
+    cursor = db_client.iter_plots(query, projection)
+    return stream_export(cursor, format, "plots", names, compress, negotiated)
+
+@app.get("/export/transactions")
+async def export_transactions(
+    request: Request,
+    format: str = "ndjson", fields: Optional[str] = None, gzip: Optional[bool] = None,
+    project_id: Optional[str] = None, type: Optional[str] = None, status: Optional[str] = None,
+    since: Optional[datetime] = None, until: Optional[datetime] = None,
+):
+    """Stream the transaction ledger (oldest first) as NDJSON or CSV"""
+    names, compress, negotiated = export_options(format, fields, gzip, request)
+
+    query: Dict[str, Any] = {}
+    if project_id:
+        query["project_id"] = project_id
+    if type:
+        query["type"] = type
+    if status:
+        query["status"] = status
+    if since or until:
+        query["timestamp"] = {}
+        if since:
+            query["timestamp"]["$gte"] = since
+        if until:
+            query["timestamp"]["$lt"] = until
+    projection = {n: 1 for n in names} if names else None
+    cursor = db_client.iter_transactions(query, projection)
+    return stream_export(cursor, format, "transactions", names, compress, negotiated)
+
 # =======================
 #   ANALYTICS ROUTES
 # =======================
-@app.get("/analytics/plots-overview")
-async def plots_overview():
-    total_plots = db_client.plots.count_documents({})
-    plots_by_type = list(db_client.plots.aggregate([
-        {"$group": {"_id": "$Project_Type", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}}
-    ]))
-    return {"total_plots": total_plots, "by_type": plots_by_type}
-
-@app.get("/analytics/ndvi-by-project")
-async def ndvi_by_project():
-    pipeline = [
-        {"$group": {"_id": "$Project_Type", "avgNDVI": {"$avg": "$NDVI"}}},
-        {"$sort": {"avgNDVI": -1}}
-    ]
-    return {"ndvi": list(db_client.plots.aggregate(pipeline))}
-
-@app.get("/analytics/biomass-trend")
-async def biomass_trend():
-    pipeline = [
-        {"$group": {
-            "_id": "$Monitoring_Year",
-            "avgAbove": {"$avg": "$Biomass_above_kg"},
-            "avgBelow": {"$avg": "$Biomass_below_kg"},
-            "total": {"$sum": {"$add": ["$Biomass_above_kg", "$Biomass_below_kg"]}}
-        }},
-        {"$sort": {"_id": 1}}
-    ]
-    return {"biomass": list(db_client.plots.aggregate(pipeline))}
-
-@app.get("/analytics/fluxes")
-async def fluxes():
-    co2 = list(db_client.plots.aggregate([
-        {"$group": {"_id": "$Monitoring_Year", "avgCO2": {"$avg": "$CO2_Flux_mg_m2_day"}}},
-        {"$sort": {"_id": 1}}
-    ]))
-    ch4 = list(db_client.plots.aggregate([
-        {"$group": {"_id": "$Monitoring_Year", "avgCH4": {"$avg": "$CH4_Flux_mg_m2_day"}}},
-        {"$sort": {"_id": 1}}
-    ]))
-    return {"co2": co2, "ch4": ch4}
-
-@app.get("/analytics/ndvi-monthly")
-async def ndvi_monthly():
-    pipeline = [
-        {"$addFields": {"month": {"$month": "$Timestamp"}, "year": {"$year": "$Timestamp"}}},
-        {"$group": {"_id": {"year": "$year", "month": "$month"}, "avgNDVI": {"$avg": "$NDVI"}}},
-        {"$sort": {"_id.year": 1, "_id.month": 1}}
-    ]
-    return {"trend": list(db_client.plots.aggregate(pipeline))}
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Request, Mongo, RPC and confirmation metrics in the Prometheus text format"""
+    body, content_type = render_metrics()
+    return Response(content=body, headers={"Content-Type": content_type})
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Analytics response cache hit ratio and memory use"""
+    return response_cache.stats()
+
+
+# One service, two mount points: /analytics (dashboard) and /api/analytics
+app.include_router(analytics_router, prefix="/analytics")
+app.include_router(analytics_router, prefix="/api/analytics")
 
 # Startup
 if __name__ == "__main__":
     import uvicorn
-    print("🚀 Starting BlueCarbon API...")
-    print(f"🔗 Contract in use from registry: {bluecarbon_client.contract_address}")
+    logger.info("🚀 Starting BlueCarbon API...")
+    logger.info("🔗 Contract resolved at startup from registry: %s", os.getenv("REGISTRY_ADDRESS"))
     uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)), reload=True)
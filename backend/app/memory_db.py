@@ -0,0 +1,1031 @@
+"""
+In-Memory Database - the BlueCarbonDatabase interface on indexed dicts (DB_BACKEND=memory)
+"""
+
+import asyncio
+import bisect
+import logging
+import math
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.geo import EARTH_RADIUS_M
+from app.rollups import (
+    bucket_document,
+    bucket_id,
+    merge_deltas,
+    mongo_sort_key,
+    plot_keys,
+    plot_values,
+    rollup_deltas,
+)
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Side of a geo grid cell in degrees (plots are bucketed by floor(lon), floor(lat))
+GRID_DEGREES = 1.0
+
+
+# -----------------------------
+# Document helpers
+# -----------------------------
+def _copy(value: Any) -> Any:
+    """Detached copy of a stored document (callers mutate what they get back)"""
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _naive(value: Any) -> Any:
+    """Aware datetimes → naive UTC at millisecond precision, as Mongo stores and returns them"""
+    if isinstance(value, datetime):
+        value = value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if isinstance(value, dict):
+        return {k: _naive(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_naive(v) for v in value]
+    return value
+
+
+def _now() -> datetime:
+    return _naive(datetime.now(timezone.utc))
+
+
+def _get(doc: Any, path: str) -> Any:
+    """Value at a dotted path, or _MISSING"""
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Dict[str, int]]) -> Dict[str, Any]:
+    """Inclusion projection (plus _id unless _id: 0) applied to a copy"""
+    if not projection:
+        return _copy(doc)
+    fields = [f for f, keep in projection.items() if keep and f != "_id"]
+    if not fields:
+        out = {k: _copy(v) for k, v in doc.items()}
+    else:
+        out = {}
+        for field in fields:
+            value = _get(doc, field)
+            if value is _MISSING:
+                continue
+            target = out
+            *parents, leaf = field.split(".")
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[leaf] = _copy(value)
+    if projection.get("_id", 1):
+        if "_id" in doc:
+            out["_id"] = doc["_id"]
+    else:
+        out.pop("_id", None)
+    return out
+
+
+# -----------------------------
+# Query matching (the operators the API's queries use)
+# -----------------------------
+def _bracket(value: Any) -> Optional[str]:
+    """Mongo only compares values of the same type bracket"""
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    for kind, types in (("string", str), ("date", datetime), ("objectid", ObjectId)):
+        if isinstance(value, types):
+            return kind
+    return None
+
+
+def _compare(op: Callable[[Any, Any], bool]) -> Callable[[Any, Any], bool]:
+    def check(value, arg):
+        values = value if isinstance(value, list) else [value]
+        return any(_bracket(v) is not None and _bracket(v) == _bracket(arg) and op(v, arg) for v in values)
+    return check
+
+
+def _equals(value: Any, arg: Any) -> bool:
+    if value is _MISSING:
+        return arg is None
+    if isinstance(value, list) and not isinstance(arg, list):
+        return arg in value
+    return value == arg
+
+
+def _haversine_m(lng1: float, lat1: float, lng2: float, lat2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _in_polygon(lng: float, lat: float, ring: List[List[float]]) -> bool:
+    """Even-odd ray cast with planar edges (exact for bounding boxes)"""
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        if (y1 > lat) != (y2 > lat) and lng < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+def _point(value: Any) -> Optional[Tuple[float, float]]:
+    if isinstance(value, dict) and value.get("type") == "Point":
+        lng, lat = value["coordinates"][:2]
+        return lng, lat
+    return None
+
+
+def _geo_within(value: Any, arg: Dict[str, Any]) -> bool:
+    point = _point(value)
+    if point is None:
+        return False
+    if "$centerSphere" in arg:
+        (lng, lat), radians = arg["$centerSphere"]
+        return _haversine_m(lng, lat, *point) <= radians * EARTH_RADIUS_M
+    geometry = arg["$geometry"]
+    rings = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+    return any(_in_polygon(*point, polygon[0]) for polygon in rings)
+
+
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "$eq": _equals,
+    "$ne": lambda value, arg: not _equals(value, arg),
+    "$in": lambda value, arg: any(_equals(value, a) for a in arg),
+    "$nin": lambda value, arg: not any(_equals(value, a) for a in arg),
+    "$gt": _compare(lambda v, a: v > a),
+    "$gte": _compare(lambda v, a: v >= a),
+    "$lt": _compare(lambda v, a: v < a),
+    "$lte": _compare(lambda v, a: v <= a),
+    "$exists": lambda value, arg: (value is not _MISSING) == bool(arg),
+    "$geoWithin": _geo_within,
+}
+
+
+def matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """Whether a document satisfies a Mongo-style query; ValueError on unsupported operators"""
+    for field, cond in query.items():
+        if field == "$or":
+            if not any(matches(doc, q) for q in cond):
+                return False
+            continue
+        if field == "$and":
+            if not all(matches(doc, q) for q in cond):
+                return False
+            continue
+        value = _get(doc, field)
+        if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            for op, arg in cond.items():
+                if op not in OPERATORS:
+                    raise ValueError(f"Unsupported query operator {op}")
+                if not OPERATORS[op](value, arg):
+                    return False
+        elif not _equals(value, cond):
+            return False
+    return True
+
+
+# -----------------------------
+# Aggregation (the stages app.analytics and the plot routes use)
+# -----------------------------
+def _expr(doc: Dict[str, Any], expr: Any) -> Any:
+    if isinstance(expr, str) and expr.startswith("$"):
+        value = _get(doc, expr[1:])
+        return None if value is _MISSING else value
+    if isinstance(expr, dict):
+        if len(expr) == 1 and next(iter(expr)).startswith("$"):
+            op, arg = next(iter(expr.items()))
+            if op == "$add":
+                values = [_expr(doc, a) for a in arg]
+                if any(v is None for v in values):
+                    return None
+                return sum(values)
+            if op in ("$year", "$month"):
+                value = _expr(doc, arg)
+                if not isinstance(value, datetime):
+                    return None
+                return value.year if op == "$year" else value.month
+            raise ValueError(f"Unsupported expression operator {op}")
+        return {k: _expr(doc, v) for k, v in expr.items()}
+    return expr
+
+
+def _number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _group(docs: Iterable[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    key_expr = spec["_id"]
+    accumulators = {k: next(iter(v.items())) for k, v in spec.items() if k != "_id"}
+    groups: Dict[Any, Dict[str, Any]] = {}
+    for doc in docs:
+        key = _expr(doc, key_expr)
+        hashable = repr(key)
+        state = groups.get(hashable)
+        if state is None:
+            state = groups[hashable] = {"_id": key, **{name: [] for name in accumulators}}
+        for name, (_, arg) in accumulators.items():
+            state[name].append(_expr(doc, arg))
+
+    rows = []
+    for state in groups.values():
+        row = {"_id": state["_id"]}
+        for name, (op, _) in accumulators.items():
+            values = [v for v in state[name] if _number(v)]
+            if op == "$sum":
+                row[name] = sum(values)
+            elif op == "$avg":
+                row[name] = sum(values) / len(values) if values else None
+            elif op in ("$min", "$max"):
+                present = [v for v in state[name] if v is not None]
+                row[name] = (min if op == "$min" else max)(present, key=mongo_sort_key) if present else None
+            else:
+                raise ValueError(f"Unsupported accumulator {op}")
+        rows.append(row)
+    return rows
+
+
+def _sort(docs: List[Dict[str, Any]], spec: Dict[str, int]) -> List[Dict[str, Any]]:
+    for field, direction in reversed(list(spec.items())):
+        docs.sort(key=lambda d: mongo_sort_key(None if _get(d, field) is _MISSING else _get(d, field)),
+                  reverse=direction < 0)
+    return docs
+
+
+def aggregate(docs: Iterable[Dict[str, Any]], pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run $match/$addFields/$group/$sort/$facet/$count/$limit/$project over documents"""
+    rows: Iterable[Dict[str, Any]] = docs
+    for stage in pipeline:
+        (op, spec), = stage.items()
+        if op == "$match":
+            rows = [d for d in rows if matches(d, spec)]
+        elif op == "$addFields":
+            rows = [{**d, **{k: _expr(d, v) for k, v in spec.items()}} for d in rows]
+        elif op == "$group":
+            rows = _group(rows, spec)
+        elif op == "$sort":
+            rows = _sort(list(rows), spec)
+        elif op == "$facet":
+            rows = list(rows)
+            rows = [{name: aggregate(rows, sub) for name, sub in spec.items()}]
+        elif op == "$count":
+            n = sum(1 for _ in rows)
+            rows = [{spec: n}] if n else []
+        elif op == "$limit":
+            rows = list(rows)[:spec]
+        elif op == "$project":
+            rows = [_project(d, spec) for d in rows]
+        else:
+            raise ValueError(f"Unsupported pipeline stage {op}")
+    return list(rows)
+
+
+# -----------------------------
+# Cursor
+# -----------------------------
+class MemoryCursor:
+    """Motor-like cursor over a lazy result: async iteration and batched to_list()"""
+
+    YIELD_EVERY = 1000
+
+    def __init__(self, docs: Iterator[Dict[str, Any]]):
+        self._docs = docs
+
+    def batch_size(self, size: int) -> "MemoryCursor":
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        out = []
+        for doc in self._docs:
+            out.append(doc)
+            if length is not None and len(out) >= length:
+                break
+        return out
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for n, doc in enumerate(self._docs, 1):
+            yield doc
+            if n % self.YIELD_EVERY == 0:
+                await asyncio.sleep(0)  # let other requests run during long scans
+
+
+class MemoryDatabase:
+    """Every BlueCarbonDatabase method on in-process dicts, lists and indexes.
+
+    Nothing is persisted. Each method runs without awaiting in between, so
+    single-document updates are as atomic as they are on Mongo. Plot
+    rollups are maintained from the first write, so analytics always read
+    buckets; filtered summaries run the same pipelines through aggregate().
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        # projects: by project_id, plus token_id and (created_at, _id) indexes
+        self._projects: Dict[str, Dict[str, Any]] = {}
+        self._projects_by_token: Dict[int, Set[str]] = defaultdict(set)
+        self._project_order: List[Dict[str, Any]] = []
+
+        # transactions: by tx_hash, time-ordered overall and per project, pending set
+        self._transactions: Dict[str, Dict[str, Any]] = {}
+        self._tx_order: List[Dict[str, Any]] = []
+        self._tx_by_project: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+        self._users: Dict[str, Dict[str, Any]] = {}
+
+        # plots: by ID (insertion = _id order), rollup bucket members, geo grid
+        self._plots: Dict[str, Dict[str, Any]] = {}
+        self._bucket_members: Dict[str, Set[str]] = defaultdict(set)
+        self._cells: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+        self._by_project_id: Dict[Any, Set[str]] = defaultdict(set)
+        self._rollups: Dict[str, Dict[str, Any]] = {}
+        self._plot_version = 0
+
+        # chain index
+        self._events: Dict[str, Dict[str, Any]] = {}
+        self._events_by_token: Dict[int, Set[str]] = defaultdict(set)
+        self._holders: Dict[str, Dict[str, Any]] = {}
+        self._holders_by_wallet: Dict[str, Set[str]] = defaultdict(set)
+        self._sync_state: Dict[str, Dict[str, Any]] = {}
+
+        # operations (outbox): by _id, Idempotency-Key index, open (pending / signed) set
+        self._operations: Dict[ObjectId, Dict[str, Any]] = {}
+        self._operations_by_key: Dict[str, ObjectId] = {}
+        self._open_operations: Set[ObjectId] = set()
+
+    async def connect(self):
+        """Nothing to connect; loads MEMORY_PLOTS_CSV if set"""
+        logger.info("✅ Using in-memory database")
+        path = os.getenv("MEMORY_PLOTS_CSV")
+        if path and not self._plots:
+            from app.ingest import PlotIngest
+            await PlotIngest(self).run_file(path)
+
+    def close(self):
+        pass
+
+    # ----------------- PROJECTS -----------------
+    @staticmethod
+    def _created_key(project: Dict[str, Any]):
+        return (project["created_at"], project["_id"])
+
+    async def get_project(
+        self, project_id: str, projection: Optional[Dict[str, int]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Get project by ID"""
+        project = self._projects.get(project_id)
+        return _project(project, projection) if project else None
+
+    async def get_projects_by_ids(self, project_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get several projects, keyed by project_id"""
+        return {pid: _copy(self._projects[pid]) for pid in project_ids if pid in self._projects}
+
+    async def get_project_ids(self) -> List[str]:
+        """Get the IDs of every stored project"""
+        return list(self._projects)
+
+    async def get_project_token_id_map(self) -> Dict[str, int]:
+        """Get every persisted projectId → tokenId mapping"""
+        return {
+            pid: p["token_id"]
+            for pid, p in self._projects.items()
+            if _number(p.get("token_id")) and p["token_id"] > 0
+        }
+
+    def _index_token(self, project: Dict[str, Any], token_id: Optional[int]):
+        old = project.get("token_id")
+        if old is not None:
+            self._projects_by_token[old].discard(project["project_id"])
+        if token_id is not None:
+            self._projects_by_token[token_id].add(project["project_id"])
+
+    async def set_project_token_id(self, project_id: str, token_id: int):
+        """Persist the on-chain token ID of a project"""
+        project = self._projects.get(project_id)
+        if project:
+            self._index_token(project, token_id)
+            project.update({"token_id": token_id, "updated_at": _now()})
+
+    async def get_projects(
+        self,
+        limit: int = 100,
+        skip: int = 0,
+        after: Optional[List[Any]] = None,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Get projects newest first; `after` is the (created_at, _id) of the previous page's last row"""
+        if after:
+            end = bisect.bisect_left(self._project_order, tuple(_naive(after)), key=self._created_key)
+        else:
+            end = max(len(self._project_order) - skip, 0)
+        page = self._project_order[max(end - limit, 0):end]
+        return [_project(p, projection) for p in reversed(page)]
+
+    async def store_project(self, project_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Store new project"""
+        project_id = project_data["project_id"]
+        if project_id in self._projects:
+            logger.error("❌ Failed to store project %s: duplicate project_id", project_id)
+            raise DuplicateKeyError(f"duplicate project_id {project_id!r}", 11000)
+
+        now = _now()
+        project_data["created_at"] = now
+        project_data["updated_at"] = now
+        project_data.setdefault("status", "active")
+        project_data.setdefault(
+            "balances", {"total_issued": 0, "total_retired": 0, "circulating": 0, "last_updated": now}
+        )
+        stored = _naive(_copy(project_data))
+        stored["_id"] = ObjectId()
+        self._projects[project_id] = stored
+        self._index_token(stored, stored.get("token_id"))
+        bisect.insort(self._project_order, stored, key=self._created_key)
+
+        project_data["_id"] = str(stored["_id"])
+        logger.debug("✅ Project stored: %s", project_id)
+        return project_data
+
+    async def set_project_status(self, project_id: str, status: str):
+        """Update the lifecycle status of a project"""
+        project = self._projects.get(project_id)
+        if project:
+            project.update({"status": status, "updated_at": _now()})
+
+    async def update_project_balance(self, project_id: str, amount: int, operation: str = "issue"):
+        """Update project balances"""
+        if operation == "issue":
+            changes = {"total_issued": amount, "circulating": amount}
+        elif operation == "retire":
+            changes = {"total_retired": amount, "circulating": -amount}
+        else:
+            raise ValueError(f"Unknown operation: {operation}")
+
+        project = self._projects.get(project_id)
+        if not project:
+            logger.warning("⚠️  No project found: %s", project_id)
+            return
+        self._apply_balance_changes(project, changes)
+        logger.debug("💰 Updated balance for %s: %s%d", project_id, "+" if operation == "issue" else "-", amount)
+
+    def _apply_balance_changes(self, project: Dict[str, Any], changes: Dict[str, int]):
+        now = _now()
+        balances = project.setdefault("balances", {})
+        for field, delta in changes.items():
+            balances[field] = balances.get(field, 0) + delta
+        balances["last_updated"] = now
+        project["updated_at"] = now
+
+    async def reserve_credits(
+        self, project_id: str, amount: int, reservation_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Move `amount` from circulating to reserved if that many are available"""
+        project = self._projects.get(project_id)
+        if not project or not OPERATORS["$gte"](_get(project, "balances.circulating"), amount):
+            return None
+        self._apply_balance_changes(project, {"circulating": -amount, "reserved": amount})
+        project["balances"].setdefault("reservations", {})[reservation_id] = amount
+        return _copy(project)
+
+    async def reserve_credits_batch(self, amounts: Dict[str, int], reservation_id: str) -> bool:
+        """Reserve every project's share, all or nothing; False if any is missing or short"""
+        for project_id, amount in amounts.items():
+            project = self._projects.get(project_id)
+            if not project or not OPERATORS["$gte"](_get(project, "balances.circulating"), amount):
+                return False
+        for project_id, amount in amounts.items():
+            await self.reserve_credits(project_id, amount, reservation_id)
+        return True
+
+    async def settle_reservations(self, amounts: Dict[str, int], reservation_id: str, retired: bool) -> int:
+        """Retire (retired=True) or release a reservation's shares; returns how many were settled now"""
+        settled = 0
+        for project_id, amount in amounts.items():
+            project = self._projects.get(project_id)
+            reservations = (project or {}).get("balances", {}).get("reservations", {})
+            if reservations.get(reservation_id) != amount:
+                continue
+            del reservations[reservation_id]
+            self._apply_balance_changes(
+                project, {"reserved": -amount, "total_retired" if retired else "circulating": amount}
+            )
+            settled += 1
+        return settled
+
+    # ----------------- TRANSACTIONS -----------------
+    @staticmethod
+    def _tx_key(tx: Dict[str, Any]):
+        return (tx["timestamp"], tx["_id"])
+
+    def _insert_transaction(self, doc: Dict[str, Any]):
+        """Store a transaction in every index; doc gets its _id as a string, like the Mongo layer"""
+        if doc["tx_hash"] in self._transactions:
+            raise DuplicateKeyError(f"duplicate tx_hash {doc['tx_hash']!r}", 11000)
+        stored = _naive(_copy(doc))
+        stored["_id"] = ObjectId()
+        self._transactions[stored["tx_hash"]] = stored
+        bisect.insort(self._tx_order, stored, key=self._tx_key)
+        project_ids = stored["project_id"] if isinstance(stored["project_id"], list) else [stored["project_id"]]
+        for project_id in project_ids:
+            bisect.insort(self._tx_by_project[project_id], stored, key=self._tx_key)
+        if stored["status"] == "pending":
+            self._pending[stored["tx_hash"]] = stored
+        doc["_id"] = str(stored["_id"])
+
+    async def log_transaction(
+        self, tx_type: str, tx_hash: str, details: Dict[str, Any], status: str = "confirmed"
+    ) -> Dict[str, Any]:
+        """Log blockchain transaction (status is "pending" for submit-and-track writes)"""
+        project_id = details.get("project_id")
+        now = _now()
+        doc = {
+            "type": tx_type,
+            "tx_hash": tx_hash,
+            "project_id": project_id,
+            "details": details,
+            "status": status,
+            "timestamp": now,
+            "created_at": now,
+        }
+        try:
+            self._insert_transaction(doc)
+        except DuplicateKeyError as e:
+            logger.error("❌ Failed to log transaction %s: %s", tx_hash, e)
+            raise
+        logger.debug("📝 Transaction logged: %s for project %s", tx_hash, project_id)
+        return doc
+
+    async def get_transaction(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        """Get a logged transaction by hash"""
+        tx = self._transactions.get(tx_hash)
+        return _copy(tx) if tx else None
+
+    async def get_pending_transactions(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get transactions still waiting for a receipt, oldest first"""
+        return [_copy(tx) for tx in sorted(self._pending.values(), key=self._tx_key)[:limit]]
+
+    async def claim_pending_transaction(
+        self, tx_hash: str, status: str, receipt: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Move a pending transaction to its final status; None if it was already settled"""
+        tx = self._pending.pop(tx_hash, None)
+        if tx is None:
+            return None
+        before = _copy(tx)
+        tx.update(
+            {
+                "status": status,
+                "block_number": receipt.get("blockNumber"),
+                "gas_used": receipt.get("gasUsed"),
+                "confirmed_at": _now(),
+            }
+        )
+        return before
+
+    async def get_transaction_history(
+        self,
+        project_id: Optional[str] = None,
+        limit: int = 50,
+        after: Optional[List[Any]] = None,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Get transaction history for a project or all, newest first (keyset on (timestamp, _id))"""
+        txs = self._tx_by_project.get(project_id, []) if project_id else self._tx_order
+        end = bisect.bisect_left(txs, tuple(_naive(after)), key=self._tx_key) if after else len(txs)
+        return [_project(tx, projection) for tx in reversed(txs[max(0, end - limit):end])]
+
+    def iter_transactions(self, query: Dict[str, Any], projection: Optional[Dict[str, int]] = None):
+        """Cursor over matching transactions oldest first"""
+        query = _naive(query)
+        project_id = query.get("project_id")
+        txs = self._tx_by_project.get(project_id, []) if isinstance(project_id, str) else self._tx_order
+        return MemoryCursor(_project(tx, projection) for tx in list(txs) if matches(tx, query))
+
+    # ----------------- OPERATIONS (outbox) -----------------
+    def _track_open(self, operation: Dict[str, Any]):
+        if operation["state"] in ("pending", "signed"):
+            self._open_operations.add(operation["_id"])
+        else:
+            self._open_operations.discard(operation["_id"])
+
+    async def insert_operation(self, operation: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a write's intent; DuplicateKeyError if its idempotency_key was used before"""
+        key = operation.get("idempotency_key")
+        if key is not None and key in self._operations_by_key:
+            raise DuplicateKeyError(f"duplicate idempotency_key {key!r}", 11000)
+        now = _now()
+        operation.update({"_id": ObjectId(), "created_at": now, "updated_at": now})
+        self._operations[operation["_id"]] = _naive(_copy(operation))
+        if key is not None:
+            self._operations_by_key[key] = operation["_id"]
+        self._track_open(operation)
+        return operation
+
+    async def get_operation(self, idempotency_key: str) -> Optional[Dict[str, Any]]:
+        """Get an operation by its Idempotency-Key"""
+        operation_id = self._operations_by_key.get(idempotency_key)
+        return _copy(self._operations[operation_id]) if operation_id else None
+
+    async def update_operation(
+        self, operation_id: Any, fields: Dict[str, Any], expect: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Set fields on an operation still matching `expect`; the updated doc, or None if it moved on"""
+        operation = self._operations.get(operation_id)
+        if operation is None or not matches(operation, _naive(expect or {})):
+            return None
+        operation.update(_naive(_copy(fields)))
+        operation["updated_at"] = _now()
+        self._track_open(operation)
+        return _copy(operation)
+
+    async def record_signed_transaction(self, operation_id: Any, tx_hash: str, raw_tx: str) -> Optional[Dict[str, Any]]:
+        """Mark an operation signed, keeping every tx it signed (a nonce retry signs a replacement)"""
+        operation = self._operations.get(operation_id)
+        if operation is None:
+            return None
+        operation.update({"state": "signed", "tx_hash": tx_hash, "raw_tx": raw_tx, "updated_at": _now()})
+        operation.setdefault("signed", []).append({"tx_hash": tx_hash, "raw_tx": raw_tx})
+        self._track_open(operation)
+        return _copy(operation)
+
+    async def get_stale_operations(self, before: datetime, limit: int = 100) -> List[Dict[str, Any]]:
+        """Open (pending / signed) operations untouched since `before`, oldest first"""
+        before = _naive(before)
+        stale = [self._operations[i] for i in self._open_operations if self._operations[i]["updated_at"] < before]
+        stale.sort(key=lambda op: op["updated_at"])
+        return [_copy(op) for op in stale[:limit]]
+
+    # ----------------- USERS -----------------
+    async def get_user_by_wallet(self, wallet_address: str) -> Optional[Dict[str, Any]]:
+        """Get user by wallet address"""
+        user = self._users.get(wallet_address)
+        return _copy(user) if user else None
+
+    async def get_user_balance(self, wallet_address: str, project_id: str) -> int:
+        """Get user's balance for specific project (chain index first, then users.balances)"""
+        project = self._projects.get(project_id)
+        if project and project.get("token_id"):
+            holding = self._holders.get(f"{wallet_address}:{project['token_id']}")
+            if holding:
+                return holding["balance"]
+
+        user = self._users.get(wallet_address)
+        for balance in (user or {}).get("balances", []):
+            if balance.get("project_id") == project_id:
+                return balance.get("balance", 0)
+        return 0
+
+    # ----------------- CHAIN INDEX -----------------
+    async def get_sync_state(self, name: str) -> Optional[Dict[str, Any]]:
+        """Get an indexer checkpoint"""
+        state = self._sync_state.get(name)
+        return _copy(state) if state else None
+
+    async def set_sync_state(
+        self, name: str, block_number: int, block_hash: str, checkpoints: Optional[List[Dict[str, Any]]] = None
+    ):
+        """Record the last fully processed block of an indexer (and its recent checkpoint history)"""
+        state = self._sync_state.setdefault(name, {"_id": name})
+        state.update({"block_number": block_number, "block_hash": block_hash, "updated_at": _now()})
+        if checkpoints is not None:
+            state["checkpoints"] = _copy(checkpoints)
+
+    async def store_chain_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Store decoded events keyed by tx_hash:log_index; returns only the new ones"""
+        new = []
+        for event in events:
+            event["_id"] = f"{event['tx_hash']}:{event['log_index']}"
+            if event["_id"] in self._events:
+                continue
+            self._events[event["_id"]] = _naive(_copy(event))
+            for token_id in event.get("token_ids", []):
+                self._events_by_token[token_id].add(event["_id"])
+            new.append(event)
+        return new
+
+    async def get_chain_events_after(self, block_number: int) -> List[Dict[str, Any]]:
+        """Get indexed events above a block (used to unwind a reorg)"""
+        return [_copy(e) for e in self._events.values() if e["block_number"] > block_number]
+
+    async def delete_chain_events_after(self, block_number: int):
+        """Drop indexed events above a block"""
+        for event_id in [i for i, e in self._events.items() if e["block_number"] > block_number]:
+            event = self._events.pop(event_id)
+            for token_id in event.get("token_ids", []):
+                self._events_by_token[token_id].discard(event_id)
+
+    async def get_chain_events(self, token_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get indexed on-chain events for a token, newest first"""
+        events = [self._events[i] for i in self._events_by_token.get(token_id, ())]
+        events.sort(key=lambda e: (e["block_number"], e["log_index"]), reverse=True)
+        return [_copy(e) for e in events[:limit]]
+
+    async def apply_balance_deltas(
+        self,
+        holder_deltas: List[tuple],
+        project_deltas: List[tuple],
+        unwind: bool = False,
+    ):
+        """Apply (or unwind) per-event balance changes exactly once, guarded by per-target watermarks"""
+        now = _now()
+
+        def admits(target: Dict[str, Any], seq: int) -> bool:
+            applied = target.get("applied_seq", -1)
+            return applied >= seq if unwind else applied < seq
+
+        for seq, address, token_id, delta in holder_deltas:
+            key = f"{address}:{token_id}"
+            holding = self._holders.setdefault(
+                key, {"_id": key, "wallet_address": address, "token_id": token_id, "balance": 0, "applied_seq": -1}
+            )
+            self._holders_by_wallet[address].add(key)
+            if admits(holding, seq):
+                holding["balance"] += delta
+                holding["applied_seq"] = seq - 1 if unwind else seq
+                holding["updated_at"] = now
+
+        for seq, token_id, fields in project_deltas:
+            for project_id in self._projects_by_token.get(token_id, ()):
+                onchain = self._projects[project_id].setdefault("onchain", {})
+                if admits(onchain, seq):
+                    for field, delta in fields.items():
+                        onchain[field] = onchain.get(field, 0) + delta
+                    onchain["applied_seq"] = seq - 1 if unwind else seq
+                    onchain["last_updated"] = now
+
+    async def rewind_balance_watermarks(self, seq: int):
+        """Lower every watermark above seq to seq, so re-indexed events after it apply again"""
+        targets = list(self._holders.values()) + [p["onchain"] for p in self._projects.values() if "onchain" in p]
+        for target in targets:
+            if target.get("applied_seq", -1) > seq:
+                target["applied_seq"] = seq
+
+    async def get_holder_balances(self, wallet_address: str) -> List[Dict[str, Any]]:
+        """Get every indexed non-zero token balance of a wallet"""
+        holdings = (self._holders[key] for key in self._holders_by_wallet.get(wallet_address, ()))
+        return [
+            {"token_id": h["token_id"], "balance": h["balance"], "updated_at": h.get("updated_at")}
+            for h in holdings
+            if h["balance"] != 0
+        ]
+
+    # ----------------- PLOTS -----------------
+    @staticmethod
+    def _cell(plot: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        point = _point(plot.get("location"))
+        if point is None:
+            return None
+        return (math.floor(point[0] / GRID_DEGREES), math.floor(point[1] / GRID_DEGREES))
+
+    def _unindex_plot(self, plot: Dict[str, Any]):
+        for dimension, key in plot_keys(plot).items():
+            self._bucket_members[bucket_id(dimension, key)].discard(plot["ID"])
+        cell = self._cell(plot)
+        if cell is not None:
+            self._cells[cell].discard(plot["ID"])
+        self._by_project_id[repr(plot.get("project_id"))].discard(plot["ID"])
+
+    def _index_plot(self, plot: Dict[str, Any]):
+        for dimension, key in plot_keys(plot).items():
+            self._bucket_members[bucket_id(dimension, key)].add(plot["ID"])
+        cell = self._cell(plot)
+        if cell is not None:
+            self._cells[cell].add(plot["ID"])
+        self._by_project_id[repr(plot.get("project_id"))].add(plot["ID"])
+
+    async def upsert_plots(self, plots: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Upsert plot observations by ID and fold the changes into the rollups.
+
+        Reads and writes happen without an await in between, so concurrent
+        batches are serialized; version is kept to match the Mongo layer.
+        """
+        latest = {plot["ID"]: plot for plot in plots}  # last row wins within a batch
+        if not latest:
+            return {"upserted": 0, "modified": 0, "matched": 0}
+
+        now = _now()
+        upserted = matched = 0
+        deltas: Dict[str, Dict[str, Any]] = {}
+        for plot_id, plot in latest.items():
+            fields = _naive({k: v for k, v in plot.items() if k not in ("_id", "created_at", "version")})
+            old = self._plots.get(plot_id)
+            if old is None:
+                new = {"_id": ObjectId(), **fields, "version": 1, "created_at": now, "updated_at": now}
+                upserted += 1
+            else:
+                new = {**old, **fields, "version": old.get("version", 0) + 1, "updated_at": now}
+                matched += 1
+                self._unindex_plot(old)
+            merge_deltas(deltas, rollup_deltas(old, new))
+            self._plots[plot_id] = new
+            self._index_plot(new)
+
+        await self.apply_plot_rollup_deltas(deltas)
+        await self.bump_plot_data_version()
+        return {"upserted": upserted, "modified": matched, "matched": matched}
+
+    def _plot_candidates(self, query: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+        """Plots possibly matching a query, narrowed by the ID/project_id/type/year/geo indexes"""
+        ids: Optional[Set[str]] = None
+
+        def narrow(found: Iterable[str]):
+            nonlocal ids
+            ids = set(found) if ids is None else ids & set(found)
+
+        plot_id = query.get("ID")
+        if isinstance(plot_id, str):
+            narrow([plot_id])
+        elif isinstance(plot_id, dict) and "$in" in plot_id:
+            narrow(plot_id["$in"])
+        if "project_id" in query and not isinstance(query["project_id"], dict):
+            narrow(self._by_project_id.get(repr(query["project_id"]), ()))
+        if isinstance(query.get("Project_Type"), str):
+            narrow(self._bucket_members.get(bucket_id("type", {"type": query["Project_Type"]}), ()))
+        if isinstance(query.get("Monitoring_Year"), int):
+            narrow(self._bucket_members.get(bucket_id("year", {"year": query["Monitoring_Year"]}), ()))
+        geo = query.get("location", {}).get("$geoWithin") if isinstance(query.get("location"), dict) else None
+        if geo:
+            cells = self._geo_cells(geo)
+            if cells is not None:
+                narrow(i for cell in cells for i in self._cells.get(cell, ()))
+
+        if ids is None:
+            return list(self._plots.values())
+        found = [self._plots[i] for i in ids if i in self._plots]
+        found.sort(key=lambda p: p["_id"])
+        return found
+
+    def _geo_cells(self, geo: Dict[str, Any]) -> Optional[List[Tuple[int, int]]]:
+        """Grid cells covering a $geoWithin shape, or None when a full scan is cheaper"""
+        if "$centerSphere" in geo:
+            (lng, lat), radians = geo["$centerSphere"]
+            dlat = math.degrees(radians)
+            coslat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+            dlng = 180.0 if dlat >= 90 else min(180.0, dlat / max(coslat, 1e-6))
+            bounds = (lng - dlng, lat - dlat, lng + dlng, lat + dlat)
+        else:
+            geometry = geo["$geometry"]
+            polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+            points = [p for polygon in polygons for p in polygon[0]]
+            bounds = (min(p[0] for p in points), min(p[1] for p in points),
+                      max(p[0] for p in points), max(p[1] for p in points))
+
+        min_x, min_y = (math.floor(b / GRID_DEGREES) for b in bounds[:2])
+        max_x, max_y = (math.floor(b / GRID_DEGREES) for b in bounds[2:])
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > max(len(self._cells), 1):
+            return None
+        return [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+    def _find_plots(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        query = _naive(query)
+        return [p for p in self._plot_candidates(query) if matches(p, query)]
+
+    async def get_plots_near(
+        self,
+        near: Dict[str, Any],
+        radius_m: float,
+        projection: Optional[Dict[str, int]],
+        limit: int,
+        after: Optional[List[Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Plots within radius_m of a point ordered by (distance, _id), limit+1 for paging"""
+        lng, lat = near["coordinates"]
+        geo = {"$centerSphere": [[lng, lat], radius_m / EARTH_RADIUS_M]}
+        rows = []
+        for plot in self._plot_candidates({"location": {"$geoWithin": geo}}):
+            point = _point(plot.get("location"))
+            if point is None:
+                continue
+            distance = _haversine_m(lng, lat, *point)
+            if distance > radius_m:
+                continue
+            if after and (distance, plot["_id"]) <= (after[0], after[1]):
+                continue
+            rows.append((distance, plot))
+        rows.sort(key=lambda row: (row[0], row[1]["_id"]))
+        return [{**_project(plot, projection), "distance": distance} for distance, plot in rows[:limit + 1]]
+
+    async def get_plots_within(
+        self,
+        geo_filter: Dict[str, Any],
+        projection: Optional[Dict[str, int]],
+        limit: int,
+        after: Optional[Any] = None,
+    ) -> List[Dict[str, Any]]:
+        """Plots matching a $geoWithin filter in _id order, limit+1 for paging"""
+        plots = (p for p in self._find_plots(geo_filter) if after is None or p["_id"] > after)
+        return [_project(p, projection) for _, p in zip(range(limit + 1), plots)]
+
+    async def get_plot_stats(self, geo_filter: Dict[str, Any]) -> Dict[str, Any]:
+        """NDVI and biomass aggregates of the plots inside an area, overall and per type"""
+        group = {
+            "count": {"$sum": 1},
+            "avgNDVI": {"$avg": "$NDVI"},
+            "minNDVI": {"$min": "$NDVI"},
+            "maxNDVI": {"$max": "$NDVI"},
+            "avgAbove": {"$avg": "$Biomass_above_kg"},
+            "avgBelow": {"$avg": "$Biomass_below_kg"},
+            "totalBiomass": {"$sum": {"$add": ["$Biomass_above_kg", "$Biomass_below_kg"]}},
+        }
+        plots = self._find_plots(geo_filter)
+        overall = aggregate(plots, [{"$group": {"_id": None, **group}}])
+        overall = overall[0] if overall else {"count": 0}
+        overall.pop("_id", None)
+        by_type = aggregate(plots, [{"$group": {"_id": "$Project_Type", **group}}, {"$sort": {"count": -1}}])
+        return {**overall, "by_type": by_type}
+
+    async def aggregate_plots(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run an analytics pipeline; a leading $match uses the plot indexes"""
+        if pipeline and "$match" in pipeline[0]:
+            return aggregate(self._find_plots(pipeline[0]["$match"]), pipeline[1:])
+        return aggregate(self._plots.values(), pipeline)
+
+    async def count_plots(self, query: Dict[str, Any]) -> int:
+        return len(self._find_plots(query)) if query else len(self._plots)
+
+    def iter_plots(self, query: Dict[str, Any], projection: Optional[Dict[str, int]] = None):
+        """Cursor over matching plots in _id order"""
+        return MemoryCursor(_project(p, projection) for p in self._find_plots(query))
+
+    async def get_plot_data_version(self) -> int:
+        """Counter bumped on every plot write (response caches key off it)"""
+        return self._plot_version
+
+    async def bump_plot_data_version(self):
+        self._plot_version += 1
+
+    async def apply_plot_rollup_deltas(self, deltas: Dict[str, Dict[str, Any]]):
+        """Add bucket deltas, widen min/max and recompute extremes that were removed"""
+        now = _now()
+        for bid, delta in deltas.items():
+            bucket = self._rollups.get(bid) or {
+                "_id": bid, "dimension": delta["dimension"], "key": delta["key"], "count": 0, "metrics": {},
+            }
+            bucket["count"] += delta["count"]
+            bucket["updated_at"] = now
+            if bucket["count"] <= 0:
+                self._rollups.pop(bid, None)
+                continue
+            for metric in set(delta["sums"]) | set(delta["counts"]):
+                stats = bucket["metrics"].setdefault(metric, {"sum": 0.0, "count": 0})
+                stats["sum"] += delta["sums"].get(metric, 0.0)
+                stats["count"] += delta["counts"].get(metric, 0)
+            for metric, value in delta["mins"].items():
+                stats = bucket["metrics"][metric]
+                stats["min"] = min(value, stats.get("min", value))
+            for metric, value in delta["maxs"].items():
+                stats = bucket["metrics"][metric]
+                stats["max"] = max(value, stats.get("max", value))
+            self._rollups[bid] = bucket
+            if delta["stale"]:
+                self._refresh_rollup_extremes(bucket, delta["stale"])
+
+    def _refresh_rollup_extremes(self, bucket: Dict[str, Any], metrics: Set[str]):
+        """Recompute min/max of a bucket's stale metrics from its member plots"""
+        values: Dict[str, List[float]] = defaultdict(list)
+        for plot_id in self._bucket_members.get(bucket["_id"], ()):
+            for metric, value in plot_values(self._plots[plot_id]).items():
+                if metric in metrics:
+                    values[metric].append(value)
+        for metric in metrics:
+            stats = bucket["metrics"].get(metric)
+            if stats is None:
+                continue
+            if values[metric]:
+                stats["min"], stats["max"] = min(values[metric]), max(values[metric])
+            else:
+                stats.pop("min", None)
+                stats.pop("max", None)
+
+    async def plot_rollups_built(self) -> bool:
+        """Always True - rollups are maintained from the first plot write"""
+        return True
+
+    async def get_plot_rollups(self, dimension: str) -> List[Dict[str, Any]]:
+        """Get every rollup bucket of a dimension (type, year, month, type_source)"""
+        return [_copy(b) for b in self._rollups.values() if b["dimension"] == dimension]
+
+    async def rebuild_plot_rollups(self) -> int:
+        """Recompute all rollups in one pass over plots; returns the bucket count"""
+        buckets: Dict[str, Dict[str, Any]] = {}
+        for plot in self._plots.values():
+            merge_deltas(buckets, rollup_deltas(None, plot))
+        now = _now()
+        self._rollups = {bid: bucket_document(bid, bucket, now) for bid, bucket in buckets.items()}
+        return len(self._rollups)
@@ -0,0 +1,190 @@
+"""
+Metrics - Prometheus instruments for requests, Mongo, RPC, tx confirmation and outbox recovery
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from pymongo import monitoring
+from starlette.routing import Match
+
+# Sub-millisecond Mongo commands and multi-second RPC writes share one histogram shape
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served")
+
+MONGO_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "Mongo command latency", ["collection", "command", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+MONGO_POOL_IN_USE = Gauge("mongo_pool_connections_in_use", "Checked-out Mongo connections", ["address"])
+MONGO_POOL_OPEN = Gauge("mongo_pool_connections_open", "Open Mongo connections", ["address"])
+MONGO_POOL_MAX = Gauge("mongo_pool_max_size", "Mongo maxPoolSize", ["address"])
+MONGO_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total", "Failed Mongo connection checkouts", ["address", "reason"]
+)
+
+RPC_LATENCY = Histogram(
+    "rpc_call_duration_seconds", "Chain RPC latency per contract function", ["kind", "function", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+RPC_IN_FLIGHT = Gauge("rpc_requests_in_flight", "Chain RPC requests awaiting a response")
+RPC_POOL_SIZE = Gauge("rpc_pool_size", "RPC_POOL_SIZE connection limit")
+
+TX_CONFIRMATION = Histogram(
+    "tx_confirmation_seconds", "Time from submission to settled receipt", ["type", "status"],
+    buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 1800),
+)
+OUTBOX_RECOVERIES = Counter(
+    "outbox_recoveries_total", "Interrupted credit operations resolved by the recovery worker", ["kind", "outcome"]
+)
+
+
+def render():
+    """Current metrics in the Prometheus text exposition format"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# -----------------------------
+# HTTP
+# -----------------------------
+class MetricsMiddleware:
+    """ASGI middleware timing every request under its route template (not the raw path)"""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[Dict[Any, list]] = None
+
+    def _route(self, scope) -> str:
+        """Template of the matched route; `endpoint` narrows the search to its own routes"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._routes is None:
+            self._routes = {}
+            for route in scope["app"].routes:
+                self._routes.setdefault(getattr(route, "endpoint", None), []).append(route)
+        candidates = self._routes.get(endpoint, [])
+        if len(candidates) == 1:
+            return candidates[0].path
+        for route in candidates:
+            if route.matches(scope)[0] == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            REQUEST_LATENCY.labels(scope["method"], self._route(scope), str(status)).observe(
+                time.perf_counter() - start
+            )
+
+
+# -----------------------------
+# Mongo
+# -----------------------------
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command by collection and command name.
+
+    Only the started event carries the command document, so its collection
+    is parked by request id until the matching succeeded/failed event.
+    """
+
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else "-"
+
+    def _observe(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "-")
+        MONGO_LATENCY.labels(collection, event.command_name, outcome).observe(event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._observe(event, "ok")
+
+    def failed(self, event):
+        self._observe(event, "error")
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Open / checked-out connections against maxPoolSize per server"""
+
+    def pool_created(self, event):
+        MONGO_POOL_MAX.labels(str(event.address)).set(event.options.get("maxPoolSize", 100))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_OPEN.labels(str(event.address)).inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_OPEN.labels(str(event.address)).dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_CHECKOUT_FAILURES.labels(str(event.address), str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_IN_USE.labels(str(event.address)).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_IN_USE.labels(str(event.address)).dec()
+
+
+# Listeners passed to the Motor client
+mongo_listeners = [MongoCommandMetrics(), MongoPoolMetrics()]
+
+
+# -----------------------------
+# RPC
+# -----------------------------
+@contextmanager
+def rpc_timer(kind: str, function: str):
+    """Time one RPC round trip: kind is call (eth_call), transact or eth (raw JSON-RPC)"""
+    RPC_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        RPC_IN_FLIGHT.dec()
+        RPC_LATENCY.labels(kind, function, outcome).observe(time.perf_counter() - start)
@@ -0,0 +1,234 @@
+"""
+Operation Outbox - idempotent credit writes and recovery of interrupted ones
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from app.blockchain import NONCE_ERRORS, bluecarbon_client
+from app.confirmer import retirement_amounts, tx_confirmer
+from app.database import db_client
+from app.metrics import OUTBOX_RECOVERIES
+
+logger = logging.getLogger(__name__)
+
+# pending: intent recorded, nothing signed yet - never reached the chain
+# signed:  tx hash and raw tx recorded, broadcast may or may not have happened
+# completed: tx logged for the confirmer, response stored for replays
+# failed: nothing landed on-chain, so the same key may run again
+OPEN_STATES = ("pending", "signed")
+
+
+def fingerprint(kind: str, request: Dict[str, Any]) -> str:
+    """Hash of a write's payload, so a reused key with a different body is caught"""
+    body = json.dumps({"kind": kind, "request": request}, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class OperationOutbox:
+    """Records every credit write before it is broadcast and finishes interrupted ones.
+
+    The write path is begin() → chain call with on_signed() → record_transaction()
+    → complete(). A crash anywhere leaves an open operation, which the
+    recovery loop picks up once it has been idle for OUTBOX_RECOVER_AFTER
+    seconds: unsigned intents are failed (releasing any credits a retirement
+    reserved), signed ones are rebroadcast if the node lost them and handed
+    to the confirmer, which applies balances once.
+    """
+
+    def __init__(self, db, chain, confirmer, poll_interval: Optional[float] = None,
+                 recover_after: Optional[float] = None):
+        self.db = db
+        self.chain = chain
+        self.confirmer = confirmer
+        self.poll_interval = poll_interval or float(os.getenv("OUTBOX_POLL_INTERVAL", "30"))
+        self.recover_after = recover_after or float(os.getenv("OUTBOX_RECOVER_AFTER", "300"))
+        self._task: Optional[asyncio.Task] = None
+
+    # --------- WRITE PATH --------- #
+    async def begin(
+        self, kind: str, request: Dict[str, Any], idempotency_key: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Record a write's intent; returns (operation, replay).
+
+        replay is True when the key belongs to an earlier operation that is
+        completed or still open. A failed one never reached the chain, so it
+        is reset and run again. ValueError if the key was used for another body.
+        """
+        digest = fingerprint(kind, request)
+        operation = {"kind": kind, "request": request, "fingerprint": digest, "state": "pending", "attempts": 1}
+        if idempotency_key:
+            operation["idempotency_key"] = idempotency_key
+        try:
+            return await self.db.insert_operation(operation), False
+        except DuplicateKeyError:
+            if not idempotency_key:
+                raise
+            existing = await self.db.get_operation(idempotency_key)
+
+        if existing["fingerprint"] != digest:
+            raise ValueError("Idempotency-Key was already used with a different request")
+        if existing["state"] == "failed":
+            retried = await self.db.update_operation(
+                existing["_id"],
+                {"state": "pending", "tx_hash": None, "raw_tx": None, "signed": [], "error": None,
+                 "attempts": existing.get("attempts", 1) + 1},
+                expect={"state": "failed", "updated_at": existing["updated_at"]},
+            )
+            if retried:
+                return retried, False
+            existing = await self.db.get_operation(idempotency_key)
+        return existing, True
+
+    def on_signed(self, operation: Dict[str, Any]):
+        """Chain hook persisting each signed tx (hash and raw tx) before it is broadcast"""
+        async def record(tx_hash: str, raw_tx: str):
+            updated = await self.db.record_signed_transaction(operation["_id"], tx_hash, raw_tx)
+            operation.update(updated or {})
+        return record
+
+    async def abandon(self, operation: Dict[str, Any], error: Exception):
+        """Fail an operation whose chain call raised before signing; signed ones are left to recovery"""
+        failed = await self.db.update_operation(
+            operation["_id"], {"state": "failed", "error": str(error)}, expect={"state": "pending"}
+        )
+        if failed:
+            await self._release(failed)
+
+    async def record_transaction(self, operation: Dict[str, Any]):
+        """Log the operation's tx as pending (once) so the confirmer settles it"""
+        if await self.db.get_transaction(operation["tx_hash"]):
+            return
+        details = {**operation["request"], "operation_id": str(operation["_id"])}
+        if operation["kind"] == "credit_retirement_batch":
+            # One tx touches every project in the batch, so all of them list it in their history
+            details["project_id"] = list(retirement_amounts(details))
+        try:
+            await self.db.log_transaction(operation["kind"], operation["tx_hash"], details, status="pending")
+        except DuplicateKeyError:
+            pass  # logged concurrently by recovery
+
+    async def complete(self, operation: Dict[str, Any], response: Dict[str, Any], status_code: int = 200):
+        """Store the response returned to the client; later retries replay it"""
+        await self.db.update_operation(
+            operation["_id"], {"state": "completed", "response": response, "status_code": status_code}
+        )
+
+    # --------- RECOVERY --------- #
+    def start(self):
+        """Start the recovery loop on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the recovery loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.warning("⚠️  Outbox recovery failed: %s", e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def poll_once(self) -> int:
+        """Resolve every stale open operation once; returns how many were completed or failed"""
+        before = datetime.now(timezone.utc) - timedelta(seconds=self.recover_after)
+        resolved = 0
+        for operation in await self.db.get_stale_operations(before):
+            outcome = await self.recover(operation)
+            OUTBOX_RECOVERIES.labels(operation["kind"], outcome).inc()
+            if outcome in ("completed", "failed"):
+                resolved += 1
+        return resolved
+
+    async def recover(self, operation: Dict[str, Any]) -> str:
+        """Complete or fail one interrupted operation; returns the outcome"""
+        # Touching updated_at claims it - a second worker's expect no longer matches
+        claimed = await self.db.update_operation(
+            operation["_id"],
+            {"attempts": operation.get("attempts", 1) + 1},
+            expect={"state": operation["state"], "updated_at": operation["updated_at"]},
+        )
+        if claimed is None:
+            return "skipped"
+
+        if claimed["state"] == "pending":
+            await self._fail(claimed, "interrupted before the transaction was signed")
+            return "failed"
+
+        # A nonce retry signs a replacement, and either tx may be the one that was mined
+        signed = claimed.get("signed") or [{"tx_hash": claimed["tx_hash"], "raw_tx": claimed["raw_tx"]}]
+        receipt = None
+        for tx in reversed(signed):
+            receipt = await self.chain.get_transaction_receipt(tx["tx_hash"])
+            if receipt is not None:
+                claimed.update(tx_hash=tx["tx_hash"], raw_tx=tx["raw_tx"])
+                break
+
+        tx_hash = claimed["tx_hash"]
+        if receipt is None:
+            try:
+                await self.chain.send_raw_transaction(claimed["raw_tx"])
+            except ValueError as e:
+                message = str(e).lower()
+                if "already known" not in message:
+                    receipt = await self.chain.get_transaction_receipt(tx_hash)
+                    if receipt is None and any(err in message for err in NONCE_ERRORS):
+                        # The nonce went to another tx, so this one can never be mined
+                        await self._fail(claimed, f"dropped: {e}")
+                        return "failed"
+                    if receipt is None:
+                        logger.warning("⚠️  Rebroadcast of %s failed, will retry: %s", tx_hash, e)
+                        return "retry"
+
+        await self.record_transaction(claimed)
+        if receipt is not None:
+            await self.confirmer.settle(tx_hash, receipt)
+        await self.complete(
+            claimed,
+            {
+                "success": True,
+                "tx": receipt or {"tx_hash": tx_hash, "status": "pending", "blockNumber": None},
+                "status_url": f"/tx/{tx_hash}",
+                "message": "Operation recovered after an interruption",
+            },
+        )
+        logger.info(
+            "♻️  Recovered %s operation %s → Tx: %s", claimed["kind"], claimed["_id"], tx_hash,
+            extra={"operation_id": str(claimed["_id"]), "tx_hash": tx_hash},
+        )
+        return "completed"
+
+    async def _fail(self, operation: Dict[str, Any], error: str):
+        await self.db.update_operation(operation["_id"], {"state": "failed", "error": error})
+        await self._release(operation)
+        logger.warning(
+            "⚠️  Failed %s operation %s: %s", operation["kind"], operation["_id"], error,
+            extra={"operation_id": str(operation["_id"])},
+        )
+
+    async def _release(self, operation: Dict[str, Any]):
+        """Hand back the credits a failed retirement reserved (no-op if it never reserved any)"""
+        if operation["kind"] in ("credit_retirement", "credit_retirement_batch"):
+            await self.db.settle_reservations(
+                retirement_amounts(operation["request"]), str(operation["_id"]), retired=False
+            )
+
+
+# Global outbox
+operation_outbox = OperationOutbox(db_client, bluecarbon_client, tx_confirmer)
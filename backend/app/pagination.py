@@ -0,0 +1,44 @@
+"""
+Cursor Pagination - opaque keyset cursors for list endpoints
+"""
+
+import base64
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bson import json_util
+
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque URL-safe token for a keyset position (datetimes and ObjectIds round-trip)"""
+    raw = json_util.dumps(list(values)).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> List[Any]:
+    """Keyset values from a token; ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json_util.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def paginate(
+    docs: List[Dict[str, Any]], limit: int, key: Callable[[Dict[str, Any]], Tuple]
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Split a limit+1 fetch into the page and the cursor of the next one"""
+    if len(docs) <= limit:
+        return docs, None
+    page = docs[:limit]
+    return page, encode_cursor(*key(page[-1]))
+
+
+def parse_fields(fields: Optional[str], always: Tuple[str, ...] = ()) -> Optional[Dict[str, int]]:
+    """Comma-separated field list → Mongo projection (None = whole document)"""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    return {name: 1 for name in names + list(always)}
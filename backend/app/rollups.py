@@ -0,0 +1,213 @@
+"""
+Plot Rollups - pre-aggregated analytics buckets maintained on plot upserts
+"""
+
+import asyncio
+import json
+import math
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+# Numeric plot fields summarized in every bucket. Biomass_total_kg is derived
+# (above + below) so the biomass trend total needs no second pass.
+METRICS = [
+    "NDVI",
+    "Biomass_above_kg",
+    "Biomass_below_kg",
+    "Biomass_total_kg",
+    "CO2_Flux_mg_m2_day",
+    "CH4_Flux_mg_m2_day",
+]
+
+# Plot fields a rollup depends on (projection for rebuilds and old-doc lookups)
+PLOT_FIELDS = ["Project_Type", "Data_Source", "Monitoring_Year", "Timestamp",
+               "NDVI", "Biomass_above_kg", "Biomass_below_kg",
+               "CO2_Flux_mg_m2_day", "CH4_Flux_mg_m2_day"]
+
+META_ID = "_meta"
+
+
+def _number(value) -> Optional[float]:
+    """Finite numeric value or None (mirrors $avg skipping non-numbers)"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def plot_values(plot: Dict[str, Any]) -> Dict[str, float]:
+    """Metric values a plot contributes; missing/NaN fields are left out"""
+    values = {m: _number(plot.get(m)) for m in METRICS if m != "Biomass_total_kg"}
+    above, below = values["Biomass_above_kg"], values["Biomass_below_kg"]
+    if above is not None and below is not None:
+        values["Biomass_total_kg"] = above + below
+    return {m: v for m, v in values.items() if v is not None}
+
+
+def plot_keys(plot: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Bucket key of a plot for each rollup dimension"""
+    ts = plot.get("Timestamp")
+    ts = ts if isinstance(ts, datetime) else None
+    return {
+        "type": {"type": plot.get("Project_Type")},
+        "year": {"year": plot.get("Monitoring_Year")},
+        "month": {"year": ts.year if ts else None, "month": ts.month if ts else None},
+        "type_source": {"type": plot.get("Project_Type"), "source": plot.get("Data_Source")},
+    }
+
+
+def bucket_id(dimension: str, key: Dict[str, Any]) -> str:
+    return f"{dimension}:{json.dumps(list(key.values()), default=str)}"
+
+
+def bucket_filter(dimension: str, key: Dict[str, Any]) -> Dict[str, Any]:
+    """Plot query selecting exactly the plots of one bucket"""
+    if dimension == "type":
+        return {"Project_Type": key["type"]}
+    if dimension == "year":
+        return {"Monitoring_Year": key["year"]}
+    if dimension == "type_source":
+        return {"Project_Type": key["type"], "Data_Source": key["source"]}
+    if key["year"] is None:
+        return {"Timestamp": None}
+    start = datetime(key["year"], key["month"], 1)
+    end = datetime(key["year"] + key["month"] // 12, key["month"] % 12 + 1, 1)
+    return {"Timestamp": {"$gte": start, "$lt": end}}
+
+
+def _empty_bucket(dimension: str, key: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "dimension": dimension,
+        "key": key,
+        "count": 0,
+        "sums": defaultdict(float),
+        "counts": defaultdict(int),
+        "mins": {},
+        "maxs": {},
+        "stale": set(),
+    }
+
+
+def rollup_deltas(old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-bucket changes caused by replacing plot `old` with `new`.
+
+    Sums and counts are exact deltas. Min/max can only be widened
+    incrementally, so a bucket that loses a value is marked stale for those
+    metrics and its extremes are recomputed from the bucket's plots.
+    """
+    deltas: Dict[str, Dict[str, Any]] = {}
+    if old is not None and new is not None:
+        if plot_keys(old) == plot_keys(new) and plot_values(old) == plot_values(new):
+            return deltas
+
+    for plot, sign in ((old, -1), (new, 1)):
+        if plot is None:
+            continue
+        values = plot_values(plot)
+        for dimension, key in plot_keys(plot).items():
+            bid = bucket_id(dimension, key)
+            bucket = deltas.setdefault(bid, _empty_bucket(dimension, key))
+            bucket["count"] += sign
+            for metric, value in values.items():
+                bucket["sums"][metric] += sign * value
+                bucket["counts"][metric] += sign
+                if sign == 1:
+                    bucket["mins"][metric] = min(value, bucket["mins"].get(metric, value))
+                    bucket["maxs"][metric] = max(value, bucket["maxs"].get(metric, value))
+                else:
+                    bucket["stale"].add(metric)
+    return deltas
+
+
+def merge_deltas(target: Dict[str, Dict[str, Any]], deltas: Dict[str, Dict[str, Any]]):
+    """Fold one plot's bucket deltas into a batch"""
+    for bid, delta in deltas.items():
+        bucket = target.setdefault(bid, _empty_bucket(delta["dimension"], delta["key"]))
+        bucket["count"] += delta["count"]
+        for metric, value in delta["sums"].items():
+            bucket["sums"][metric] += value
+        for metric, value in delta["counts"].items():
+            bucket["counts"][metric] += value
+        for metric, value in delta["mins"].items():
+            bucket["mins"][metric] = min(value, bucket["mins"].get(metric, value))
+        for metric, value in delta["maxs"].items():
+            bucket["maxs"][metric] = max(value, bucket["maxs"].get(metric, value))
+        bucket["stale"] |= delta["stale"]
+
+
+def delta_update(delta: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """Mongo update applying one bucket delta"""
+    inc = {"count": delta["count"]}
+    for metric, value in delta["sums"].items():
+        inc[f"metrics.{metric}.sum"] = value
+    for metric, value in delta["counts"].items():
+        inc[f"metrics.{metric}.count"] = value
+
+    update = {
+        "$inc": inc,
+        "$set": {"dimension": delta["dimension"], "key": delta["key"], "updated_at": now},
+    }
+    if delta["mins"]:
+        update["$min"] = {f"metrics.{m}.min": v for m, v in delta["mins"].items()}
+    if delta["maxs"]:
+        update["$max"] = {f"metrics.{m}.max": v for m, v in delta["maxs"].items()}
+    return update
+
+
+def bucket_document(bid: str, delta: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """Full rollup document for a bucket accumulated from scratch (rebuilds)"""
+    metrics = {}
+    for metric, count in delta["counts"].items():
+        metrics[metric] = {
+            "sum": delta["sums"][metric],
+            "count": count,
+            "min": delta["mins"][metric],
+            "max": delta["maxs"][metric],
+        }
+    return {
+        "_id": bid,
+        "dimension": delta["dimension"],
+        "key": delta["key"],
+        "count": delta["count"],
+        "metrics": metrics,
+        "updated_at": now,
+    }
+
+
+def average(bucket: Dict[str, Any], metric: str) -> Optional[float]:
+    """Mean of a metric in a rollup document (None when no plot had a value)"""
+    stats = bucket.get("metrics", {}).get(metric)
+    if not stats or stats.get("count", 0) <= 0:
+        return None
+    return stats["sum"] / stats["count"]
+
+
+def total(bucket: Dict[str, Any], metric: str) -> float:
+    stats = bucket.get("metrics", {}).get(metric)
+    return stats["sum"] if stats and stats.get("count", 0) > 0 else 0
+
+
+def mongo_sort_key(value) -> Tuple[int, Any]:
+    """Order values the way Mongo does for mixed types: null < numbers < strings"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, str(value))
+
+
+if __name__ == "__main__":
+    # Backfill: python -m app.rollups rebuild
+    from app.database import db_client
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python -m app.rollups rebuild")
+        sys.exit(2)
+
+    async def main():
+        await db_client.connect()
+        buckets = await db_client.rebuild_plot_rollups()
+        print(f"📊 Rebuilt {buckets} plot rollup buckets")
+
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+Benchmark - Mongo aggregation pipelines vs the Arrow snapshot engine
+
+Run from backend/ against the configured MONGO_URI:
+
+    python -m app.columnar                      # build the Parquet snapshot first
+    python -m benchmarks.analytics_engines [--runs 20] [--json out.json]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app import analytics as mongo
+from app.columnar import arrow_analytics
+from app.database import db_client
+
+# Live Mongo pipelines (rollups bypassed) vs the equivalent Arrow queries
+CASES = {
+    "plots-overview": (
+        lambda: asyncio.gather(db_client.count_plots({}), mongo.analytics_service._aggregate(mongo.PLOTS_BY_TYPE)),
+        arrow_analytics.plots_overview,
+    ),
+    "ndvi-by-project": (lambda: mongo.analytics_service._aggregate(mongo.NDVI_BY_PROJECT), arrow_analytics.ndvi_by_project),
+    "ndvi-by-project-source": (
+        lambda: mongo.analytics_service._aggregate(mongo.NDVI_BY_PROJECT_SOURCE),
+        arrow_analytics.ndvi_by_project_source,
+    ),
+    "biomass-trend": (lambda: mongo.analytics_service._aggregate(mongo.BIOMASS_TREND), arrow_analytics.biomass_trend),
+    "fluxes": (
+        lambda: asyncio.gather(
+            mongo.analytics_service._aggregate(mongo.CO2_FLUX), mongo.analytics_service._aggregate(mongo.CH4_FLUX)
+        ),
+        arrow_analytics.fluxes,
+    ),
+    "ndvi-monthly": (lambda: mongo.analytics_service._aggregate(mongo.NDVI_MONTHLY), arrow_analytics.ndvi_monthly),
+    "summary": (lambda: mongo.analytics_service.summary_facet({}), arrow_analytics.summary),
+}
+
+
+async def measure(query, runs: int) -> dict:
+    await query()  # warm-up (connection pool, dataset handle, page cache)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await query()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+    }
+
+
+async def main(runs: int, out: str = None):
+    await db_client.connect()
+    if not arrow_analytics.available():
+        raise SystemExit("No Parquet snapshot - run `python -m app.columnar` first")
+
+    plots = arrow_analytics.metadata()["rows"]
+    print(f"📊 {plots} plots, {runs} runs per case\n")
+    print(f"{'endpoint':<24}{'mongo p50':>11}{'arrow p50':>11}{'mongo p95':>11}{'arrow p95':>11}{'speedup':>9}")
+
+    results = {}
+    for name, (mongo_query, arrow_query) in CASES.items():
+        m = await measure(mongo_query, runs)
+        a = await measure(arrow_query, runs)
+        speedup = round(m["p50_ms"] / a["p50_ms"], 1) if a["p50_ms"] else float("inf")
+        results[name] = {"mongo": m, "arrow": a, "speedup_p50": speedup}
+        print(f"{name:<24}{m['p50_ms']:>11}{a['p50_ms']:>11}{m['p95_ms']:>11}{a['p95_ms']:>11}{speedup:>8}x")
+
+    if out:
+        with open(out, "w") as f:
+            json.dump({"plots": plots, "runs": runs, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--json", dest="out")
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.out))
@@ -0,0 +1,457 @@
+"""
+Benchmark - API latency and throughput under read / analytics / issue / retire mixes
+
+Boots the FastAPI app in-process (real lifespan, httpx ASGI transport) against
+a scratch Mongo database seeded from plots.csv scaled up synthetically, and
+either the in-process stub chain or a live node (e.g. anvil with BlueCarbon
+and ContractRegistry deployed; RPC_URL, REGISTRY_ADDRESS, CHAIN_ID and the
+*_PRIVATE_KEY variables as for the app).
+
+Run from backend/:
+
+    python -m benchmarks.load [--mix balanced] [--duration 10] [--concurrency 16]
+                              [--plots 20000] [--projects 50] [--chain stub|rpc]
+                              [--mongo uri|memory] [--json out.json] [--baseline old.json]
+
+--mongo uri uses MONGO_URI with MONGO_DB (default bluecarbon_bench), which is
+emptied and reseeded; --mongo memory runs on the in-process DB_BACKEND=memory
+store (app.memory_db) instead, so results exclude Mongo. Per-request call
+counts come from a sequential calibration pass per endpoint with the
+background confirmer paused.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import inspect
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from benchmarks.stub_chain import RpcCounter, StubChain
+
+PLOTS_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "plots.csv")
+
+MINTER_HEADERS = {"Authorization": "Bearer minter-token-456"}
+
+# Share of requests per traffic category
+MIXES = {
+    "read-heavy": {"read": 80, "analytics": 15, "issue": 3, "retire": 2},
+    "balanced": {"read": 55, "analytics": 25, "issue": 10, "retire": 10},
+    "write-heavy": {"read": 30, "analytics": 10, "issue": 30, "retire": 30},
+}
+
+# Credits issued to each seeded project so retire traffic never runs dry
+SEED_CREDITS = 10_000_000
+
+# Numeric CSV columns jittered when scaling plots.csv up
+JITTER_FIELDS = [
+    "NDVI", "Canopy_Cover_percent", "Soil_Organic_Carbon_g_per_kg", "CO2_Flux_mg_m2_day",
+    "CH4_Flux_mg_m2_day", "Tree_Height_m", "DBH_cm", "Biomass_above_kg", "Biomass_below_kg",
+]
+
+
+class MongoCommandCounter(monitoring.CommandListener):
+    """Counts Mongo commands by name (real servers only)"""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+
+    def started(self, event):
+        self.calls[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def count_db_calls(db, calls: Counter):
+    """Wrap every public coroutine method of the database client with a counter"""
+    for name in dir(type(db)):
+        method = getattr(db, name)
+        if name.startswith("_") or not inspect.iscoroutinefunction(method):
+            continue
+
+        def counted(method=method, name=name):
+            async def call(*args, **kwargs):
+                calls[name] += 1
+                return await method(*args, **kwargs)
+            return call
+
+        setattr(db, name, counted())
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+def install_backends(args) -> Dict[str, Counter]:
+    """Point the app at the benchmark Mongo and chain before it is imported"""
+    os.environ.setdefault("MONGO_DB", "bluecarbon_bench")
+    os.environ.setdefault("TX_POLL_INTERVAL", "0.5")
+    os.environ["INDEXER_ENABLED"] = "false"
+    os.environ.setdefault("LOG_LEVEL", "DEBUG" if args.verbose else "WARNING")
+    if "bench" not in os.environ["MONGO_DB"]:
+        raise SystemExit(f"Refusing to reseed MONGO_DB={os.environ['MONGO_DB']} - use a *bench* database")
+
+    mongo = MongoCommandCounter()
+    if args.mongo == "memory":
+        os.environ["DB_BACKEND"] = "memory"
+    else:
+        monitoring.register(mongo)
+
+    if args.chain == "stub":
+        os.environ.setdefault("RPC_URL", "http://127.0.0.1:8545")
+        os.environ.setdefault("REGISTRY_ADDRESS", "0x" + "1e" * 20)
+        os.environ.setdefault("CHAIN_ID", "31337")
+
+    import app.blockchain as blockchain
+    if args.chain == "stub":
+        blockchain.bluecarbon_client = StubChain(args.rpc_latency_ms)
+        rpc = blockchain.bluecarbon_client
+    else:
+        rpc = RpcCounter().attach(blockchain.bluecarbon_client)
+
+    from app.database import db_client
+    db_calls: Counter = Counter()
+    count_db_calls(db_client, db_calls)
+    return {"db": db_calls, "mongo": mongo.calls, "rpc": rpc.calls}
+
+
+def holder_address() -> str:
+    """Account receiving seeded and issued credits (USER_PRIVATE_KEY's address when set)"""
+    from eth_account import Account
+    from web3 import Web3
+
+    key = os.getenv("USER_PRIVATE_KEY")
+    return Account.from_key(key).address if key else Web3.to_checksum_address("0x" + "a1" * 20)
+
+
+# -----------------------------
+# Seeding
+# -----------------------------
+def synthetic_plots_csv(path: str, plots: int, projects: int, rng: random.Random):
+    """plots.csv repeated with jittered values, fresh IDs and a project_id per plot"""
+    with open(PLOTS_CSV, newline="", encoding="utf-8-sig") as f:
+        base = list(csv.DictReader(f))
+
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(base[0]) + ["project_id"])
+        writer.writeheader()
+        for i in range(plots):
+            row = dict(base[i % len(base)])
+            row["ID"] = f"{row['ID']}-{i:07d}"
+            row["GPS_Lat"] = f"{max(-90.0, min(90.0, float(row['GPS_Lat']) + rng.uniform(-0.5, 0.5))):.6f}"
+            row["GPS_Long"] = f"{max(-180.0, min(180.0, float(row['GPS_Long']) + rng.uniform(-0.5, 0.5))):.6f}"
+            for field in JITTER_FIELDS:
+                with contextlib.suppress(ValueError):
+                    row[field] = f"{float(row[field]) * rng.uniform(0.8, 1.2):.4f}"
+            row["project_id"] = f"BENCH-{i % projects:04d}"
+            writer.writerow(row)
+
+
+async def seed(args, rng: random.Random) -> Dict[str, Any]:
+    """Fresh benchmark database: synthetic plots, rollups and funded on-chain projects"""
+    from app.blockchain import bluecarbon_client
+    from app.database import db_client
+    from app.ingest import PlotIngest
+
+    started = time.perf_counter()
+    if args.mongo == "uri":
+        for name in await db_client.db.list_collection_names():
+            await db_client.db[name].delete_many({})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plots.csv")
+        synthetic_plots_csv(path, args.plots, args.projects, rng)
+        await PlotIngest(db_client).run_file(path)
+    await db_client.rebuild_plot_rollups()
+
+    holder = holder_address()
+    for i in range(args.projects):
+        project_id = f"BENCH-{i:04d}"
+        tx = await bluecarbon_client.register_project(project_id, "bafybench", os.getenv("ADMIN_PRIVATE_KEY"))
+        await db_client.store_project(
+            {
+                "project_id": project_id,
+                "name": f"Benchmark project {i}",
+                "description": "Seeded by benchmarks.load",
+                "project_type": rng.choice(["Mangrove", "Peatland", "Wetland", "Blue Carbon"]),
+                "location": "synthetic",
+                "token_id": bluecarbon_client.registered_token_id(project_id, tx),
+            }
+        )
+        await bluecarbon_client.issue_credits(
+            holder, project_id, SEED_CREDITS, "bafybenchproof", os.getenv("MINTER_PRIVATE_KEY")
+        )
+        await db_client.update_project_balance(project_id, SEED_CREDITS, operation="issue")
+
+    return {"plots": args.plots, "projects": args.projects, "seconds": round(time.perf_counter() - started, 2)}
+
+
+# -----------------------------
+# Traffic
+# -----------------------------
+Request = Tuple[str, str, Optional[Dict[str, Any]], Optional[Dict[str, str]]]
+
+
+def endpoints(projects: int, holder: str) -> Dict[str, Dict[str, Callable[[random.Random], Request]]]:
+    """category → endpoint label → request factory"""
+    pid = lambda rng: f"BENCH-{rng.randrange(projects):04d}"
+    return {
+        "read": {
+            "GET /projects": lambda rng: ("GET", "/projects?limit=20", None, None),
+            "GET /projects/{id}": lambda rng: ("GET", f"/projects/{pid(rng)}", None, None),
+            "GET /projects/{id}/history": lambda rng: ("GET", f"/projects/{pid(rng)}/history?limit=20", None, None),
+            "GET /balance/{address}/{id}": lambda rng: ("GET", f"/balance/{holder}/{pid(rng)}", None, None),
+        },
+        "analytics": {
+            "GET /analytics/plots-overview": lambda rng: ("GET", "/analytics/plots-overview", None, None),
+            "GET /analytics/ndvi-monthly": lambda rng: ("GET", "/analytics/ndvi-monthly", None, None),
+            "GET /analytics/summary": lambda rng: (
+                "GET", f"/analytics/summary?year_from={rng.choice([2019, 2020, 2021, 2022])}", None, None
+            ),
+            "GET /carbon/stocks": lambda rng: ("GET", "/carbon/stocks", None, None),
+        },
+        "issue": {
+            "POST /credits/issue": lambda rng: (
+                "POST",
+                "/credits/issue",
+                {"to_address": holder, "project_id": pid(rng), "amount": rng.randint(1, 100), "proof_cid": "bafybench"},
+                MINTER_HEADERS,
+            ),
+        },
+        "retire": {
+            "POST /credits/retire": lambda rng: (
+                "POST", "/credits/retire", {"project_id": pid(rng), "amount": rng.randint(1, 10)}, None
+            ),
+        },
+    }
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Named mix or "read=70,analytics=20,issue=5,retire=5" """
+    if mix in MIXES:
+        return MIXES[mix]
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in MIXES["balanced"] or not weight.strip().isdigit():
+            raise SystemExit(f"Invalid mix '{mix}' (named: {sorted(MIXES)})")
+        weights[name.strip()] = int(weight)
+    return weights
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return 0.0
+    return round(samples[min(len(samples) - 1, max(0, math.ceil(q * len(samples)) - 1))], 2)
+
+
+def latency_stats(samples: List[float], errors: int, seconds: float) -> Dict[str, Any]:
+    samples = sorted(samples)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "rps": round(len(samples) / seconds, 1) if seconds else None,
+        "p50_ms": percentile(samples, 0.50),
+        "p95_ms": percentile(samples, 0.95),
+        "p99_ms": percentile(samples, 0.99),
+    }
+
+
+async def send(client, request: Request):
+    method, url, body, headers = request
+    return await client.request(method, url, json=body, headers=headers)
+
+
+async def calibrate(client, catalog, counters: Dict[str, Counter], runs: int) -> Dict[str, Dict[str, Any]]:
+    """DB / Mongo / RPC calls per request, endpoint by endpoint, with background work paused"""
+    from app.confirmer import tx_confirmer
+
+    await tx_confirmer.stop()
+    rng = random.Random(0)
+    per_request = {}
+    try:
+        for factories in catalog.values():
+            for label, factory in factories.items():
+                before = {kind: Counter(calls) for kind, calls in counters.items()}
+                for _ in range(runs):
+                    await send(client, factory(rng))
+                per_request[label] = {
+                    kind: {
+                        name: round(count / runs, 2)
+                        for name, count in sorted((calls - before[kind]).items())
+                    }
+                    for kind, calls in counters.items()
+                }
+    finally:
+        tx_confirmer.start()
+    return per_request
+
+
+async def drive(client, catalog, mix: Dict[str, int], args) -> Dict[str, Any]:
+    """Closed-loop load: `concurrency` workers each sending the next request as soon as one returns"""
+    categories = [c for c in mix if mix[c]]
+    weights = [mix[c] for c in categories]
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    deadline = time.perf_counter() + args.duration
+
+    async def worker(n: int):
+        rng = random.Random(args.seed * 1000 + n)
+        while time.perf_counter() < deadline:
+            category = rng.choices(categories, weights)[0]
+            label, factory = rng.choice(list(catalog[category].items()))
+            start = time.perf_counter()
+            try:
+                response = await send(client, factory(rng))
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            samples[(category, label)].append((time.perf_counter() - start) * 1000)
+            if failed:
+                errors[(category, label)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    by_category: Dict[str, List[float]] = defaultdict(list)
+    for (category, _), values in samples.items():
+        by_category[category].extend(values)
+    return {
+        "seconds": round(elapsed, 2),
+        "overall": latency_stats([v for values in samples.values() for v in values], sum(errors.values()), elapsed),
+        "categories": {
+            c: latency_stats(v, sum(n for (cat, _), n in errors.items() if cat == c), elapsed)
+            for c, v in sorted(by_category.items())
+        },
+        "endpoints": {
+            label: {"category": category, **latency_stats(v, errors[(category, label)], elapsed)}
+            for (category, label), v in sorted(samples.items(), key=lambda kv: kv[0][1])
+        },
+    }
+
+
+# -----------------------------
+# Regression comparison
+# -----------------------------
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Endpoints whose p95 grew by more than `tolerance` or that now make more calls per request"""
+    regressions = []
+    for label, current in result["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(label)
+        if not before:
+            continue
+        if before["p95_ms"] and current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {before['p95_ms']} → {current['p95_ms']} ms")
+        for kind, calls in current.get("calls_per_request", {}).items():
+            old = sum(before.get("calls_per_request", {}).get(kind, {}).values())
+            new = sum(calls.values())
+            if new > old:
+                regressions.append(f"{label}: {kind} calls/request {old} → {new}")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+async def main(args):
+    mix = parse_mix(args.mix)
+    counters = install_backends(args)
+    random.seed(args.seed)  # to_doc draws missing Data_Source values from the global RNG
+    rng = random.Random(args.seed)
+
+    import httpx
+    from app.lifecycle import readiness_report
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        if not readiness_report()["ready"]:
+            raise SystemExit(f"App dependencies not ready: {readiness_report()['checks']}")
+        seeded = await seed(args, rng)
+        catalog = endpoints(args.projects, holder_address())
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            calls = await calibrate(client, catalog, counters, args.calibrate)
+            run = await drive(client, catalog, mix, args)
+
+    for label, stats in run["endpoints"].items():
+        stats["calls_per_request"] = calls[label]
+    result = {
+        "benchmark": "load",
+        "commit": git_commit(),
+        "config": {
+            "mix": mix,
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "chain": args.chain,
+            "mongo": args.mongo,
+            "rpc_latency_ms": args.rpc_latency_ms if args.chain == "stub" else None,
+            "seed": args.seed,
+        },
+        "dataset": seeded,
+        **run,
+    }
+
+    overall = run["overall"]
+    print(f"📊 {seeded['plots']} plots, {seeded['projects']} projects, mix {args.mix}, {args.concurrency} workers\n")
+    print(f"{'endpoint':<32}{'reqs':>7}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'db':>6}{'rpc':>6}")
+    for label, stats in run["endpoints"].items():
+        db = sum(stats["calls_per_request"]["db"].values())
+        rpc = sum(stats["calls_per_request"]["rpc"].values())
+        print(
+            f"{label:<32}{stats['requests']:>7}{stats['errors']:>5}"
+            f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{db:>6g}{rpc:>6g}"
+        )
+    print(f"\n⚡ {overall['rps']} req/s overall, p50 {overall['p50_ms']} ms, p99 {overall['p99_ms']} ms, {overall['errors']} errors")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"❌ {line}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mix", default="balanced", help=f"{', '.join(MIXES)} or read=70,analytics=20,issue=5,retire=5")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of mixed load")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--plots", type=int, default=20000)
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--chain", choices=["stub", "rpc"], default="stub")
+    parser.add_argument("--rpc-latency-ms", type=float, default=5.0, help="simulated round trip of the stub chain")
+    parser.add_argument("--mongo", choices=["uri", "memory"], default="uri")
+    parser.add_argument("--calibrate", type=int, default=20, help="sequential requests per endpoint for call counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="out")
+    parser.add_argument("--baseline", help="earlier --json output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative p95 increase")
+    parser.add_argument("--verbose", action="store_true", help="app logs at DEBUG instead of WARNING")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,157 @@
+"""
+Stub Chain - in-process stand-in for BlueCarbonClient used by the load benchmarks
+
+Keeps token IDs, balances and receipts in memory and sleeps a configurable
+RPC latency per round trip, so API latency can be measured without a node.
+Calls are counted under the JSON-RPC method the real client would send,
+which keeps the counts comparable with a run against a live node.
+"""
+
+import asyncio
+import itertools
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from web3 import Web3
+
+
+class RpcCounter:
+    """Counts JSON-RPC requests made through a real client's provider"""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+
+    def attach(self, client):
+        provider = client.w3.provider
+        make_request = provider.make_request
+
+        async def counted(method, params):
+            self.calls[method] += 1
+            return await make_request(method, params)
+
+        provider.make_request = counted
+        return self
+
+
+class StubChain:
+    """Same async interface as app.blockchain.BlueCarbonClient, backed by dicts"""
+
+    def __init__(self, latency_ms: float = 5.0):
+        self.latency = latency_ms / 1000
+        self.calls: Counter = Counter()
+        self.contract_address = "0x" + "b1" * 20
+        self.registry_address = "0x" + "1e" * 20
+        self._token_ids: Dict[str, int] = {}
+        self._balances: Dict[tuple, int] = {}
+        self._receipts: Dict[str, Dict[str, Any]] = {}
+        self._blocks = itertools.count(1)
+        self._hashes = itertools.count(1)
+
+    async def _rpc(self, method: str):
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def _mine(
+        self, wait: bool, registered: Optional[Dict[str, int]] = None, on_signed=None
+    ) -> Dict[str, Any]:
+        tx_hash = "0x%064x" % next(self._hashes)
+        if on_signed:
+            await on_signed(tx_hash, tx_hash)
+        await self._rpc("eth_sendRawTransaction")
+        self._receipts[tx_hash] = {
+            "tx_hash": tx_hash,
+            "status": 1,
+            "blockNumber": next(self._blocks),
+            "gasUsed": 21000,
+            "registered": registered or {},
+        }
+        if not wait:
+            return {"tx_hash": tx_hash, "status": "pending", "blockNumber": None}
+        await self._rpc("eth_getTransactionReceipt")
+        return self._receipts[tx_hash]
+
+    # --------- LIFECYCLE --------- #
+    async def connect(self):
+        await self._rpc("eth_call")
+
+    async def close(self):
+        pass
+
+    async def is_connected(self) -> bool:
+        return True
+
+    # --------- READ METHODS --------- #
+    async def get_registry_contract(self, name: str) -> str:
+        await self._rpc("eth_call")
+        return self.contract_address
+
+    async def get_project_token_id(self, project_id: str) -> int:
+        if project_id not in self._token_ids:
+            await self._rpc("eth_call")
+        return self._token_ids.get(project_id, 0)
+
+    async def get_project_token_ids(self, project_ids: List[str]) -> Dict[str, int]:
+        await asyncio.gather(*(self.get_project_token_id(pid) for pid in project_ids if pid not in self._token_ids))
+        return {pid: self._token_ids.get(pid, 0) for pid in project_ids}
+
+    def cache_token_ids(self, token_ids: Dict[str, int]):
+        self._token_ids.update({pid: tid for pid, tid in token_ids.items() if tid})
+
+    async def get_balance_of(self, account: str, token_id: int) -> int:
+        await self._rpc("eth_call")
+        return self._balances.get((Web3.to_checksum_address(account), token_id), 0)
+
+    async def get_balances_batch(self, accounts: List[str], token_ids: List[int]) -> List[int]:
+        if not accounts:
+            return []
+        await self._rpc("eth_call")
+        return [self._balances.get((Web3.to_checksum_address(a), t), 0) for a, t in zip(accounts, token_ids)]
+
+    async def get_block_number(self) -> int:
+        await self._rpc("eth_blockNumber")
+        return len(self._receipts)
+
+    async def get_block_hash(self, block_number: int) -> str:
+        await self._rpc("eth_getBlockByNumber")
+        return "0x%064x" % block_number
+
+    async def get_event_logs(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        await self._rpc("eth_getLogs")
+        return []
+
+    async def get_transaction_receipt(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        await self._rpc("eth_getTransactionReceipt")
+        return self._receipts.get(tx_hash)
+
+    def registered_token_id(self, project_id: str, receipt: Dict[str, Any]) -> Optional[int]:
+        token_id = receipt.get("registered", {}).get(Web3.keccak(text=project_id).hex())
+        if token_id:
+            self._token_ids[project_id] = token_id
+        return token_id
+
+    # --------- WRITE METHODS --------- #
+    async def register_project(self, project_id: str, metadata_cid: str, private_key: str, wait: bool = True):
+        token_id = len(self._token_ids) + 1
+        self._token_ids[project_id] = token_id
+        return await self._mine(wait, {Web3.keccak(text=project_id).hex(): token_id})
+
+    async def issue_credits(
+        self, to_address, project_id, amount, proof_cid, private_key, wait: bool = True, on_signed=None
+    ):
+        key = (Web3.to_checksum_address(to_address), self._token_ids.get(project_id, 0))
+        self._balances[key] = self._balances.get(key, 0) + amount
+        return await self._mine(wait, on_signed=on_signed)
+
+    async def retire_credits(self, token_id: int, amount: int, private_key: str, on_signed=None):
+        return await self._mine(True, on_signed=on_signed)
+
+    async def send_raw_transaction(self, raw_tx: str) -> str:
+        await self._rpc("eth_sendRawTransaction")
+        return raw_tx
+
+    async def retire_credits_batch(self, token_ids: List[int], amounts: List[int], private_key: str, on_signed=None):
+        return await self._mine(True, on_signed=on_signed)
+
+    async def update_registry_contract(self, name: str, new_address: str, private_key: str):
+        return await self._mine(True)
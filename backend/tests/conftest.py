@@ -0,0 +1,33 @@
+"""
+Test setup - in-memory backend and the stub chain, configured before the app is imported
+"""
+
+import os
+
+os.environ.update(
+    DB_BACKEND="memory",
+    INDEXER_ENABLED="false",
+    ENSURE_INDEXES="false",
+    CHAIN_ID="1",
+    RPC_URL="http://127.0.0.1:8545",
+    REGISTRY_ADDRESS="0x" + "1e" * 20,
+    LOG_LEVEL="WARNING",
+)
+
+import pytest
+
+import app.blockchain
+from benchmarks.stub_chain import StubChain
+
+# Swapped in before any app module imports the global client
+app.blockchain.bluecarbon_client = StubChain(latency_ms=0)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    """Empty database and chain for every test"""
+    from app.database import db_client
+
+    db_client.__init__()
+    app.blockchain.bluecarbon_client.__init__(latency_ms=0)
+    yield
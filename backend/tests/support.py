@@ -0,0 +1,47 @@
+"""
+Test helpers - an API client running the app's lifespan, and seeded projects
+"""
+
+from contextlib import asynccontextmanager
+
+import httpx
+from web3 import Web3
+
+ADMIN = {"Authorization": "Bearer admin-token-123"}
+MINTER = {"Authorization": "Bearer minter-token-456"}
+HOLDER = Web3.to_checksum_address("0x" + "ab" * 20)
+
+
+@asynccontextmanager
+async def api():
+    """httpx client against the app; background workers are stopped so tests drive them"""
+    from app.confirmer import tx_confirmer
+    from app.main import app
+    from app.outbox import operation_outbox
+
+    async with app.router.lifespan_context(app):
+        await tx_confirmer.stop()
+        await operation_outbox.stop()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+
+
+async def seed_project(client: httpx.AsyncClient, project_id: str, credits: int):
+    """Register a project and issue it `credits`, both confirmed"""
+    project = {
+        "project_id": project_id, "metadata_cid": "cid", "name": project_id, "description": "d",
+        "project_type": "Mangrove", "location": "Kerala",
+    }
+    response = await client.post("/projects/register?wait=true", json=project, headers=ADMIN)
+    assert response.status_code == 200, response.text
+    issue = {"to_address": HOLDER, "project_id": project_id, "amount": credits, "proof_cid": "proof"}
+    response = await client.post(
+        "/credits/issue?wait=true", json=issue, headers={**MINTER, "Idempotency-Key": f"seed-{project_id}"}
+    )
+    assert response.status_code == 200, response.text
+
+
+async def balances(project_id: str):
+    from app.database import db_client
+
+    return (await db_client.get_project(project_id))["balances"]
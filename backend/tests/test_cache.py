@@ -0,0 +1,53 @@
+"""Response cache - LRU/TTL bounds and invalidation races"""
+
+import asyncio
+
+from app.cache import ResponseCache
+
+
+def test_response_computed_across_an_invalidation_is_not_cached():
+    cache = ResponseCache(max_bytes=1024, ttl=60)
+
+    async def run():
+        generation = cache.generation
+        await asyncio.sleep(0)
+        cache.invalidate()  # a plot write lands while the response is computed
+        cache.put("summary", b"stale", generation)
+        return cache.get("summary")
+
+    assert asyncio.run(run()) is None
+
+
+def test_version_change_discards_in_flight_responses():
+    version = 1
+
+    async def source():
+        return version
+
+    cache = ResponseCache(max_bytes=1024, ttl=60, version_check=0.0001)
+    cache.version_source = source
+
+    async def run():
+        nonlocal version
+        await cache.sync_version()
+        generation = cache.generation
+        version = 2  # another process wrote plots
+        await asyncio.sleep(0.001)
+        await cache.sync_version()
+        cache.put("summary", b"stale", generation)
+        fresh = cache.generation
+        cache.put("summary", b"fresh", fresh)
+        return cache.get("summary")
+
+    assert asyncio.run(run()).body == b"fresh"
+
+
+def test_lru_stays_within_the_byte_budget():
+    cache = ResponseCache(max_bytes=10, ttl=60)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    cache.get("a")
+    cache.put("c", b"12345")
+    assert cache.get("b") is None
+    assert cache.get("a").body == b"12345"
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,59 @@
+"""Arrow snapshot - metadata caching, republishing and bbox parity with Mongo"""
+
+import asyncio
+import builtins
+import os
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from app.columnar import META_FILE, ArrowAnalytics, write_snapshot
+from app.memory_db import MemoryDatabase
+
+PLOTS = [
+    {"ID": "A", "Project_Type": "Mangrove", "Monitoring_Year": 2023, "NDVI": 0.5,
+     "location": {"type": "Point", "coordinates": [85.0, 10.0]}},
+    # No GPS: stored at (0, 0), which is where Mongo's bbox filter finds it too
+    {"ID": "B", "Project_Type": "Wetland", "Monitoring_Year": 2023, "NDVI": 0.2,
+     "location": {"type": "Point", "coordinates": [0, 0]}},
+]
+
+
+def test_metadata_is_read_once_per_published_snapshot(tmp_path, monkeypatch):
+    path = str(tmp_path / "plots")
+    db = MemoryDatabase()
+    engine = ArrowAnalytics(path)
+    assert not engine.available()
+
+    asyncio.run(db.upsert_plots(PLOTS))
+    asyncio.run(write_snapshot(db, path))
+
+    opened = []
+    real_open = builtins.open
+    meta_file = os.path.join(path, META_FILE)
+    monkeypatch.setattr(
+        builtins, "open", lambda file, *a, **k: (file == meta_file and opened.append(file)) or real_open(file, *a, **k)
+    )
+    for _ in range(5):
+        assert engine.available()
+        engine.metadata()
+    assert len(opened) == 1
+
+    asyncio.run(db.upsert_plots([{**PLOTS[0], "ID": "C"}]))
+    asyncio.run(write_snapshot(db, path))
+    assert engine.metadata()["rows"] == 3
+    assert len(opened) == 2
+
+
+def test_bbox_filters_on_the_location_point(tmp_path):
+    path = str(tmp_path / "plots")
+    db = MemoryDatabase()
+    asyncio.run(db.upsert_plots(PLOTS))
+    asyncio.run(write_snapshot(db, path))
+    engine = ArrowAnalytics(path)
+
+    india = asyncio.run(engine.summary(bbox=[80, 0, 95, 20]))
+    origin = asyncio.run(engine.summary(bbox=[-1, -1, 1, 1]))
+    assert india["total_plots"] == 1
+    assert origin["total_plots"] == 1
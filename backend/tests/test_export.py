@@ -0,0 +1,46 @@
+"""Exports - gzip negotiation and the Vary header"""
+
+import asyncio
+
+from app.export import accepts_gzip
+from tests.support import api
+
+
+def export(headers=None, query=""):
+    async def run():
+        async with api() as client:
+            return await client.get(f"/export/transactions{query}", headers=headers or {})
+    return asyncio.run(run())
+
+
+def test_negotiated_gzip_varies_on_accept_encoding():
+    response = export({"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+
+def test_negotiated_identity_also_varies():
+    response = export({"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+
+def test_explicit_gzip_flag_does_not_vary():
+    response = export({"Accept-Encoding": "identity"}, "?gzip=true")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Vary" not in response.headers
+
+
+def test_gzip_refused_with_zero_quality_is_not_sent():
+    response = export({"Accept-Encoding": "gzip;q=0, identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+
+def test_accept_encoding_parsing():
+    assert accepts_gzip("deflate, gzip;q=0.5")
+    assert accepts_gzip("*")
+    assert not accepts_gzip("gzip;q=0")
+    assert not accepts_gzip("x-gzip")
+    assert not accepts_gzip("*, gzip;q=0")
+    assert not accepts_gzip(None)
@@ -0,0 +1,185 @@
+"""ChainIndexer - watermarked balance deltas, crash recovery and reorg unwinding"""
+
+import asyncio
+
+import pytest
+from web3 import Web3
+
+from app.indexer import ChainIndexer
+from app.memory_db import MemoryDatabase
+
+ALICE = Web3.to_checksum_address("0x" + "aa" * 20)
+BOB = Web3.to_checksum_address("0x" + "bb" * 20)
+ZERO = "0x" + "00" * 20
+
+
+def mint(block: int, to: str, value: int, tag: str = "") -> dict:
+    return {
+        "event": "TransferSingle", "args": {"operator": ALICE, "from": ZERO, "to": to, "id": 1, "value": value},
+        "block_number": block, "log_index": 0, "tx_hash": f"0x{tag}m{block}", "block_hash": "",
+    }
+
+
+def issued(block: int, amount: int) -> dict:
+    return {
+        "event": "CreditsIssued", "args": {"tokenId": 1, "amount": amount},
+        "block_number": block, "log_index": 1, "tx_hash": f"0xi{block}", "block_hash": "",
+    }
+
+
+class ForkableChain:
+    """Blocks of events whose hashes change from `fork_at` on once forked"""
+
+    def __init__(self):
+        self.blocks = {}
+        self.head = 0
+        self.fork_at = None
+
+    def cache_token_ids(self, mapping):
+        pass
+
+    async def get_block_number(self):
+        return self.head
+
+    async def get_block_hash(self, number):
+        forked = self.fork_at is not None and number >= self.fork_at
+        return f"h{number}{'-fork' if forked else ''}"
+
+    async def get_event_logs(self, from_block, to_block):
+        return [
+            {**event, "args": dict(event["args"])}
+            for number in range(from_block, to_block + 1)
+            for event in self.blocks.get(number, [])
+        ]
+
+
+@pytest.fixture
+def indexed(monkeypatch):
+    monkeypatch.setenv("INDEXER_BLOCK_WINDOW", "3")
+    db, chain = MemoryDatabase(), ForkableChain()
+    for number in range(1, 11):
+        chain.blocks[number] = [mint(number, ALICE, 1), issued(number, 1)]
+    chain.head = 10
+    return db, chain, ChainIndexer(db, chain)
+
+
+async def holder_balance(db, address):
+    return sum(row["balance"] for row in await db.get_holder_balances(address))
+
+
+async def setup_project(db):
+    await db.store_project({"project_id": "P", "name": "P"})
+    await db.set_project_token_id("P", 1)
+
+
+def test_sync_applies_every_event_once(indexed):
+    db, chain, indexer = indexed
+
+    async def run():
+        await setup_project(db)
+        applied = await indexer.sync_once()
+        # A second pass over the same range is skipped by the watermarks
+        await indexer._apply(await chain.get_event_logs(1, 10))
+        return applied, await holder_balance(db, ALICE), (await db.get_project("P"))["onchain"]
+
+    applied, balance, onchain = asyncio.run(run())
+    assert applied == 20
+    assert balance == 10
+    assert onchain["total_issued"] == 10
+
+
+def test_crash_between_storing_and_applying_loses_nothing(indexed):
+    db, chain, indexer = indexed
+
+    async def run():
+        await indexer.sync_once()
+        chain.blocks[11] = [mint(11, ALICE, 5)]
+        chain.blocks[12] = [mint(12, BOB, 7)]
+        chain.head = 12
+
+        apply = db.apply_balance_deltas
+
+        async def crash(*args, **kwargs):
+            raise RuntimeError("crashed")
+
+        db.apply_balance_deltas = crash
+        with pytest.raises(RuntimeError):
+            await indexer.sync_once()
+        db.apply_balance_deltas = apply
+
+        # The events are already stored, so they are not new - but still applied
+        await indexer.sync_once()
+        return await holder_balance(db, ALICE), await holder_balance(db, BOB)
+
+    assert asyncio.run(run()) == (15, 7)
+
+
+def test_reorg_unwinds_orphaned_events(indexed):
+    db, chain, indexer = indexed
+
+    async def run():
+        await setup_project(db)
+        await indexer.sync_once()
+        # Blocks 5+ are replaced: every mint now goes to Bob
+        chain.fork_at = 5
+        for number in range(5, 12):
+            chain.blocks[number] = [mint(number, BOB, 2, tag="f")]
+        chain.head = 11
+        await indexer.sync_once()
+        state = await db.get_sync_state(ChainIndexer.STATE_KEY)
+        return (
+            await holder_balance(db, ALICE), await holder_balance(db, BOB),
+            (await db.get_project("P"))["onchain"]["total_issued"], state["block_number"],
+        )
+
+    # Checkpoints sit at window ends (3, 6, 9, 10), so the unwind reaches back to block 3
+    assert asyncio.run(run()) == (4, 14, 4, 11)
+
+
+def test_reorg_below_the_checkpoint_history_reindexes_everything(indexed, monkeypatch):
+    monkeypatch.setenv("INDEXER_CHECKPOINT_HISTORY", "1")
+    db, chain, _ = indexed
+    indexer = ChainIndexer(db, chain)
+
+    async def run():
+        await indexer.sync_once()
+        chain.fork_at = 9
+        chain.blocks[9] = [mint(9, BOB, 3, tag="f")]
+        chain.blocks[10] = []
+        await indexer.sync_once()
+        return await holder_balance(db, ALICE), await holder_balance(db, BOB)
+
+    assert asyncio.run(run()) == (8, 3)
+
+
+def test_registrations_are_linked_with_one_project_scan(indexed):
+    db, chain, indexer = indexed
+
+    def registered(block: int, project_id: str, token_id: int) -> dict:
+        return {
+            "event": "ProjectRegistered",
+            "args": {"projectId": Web3.keccak(text=project_id).hex(), "tokenId": token_id},
+            "block_number": block, "log_index": 2, "tx_hash": f"0xr{block}", "block_hash": "",
+        }
+
+    async def run():
+        for project_id in ("R1", "R2", "R3"):
+            await db.store_project({"project_id": project_id, "name": project_id})
+        chain.blocks[1].append(registered(1, "R1", 11))
+        chain.blocks[2].append(registered(2, "R3", 13))
+
+        scans = 0
+        get_project_ids = db.get_project_ids
+
+        async def counted():
+            nonlocal scans
+            scans += 1
+            return await get_project_ids()
+
+        db.get_project_ids = counted
+        await indexer.sync_once()
+        return scans, await db.get_project_token_id_map()
+
+    scans, token_ids = asyncio.run(run())
+    assert scans == 1
+    assert token_ids == {"R1": 11, "R3": 13}
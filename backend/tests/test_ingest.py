@@ -0,0 +1,68 @@
+"""Plot ingest - batched sharded upserts, reject line numbers and the upload endpoint"""
+
+import asyncio
+import io
+from datetime import datetime
+
+from app.ingest import PlotIngest, parse_timestamp, shard_of
+from app.memory_db import MemoryDatabase
+from tests.support import ADMIN, api
+
+HEADER = "ID,GPS_Lat,GPS_Long,Project_Type,Timestamp,Notes,NDVI\n"
+
+
+def test_rejects_report_the_line_a_record_starts_on():
+    rows = (
+        'P1,1,2,Mangrove,2023-01-01 00:00:00,"multi\nline\nnote",0.1\n'
+        "P2,1,2,Mangrove,not-a-time,x,0.2\n"
+        'P3,1,2,Mangrove,also-not-a-time,"multi\nline",0.3\n'
+        "P4,100,2,Mangrove,2023-01-01 00:00:00,x,0.4\n"
+    )
+    report = asyncio.run(PlotIngest(MemoryDatabase(), batch_size=2, workers=2).run(io.StringIO(HEADER + rows)))
+
+    assert report["rows"] == 4
+    assert report["stored"] == 1
+    assert [reject["line"] for reject in report["rejects"]] == [5, 6, 8]
+
+
+def test_utc_designator_is_accepted():
+    assert parse_timestamp("2023-05-01T10:00:00Z") == datetime(2023, 5, 1, 10)
+    assert parse_timestamp("2023-05-01 12:00:00+02:00") == datetime(2023, 5, 1, 10)
+
+
+def test_last_row_for_a_plot_wins_across_batches():
+    rows = "".join(f"Q{i % 50},1,2,Wetland,2023-01-0{1 + i % 9} 00:00:00,n,{i}\n" for i in range(500))
+    db = MemoryDatabase()
+
+    async def run():
+        report = await PlotIngest(db, batch_size=16, workers=4).run(io.StringIO(HEADER + rows))
+        return report, await db.iter_plots({"ID": "Q7"}).to_list(None)
+
+    report, stored = asyncio.run(run())
+    assert report["stored"] == 500
+    assert report["rejected"] == 0
+    assert stored[0]["NDVI"] == 457
+
+
+def test_shard_of_is_stable():
+    assert shard_of("PLOT_1", 4) == shard_of("PLOT_1", 4)
+    assert {shard_of(f"PLOT_{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_upload_endpoint_reports_stored_and_rejected_rows():
+    body = "\ufeff" + HEADER + (
+        "U1,1,2,Mangrove,2023-01-01T00:00:00Z,x,0.1\r\n"
+        "U2,1,2,Mangrove,not-a-time,x,0.2\r\n"
+        "U3,1,2,Wetland,2023-01-02 00:00:00,x,0.3\r\n"
+    )
+
+    async def run():
+        async with api() as client:
+            files = {"file": ("plots.csv", body.encode(), "text/csv")}
+            return await client.post("/plots/ingest", files=files, headers=ADMIN)
+
+    response = asyncio.run(run())
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert (report["rows"], report["stored"], report["rejected"]) == (3, 2, 1)
+    assert report["rejects"][0]["line"] == 3
@@ -0,0 +1,83 @@
+"""NonceManager - local allocation, reuse of unsent nonces and resync after failures"""
+
+import asyncio
+from types import SimpleNamespace
+
+from app.blockchain import NonceManager
+
+ADDRESS = "0x" + "aa" * 20
+
+
+class FakeEth:
+    def __init__(self, pending: int):
+        self.pending = pending
+        self.calls = 0
+
+    async def get_transaction_count(self, address, block_identifier):
+        self.calls += 1
+        return self.pending
+
+
+def manager(pending: int):
+    eth = FakeEth(pending)
+    return NonceManager(SimpleNamespace(eth=eth)), eth
+
+
+def test_concurrent_allocations_are_unique_and_seeded_once():
+    nonces, eth = manager(pending=7)
+
+    async def run():
+        return await asyncio.gather(*(nonces.allocate(ADDRESS) for _ in range(50)))
+
+    assert sorted(asyncio.run(run())) == list(range(7, 57))
+    assert eth.calls == 1
+
+
+def test_released_nonce_is_reused_before_the_counter_moves():
+    nonces, _ = manager(pending=0)
+
+    async def run():
+        first, second, third = [await nonces.allocate(ADDRESS) for _ in range(3)]
+        await nonces.release(ADDRESS, second)
+        await nonces.release(ADDRESS, first)
+        return [await nonces.allocate(ADDRESS) for _ in range(3)]
+
+    assert asyncio.run(run()) == [0, 1, 3]
+
+
+def test_resync_after_failed_send_keeps_in_flight_nonces():
+    nonces, eth = manager(pending=5)
+
+    async def run():
+        allocated = [await nonces.allocate(ADDRESS) for _ in range(3)]
+        # 5 was rejected by the node while 6 and 7 are still being signed
+        await nonces.resync(ADDRESS, failed=allocated[0])
+        return await nonces.allocate(ADDRESS), await nonces.allocate(ADDRESS)
+
+    assert asyncio.run(run()) == (5, 8)
+
+
+def test_resync_queues_nonces_the_node_never_received():
+    nonces, eth = manager(pending=5)
+
+    async def run():
+        allocated = [await nonces.allocate(ADDRESS) for _ in range(3)]
+        for nonce in allocated[:2]:
+            await nonces.sent(ADDRESS, nonce)
+        # 5 and 6 were dropped by the node; 7 is still outstanding
+        await nonces.resync(ADDRESS)
+        return [await nonces.allocate(ADDRESS) for _ in range(3)]
+
+    assert asyncio.run(run()) == [5, 6, 8]
+
+
+def test_resync_follows_the_chain_forward():
+    nonces, eth = manager(pending=0)
+
+    async def run():
+        await nonces.sent(ADDRESS, await nonces.allocate(ADDRESS))
+        eth.pending = 10  # another signer used this account
+        await nonces.resync(ADDRESS)
+        return await nonces.allocate(ADDRESS)
+
+    assert asyncio.run(run()) == 10
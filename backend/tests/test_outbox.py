@@ -0,0 +1,124 @@
+"""Operation outbox - Idempotency-Key replays, conflicts and recovery of interrupted writes"""
+
+import asyncio
+
+import app.blockchain
+from app.confirmer import tx_confirmer
+from app.database import db_client
+from app.outbox import OperationOutbox, operation_outbox
+from tests.support import api, balances, seed_project
+
+RETIRE = {"project_id": "OUT1", "amount": 4}
+
+
+def recovery():
+    """Outbox whose recovery picks up operations as soon as they are idle"""
+    return OperationOutbox(db_client, app.blockchain.bluecarbon_client, tx_confirmer, recover_after=0.001)
+
+
+def test_retry_with_the_same_key_replays_the_stored_response():
+    chain = app.blockchain.bluecarbon_client
+
+    async def run():
+        async with api() as client:
+            await seed_project(client, "OUT1", 10)
+            first = await client.post("/credits/retire", json=RETIRE, headers={"Idempotency-Key": "r1"})
+            sent = chain.calls["eth_sendRawTransaction"]
+            again = await client.post("/credits/retire", json=RETIRE, headers={"Idempotency-Key": "r1"})
+            return first, again, sent, chain.calls["eth_sendRawTransaction"], await balances("OUT1")
+
+    first, again, sent_before, sent_after, balance = asyncio.run(run())
+    assert first.status_code == again.status_code == 200
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert again.json() == first.json()
+    assert sent_after == sent_before
+    assert balance["total_retired"] == 4
+    assert balance["circulating"] == 6
+
+
+def test_reused_key_with_a_different_body_is_rejected():
+    async def run():
+        async with api() as client:
+            await seed_project(client, "OUT1", 10)
+            await client.post("/credits/retire", json=RETIRE, headers={"Idempotency-Key": "r1"})
+            other = {**RETIRE, "amount": 5}
+            return await client.post("/credits/retire", json=other, headers={"Idempotency-Key": "r1"})
+
+    response = asyncio.run(run())
+    assert response.status_code == 422
+
+
+def test_retry_while_the_first_request_is_in_flight_conflicts(monkeypatch):
+    chain = app.blockchain.bluecarbon_client
+
+    async def run():
+        gate = asyncio.Event()
+        retire = chain.retire_credits
+
+        async def slow_retire(*args, **kwargs):
+            await gate.wait()
+            return await retire(*args, **kwargs)
+
+        monkeypatch.setattr(chain, "retire_credits", slow_retire)
+        async with api() as client:
+            await seed_project(client, "OUT1", 10)
+            first = asyncio.create_task(
+                client.post("/credits/retire", json=RETIRE, headers={"Idempotency-Key": "r1"})
+            )
+            await asyncio.sleep(0.05)
+            second = await client.post("/credits/retire", json=RETIRE, headers={"Idempotency-Key": "r1"})
+            gate.set()
+            return await first, second
+
+    first, second = asyncio.run(run())
+    assert second.status_code == 409
+    assert first.status_code == 200
+
+
+def test_recovery_completes_a_signed_operation():
+    chain = app.blockchain.bluecarbon_client
+
+    async def run():
+        async with api() as client:
+            await seed_project(client, "OUT1", 10)
+            # Interrupted after the tx was signed and mined, before anything else was recorded
+            operation, _ = await operation_outbox.begin("credit_retirement", RETIRE, "r1")
+            await db_client.reserve_credits("OUT1", 4, str(operation["_id"]))
+            receipt = await chain._mine(True, on_signed=operation_outbox.on_signed(operation))
+            await asyncio.sleep(0.01)
+
+            resolved = await recovery().poll_once()
+            replay = await client.post("/credits/retire", json=RETIRE, headers={"Idempotency-Key": "r1"})
+            tx = await db_client.get_transaction(receipt["tx_hash"])
+            return resolved, replay, tx, await balances("OUT1")
+
+    resolved, replay, tx, balance = asyncio.run(run())
+    assert resolved == 1
+    assert replay.status_code == 200
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert tx["status"] == "confirmed"
+    assert balance["total_retired"] == 4
+    assert balance["reserved"] == 0
+
+
+def test_recovery_fails_an_unsigned_operation_and_releases_its_credits():
+    async def run():
+        async with api() as client:
+            await seed_project(client, "OUT1", 10)
+            operation, _ = await operation_outbox.begin("credit_retirement", RETIRE, "r1")
+            await db_client.reserve_credits("OUT1", 4, str(operation["_id"]))
+            await asyncio.sleep(0.01)
+
+            resolved = await recovery().poll_once()
+            released = await balances("OUT1")
+            # A failed operation never reached the chain, so its key runs again
+            retry = await client.post("/credits/retire", json=RETIRE, headers={"Idempotency-Key": "r1"})
+            return resolved, released, retry, await balances("OUT1")
+
+    resolved, released, retry, balance = asyncio.run(run())
+    assert resolved == 1
+    assert released["circulating"] == 10
+    assert released["reserved"] == 0
+    assert retry.status_code == 200
+    assert "Idempotent-Replayed" not in retry.headers
+    assert balance["total_retired"] == 4
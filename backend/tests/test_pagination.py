@@ -0,0 +1,40 @@
+"""Keyset pagination - cursors walk every project once, even while new ones arrive"""
+
+import asyncio
+
+from app.database import db_client
+from app.pagination import decode_cursor, encode_cursor
+from tests.support import api
+
+
+def test_cursor_round_trips():
+    cursor = encode_cursor("2024-01-01", 7)
+    assert decode_cursor(cursor, 2) == ["2024-01-01", 7]
+
+
+def test_cursor_walk_visits_every_project_once():
+    async def run():
+        async with api() as client:
+            for i in range(25):
+                await db_client.store_project({"project_id": f"PG{i:02d}", "name": "n"})
+            seen, cursor = [], None
+            while True:
+                url = "/projects?limit=7" + (f"&cursor={cursor}" if cursor else "")
+                response = await client.get(url)
+                seen += [project["project_id"] for project in response.json()]
+                # Projects created mid-walk sort before the cursor and never shift later pages
+                await db_client.store_project({"project_id": f"NEW{len(seen)}", "name": "n"})
+                cursor = response.headers.get("X-Next-Cursor")
+                if not cursor:
+                    return seen
+
+    seen = asyncio.run(run())
+    assert seen == [f"PG{i:02d}" for i in reversed(range(25))]
+
+
+def test_malformed_cursor_is_rejected():
+    async def run():
+        async with api() as client:
+            return await client.get("/projects?cursor=not-a-cursor")
+
+    assert asyncio.run(run()).status_code == 400
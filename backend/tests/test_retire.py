@@ -0,0 +1,65 @@
+"""Retirements - reservations stop concurrent overdraws and are released on failure"""
+
+import asyncio
+
+import pytest
+
+import app.blockchain
+from tests.support import api, balances, seed_project
+
+
+def test_concurrent_retirements_never_overdraw():
+    async def run():
+        async with api() as client:
+            await seed_project(client, "RET1", 30)
+            responses = await asyncio.gather(
+                *(client.post("/credits/retire", json={"project_id": "RET1", "amount": 4}) for _ in range(12))
+            )
+            return [r.status_code for r in responses], await balances("RET1")
+
+    codes, balance = asyncio.run(run())
+    assert codes.count(200) == 7
+    assert codes.count(400) == 5
+    assert balance["total_retired"] == 28
+    assert balance["circulating"] == 2
+    assert balance["reserved"] == 0
+
+
+def test_reverted_retirement_releases_the_reservation(monkeypatch):
+    chain = app.blockchain.bluecarbon_client
+    mine = chain._mine
+
+    async def reverted(*args, **kwargs):
+        return {**await mine(*args, **kwargs), "status": 0}
+
+    async def run():
+        async with api() as client:
+            await seed_project(client, "RET1", 10)
+            monkeypatch.setattr(chain, "_mine", reverted)
+            response = await client.post("/credits/retire", json={"project_id": "RET1", "amount": 6})
+            return response, await balances("RET1")
+
+    response, balance = asyncio.run(run())
+    assert response.json()["success"] is False
+    assert balance["circulating"] == 10
+    assert balance["reserved"] == 0
+    assert balance.get("total_retired", 0) == 0
+
+
+def test_chain_error_before_signing_releases_the_reservation(monkeypatch):
+    chain = app.blockchain.bluecarbon_client
+
+    async def unreachable(*args, **kwargs):
+        raise ConnectionError("rpc down")
+
+    async def run():
+        async with api() as client:
+            await seed_project(client, "RET1", 10)
+            monkeypatch.setattr(chain, "retire_credits", unreachable)
+            with pytest.raises(ConnectionError):
+                await client.post("/credits/retire", json={"project_id": "RET1", "amount": 6})
+            return await balances("RET1")
+
+    balance = asyncio.run(run())
+    assert balance["circulating"] == 10
+    assert balance["reserved"] == 0
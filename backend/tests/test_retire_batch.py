@@ -0,0 +1,63 @@
+"""Batch retirements - one tx across projects, all-or-nothing reservations"""
+
+import asyncio
+
+import app.blockchain
+from tests.support import api, balances, seed_project
+
+
+def test_batch_retires_every_project_share():
+    async def run():
+        async with api() as client:
+            await seed_project(client, "BAT1", 10)
+            await seed_project(client, "BAT2", 10)
+            items = [{"project_id": "BAT1", "amount": 3}, {"project_id": "BAT2", "amount": 2},
+                     {"project_id": "BAT1", "amount": 1}]
+            response = await client.post("/credits/retire/batch", json={"items": items})
+            return response, await balances("BAT1"), await balances("BAT2")
+
+    response, first, second = asyncio.run(run())
+    assert response.status_code == 200
+    assert first["total_retired"] == 4
+    assert second["total_retired"] == 2
+
+
+def test_partial_batch_holds_no_credits():
+    async def run():
+        async with api() as client:
+            await seed_project(client, "BAT1", 10)
+            await seed_project(client, "BAT2", 10)
+            items = [{"project_id": "BAT1", "amount": 3}, {"project_id": "BAT2", "amount": 50}]
+            response = await client.post("/credits/retire/batch", json={"items": items})
+            return response, await balances("BAT1"), await balances("BAT2")
+
+    response, first, second = asyncio.run(run())
+    assert response.status_code == 400
+    assert "BAT2" in response.json()["detail"]
+    assert (first["circulating"], first.get("reserved", 0)) == (10, 0)
+    assert (second["circulating"], second.get("reserved", 0)) == (10, 0)
+
+
+def test_reverted_batch_returns_502_and_releases_every_share(monkeypatch):
+    chain = app.blockchain.bluecarbon_client
+    mine = chain._mine
+
+    async def reverted(*args, **kwargs):
+        return {**await mine(*args, **kwargs), "status": 0}
+
+    async def run():
+        async with api() as client:
+            await seed_project(client, "BAT1", 10)
+            await seed_project(client, "BAT2", 10)
+            monkeypatch.setattr(chain, "_mine", reverted)
+            body = {"items": [{"project_id": "BAT1", "amount": 3}, {"project_id": "BAT2", "amount": 2}]}
+            response = await client.post("/credits/retire/batch", json=body, headers={"Idempotency-Key": "b1"})
+            replay = await client.post("/credits/retire/batch", json=body, headers={"Idempotency-Key": "b1"})
+            return response, replay, await balances("BAT1"), await balances("BAT2")
+
+    response, replay, first, second = asyncio.run(run())
+    assert response.status_code == 502
+    assert replay.status_code == 502
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert (first["circulating"], first.get("reserved", 0)) == (10, 0)
+    assert (second["circulating"], second.get("reserved", 0)) == (10, 0)
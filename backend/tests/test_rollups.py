@@ -0,0 +1,80 @@
+"""Plot rollups - incremental deltas on upsert stay equal to a full rebuild"""
+
+import asyncio
+import random
+
+from app.memory_db import MemoryDatabase
+
+TYPES = ["Mangrove", "Wetland", "Peatland"]
+
+
+def plot(plot_id: str, rng: random.Random) -> dict:
+    ndvi = rng.random()
+    return {
+        "ID": plot_id, "Project_Type": rng.choice(TYPES), "Monitoring_Year": rng.choice([2022, 2023]),
+        "Data_Source": "field", "Timestamp": f"2023-0{rng.randint(1, 9)}-01 00:00:00",
+        "NDVI": ndvi, "Carbon_t": ndvi * 10, "CO2e_t": ndvi * 36.7,
+    }
+
+
+def normalized(rollups):
+    def clean(value):
+        if isinstance(value, float):
+            return round(value, 6)
+        if isinstance(value, dict):
+            return {k: clean(v) for k, v in value.items() if k != "updated_at"}
+        return value
+    return sorted((clean(bucket) for bucket in rollups), key=lambda bucket: bucket["_id"])
+
+
+async def snapshot(db):
+    return {dimension: normalized(await db.get_plot_rollups(dimension)) for dimension in ("type", "year", "month")}
+
+
+def test_incremental_rollups_match_a_rebuild():
+    rng = random.Random(11)
+    db = MemoryDatabase()
+
+    async def run():
+        # Overlapping concurrent batches move plots between types, years and months
+        batches = [[plot(f"P{rng.randrange(30)}", rng) for _ in range(25)] for _ in range(8)]
+        await asyncio.gather(*(db.upsert_plots(batch) for batch in batches))
+        incremental = await snapshot(db)
+        await db.rebuild_plot_rollups()
+        return incremental, await snapshot(db)
+
+    incremental, rebuilt = asyncio.run(run())
+    assert incremental["type"]
+    assert incremental == rebuilt
+
+
+def test_moving_the_extreme_plot_refreshes_min_and_max():
+    db = MemoryDatabase()
+
+    async def run():
+        await db.upsert_plots([
+            {"ID": "A", "Project_Type": "Mangrove", "NDVI": 0.9},
+            {"ID": "B", "Project_Type": "Mangrove", "NDVI": 0.2},
+        ])
+        await db.upsert_plots([{"ID": "A", "Project_Type": "Wetland"}])
+        return {bucket["key"]["type"]: bucket for bucket in await db.get_plot_rollups("type")}
+
+    buckets = asyncio.run(run())
+    assert buckets["Mangrove"]["count"] == 1
+    assert buckets["Mangrove"]["metrics"]["NDVI"]["max"] == 0.2
+    assert buckets["Wetland"]["metrics"]["NDVI"]["min"] == 0.9
+
+
+def test_upserts_bump_the_plot_version():
+    db = MemoryDatabase()
+
+    async def run():
+        first = await db.upsert_plots([{"ID": "A", "NDVI": 0.1}, {"ID": "A", "NDVI": 0.3}])
+        second = await db.upsert_plots([{"ID": "A", "NDVI": 0.5}])
+        return first, second, await db.iter_plots({"ID": "A"}).to_list(None)
+
+    first, second, stored = asyncio.run(run())
+    assert first == {"upserted": 1, "modified": 0, "matched": 0}
+    assert second == {"upserted": 0, "modified": 1, "matched": 1}
+    assert stored[0]["version"] == 2
+    assert stored[0]["NDVI"] == 0.5